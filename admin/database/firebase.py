@@ -1,13 +1,45 @@
 import warnings
 import re
-from datetime import date, datetime
-import pandas as pd
+import base64
+from datetime import date, datetime, timedelta
 from io import BytesIO
-from firebase_connection import firebase_connection
+import storage
 from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+from utils.id_utils import new_id
+from utils.csv_stream import csv_chunks
+from utils.lazy import LazyObject
+from utils.async_db import AsyncDatabase
+from utils import mess_attendance
+from utils.mess_menu import menu_cache
+from utils.tenant_cache import tenant_cache, IN_LIMIT
+from utils import room_occupancy
+from utils.log import get_logger
+
+log = get_logger("db.admin")
 
 warnings.filterwarnings("ignore")
 
+# Documents fetched per round trip when paging through a collection
+PAGE_SIZE = 500
+
+# Exportable datasets: (collection, date field used for ordering and filtering, columns)
+EXPORTS = {
+    'attendance': ('attendance', 'date',
+                   ['date', 'student_id', 'student_name', 'room_number', 'status', 'time', 'timestamp']),
+    'fees': ('fees', 'due_date',
+             ['id', 'student_id', 'student_name', 'fee_type', 'amount', 'paid_amount', 'status', 'due_date',
+              'paid_date', 'payment_method', 'transaction_id', 'notes', 'created_at', 'updated_at']),
+    'students': ('tenants', 'date',
+                 ['id', 'name', 'type', 'email', 'phone', 'room', 'date', 'ac', 'sleep_time', 'smoking', 'status']),
+    'complaints': ('complaints', 'created_at',
+                   ['id', 'ten_id', 'ten_name', 'ten_room', 'complaint_type', 'description', 'priority',
+                    'status', 'created_at']),
+}
+
+# Collections whose writers stamp updated_at, served by the change feed
+CHANGE_FEEDS = ('attendance', 'fees', 'complaints', 'leave_requests', 'visitor_requests')
+
 class Database:
     _db_instance = None
     
@@ -19,15 +51,15 @@ class Database:
             self.db = Database._db_instance
     
     def connect(self):
-        """Connect to Firebase Firestore using singleton connection"""
+        """Connect to the configured storage backend using the shared client"""
         try:
-            self.db = firebase_connection.get_db()
+            self.db = storage.get_db()
             if self.db:
-                print("✅ Admin Database connected to Firebase Firestore")
+                log.info("✅ Admin Database connected to %s", storage.backend_name(), extra={"sample": False})
             else:
-                print("❌ Failed to connect to Firebase Firestore")
+                log.error("❌ Failed to connect to %s", storage.backend_name())
         except Exception as e:
-            print(f"❌ Error connecting to Firebase: {e}")
+            log.error("❌ Error connecting to Firebase: %s", e)
             self.db = None
     
     # Attendance Methods
@@ -43,12 +75,13 @@ class Database:
                 "date": date_str,
                 "status": status,
                 "time": current_time,
-                "timestamp": timestamp
+                "timestamp": timestamp,
+                "updated_at": firestore.SERVER_TIMESTAMP
             })
             
-            print(f"Attendance marked for student {student_id}")
+            log.info("Attendance marked for student %s", student_id, extra={"student_id": student_id})
         except Exception as e:
-            print(f"Error marking attendance: {e}")
+            log.error("Error marking attendance: %s", e)
     
     def get_attendance_by_date(self, date_str):
         try:
@@ -63,7 +96,16 @@ class Database:
             
             return result
         except Exception as e:
-            print(f"Error getting attendance: {e}")
+            log.error("Error getting attendance: %s", e)
+            return []
+    
+    def get_attendance_between(self, start_date, end_date):
+        """Attendance records dated start_date..end_date (inclusive), without tenant lookups"""
+        try:
+            query = self.db.collection("attendance").where("date", ">=", start_date).where("date", "<=", end_date)
+            return [doc.to_dict() for doc in query.stream()]
+        except Exception as e:
+            log.error("Error getting attendance between %s and %s: %s", start_date, end_date, e)
             return []
     
     def get_all_attendance(self, start_date=None, end_date=None):
@@ -95,11 +137,13 @@ class Database:
             
             return result
         except Exception as e:
-            print(f"Error getting all attendance: {e}")
+            log.error("Error getting all attendance: %s", e)
             return []
     
     def export_attendance_to_excel(self):
         attendance = self.get_all_attendance()
+        import pandas as pd
+
         df = pd.DataFrame(attendance)
         
         output = BytesIO()
@@ -108,6 +152,192 @@ class Database:
         output.seek(0)
         return output
     
+    # Streaming Export Methods
+    def iter_documents(self, query, page_size=PAGE_SIZE):
+        """Yield the documents of an ordered query one page at a time.
+        
+        Each page resumes after the last snapshot of the previous one, so
+        only a single page is ever held in memory.
+        """
+        last_doc = None
+        while True:
+            page = query.limit(page_size)
+            if last_doc is not None:
+                page = page.start_after(last_doc)
+            
+            docs = list(page.stream())
+            yield from docs
+            
+            if len(docs) < page_size:
+                return
+            last_doc = docs[-1]
+    
+    def get_tenant_lookup(self):
+        """Map tenant id (as a string) to (name, room) with a single read of the tenants collection"""
+        lookup = {}
+        for doc in self.db.collection('tenants').select(['id', 'name', 'room']).stream():
+            data = doc.to_dict()
+            lookup[str(data.get('id'))] = (data.get('name', 'Unknown'), data.get('room', 'N/A'))
+        return lookup
+    
+    def export_query(self, dataset, start_date=None, end_date=None):
+        """Query behind a dataset export, ordered by its date field and limited to [start_date, end_date]"""
+        collection, date_field, _ = EXPORTS[dataset]
+        query = self.db.collection(collection)
+        
+        if start_date:
+            query = query.where(date_field, ">=", start_date)
+        if end_date:
+            # Upper bound is the next day so ISO timestamps on end_date are included
+            next_day = (date.fromisoformat(end_date) + timedelta(days=1)).isoformat()
+            query = query.where(date_field, "<", next_day)
+        
+        return query.order_by(date_field)
+    
+    def count_export_rows(self, dataset, start_date=None, end_date=None):
+        try:
+            result = self.export_query(dataset, start_date, end_date).count().get()
+            return int(result[0][0].value)
+        except Exception as e:
+            log.error("Error counting %s export: %s", dataset, e)
+            return 0
+    
+    def iter_export_rows(self, dataset, start_date=None, end_date=None, tenants=None):
+        """Yield the rows of a dataset export as dicts, one Firestore page at a time.
+        
+        tenants is a get_tenant_lookup() result to reuse across calls; it is
+        read here when not given.
+        """
+        if tenants is None:
+            tenants = self.get_tenant_lookup() if dataset in ('attendance', 'fees') else {}
+        
+        for doc in self.iter_documents(self.export_query(dataset, start_date, end_date)):
+            data = doc.to_dict()
+            
+            if dataset == 'attendance':
+                student_id = data.get("tenant_id", data.get("student_id"))
+                data["student_id"] = student_id
+                data["student_name"], data["room_number"] = tenants.get(str(student_id), ("Unknown", "N/A"))
+            elif dataset == 'fees':
+                data['id'] = doc.id
+                data['student_name'] = tenants.get(str(data.get('student_id')), ('Unknown',))[0]
+            
+            yield data
+    
+    def iter_mess_attendance_rows(self, start_date=None, end_date=None):
+        """Yield one row per student per day from the per-student mess attendance records"""
+        query = self.db.collection(mess_attendance.RECORDS)
+        if start_date:
+            query = query.where("date", ">=", start_date)
+        if end_date:
+            query = query.where("date", "<=", end_date)
+        
+        for doc in self.iter_documents(query.order_by("date")):
+            data = doc.to_dict() or {}
+            yield {
+                'date': data.get('date'),
+                'student_id': data.get('tenant_id'),
+                'breakfast': bool(data.get('breakfast')),
+                'lunch': bool(data.get('lunch')),
+                'dinner': bool(data.get('dinner'))
+            }
+    
+    def get_first_date(self, dataset):
+        """Earliest date (YYYY-MM-DD) present in attendance or messAttendance, or None"""
+        try:
+            if dataset == 'messAttendance':
+                query = self.db.collection(mess_attendance.RECORDS).order_by("date")
+                docs = list(query.limit(1).stream())
+                return docs[0].to_dict().get("date") if docs else None
+            
+            docs = list(self.export_query(dataset).limit(1).stream())
+            return str(docs[0].to_dict().get(EXPORTS[dataset][1]))[:10] if docs else None
+        except Exception as e:
+            log.error("Error getting first %s date: %s", dataset, e)
+            return None
+    
+    def export_to_csv(self, dataset, start_date=None, end_date=None):
+        """Stream a dataset export as CSV text chunks"""
+        def rows():
+            try:
+                yield from self.iter_export_rows(dataset, start_date, end_date)
+            except Exception as e:
+                # Re-raised so the server aborts the response rather than ending a truncated file cleanly
+                log.error("Error exporting %s: %s", dataset, e)
+                raise
+        
+        return csv_chunks(EXPORTS[dataset][2], rows())
+    
+    def export_attendance_to_csv(self, start_date=None, end_date=None):
+        return self.export_to_csv('attendance', start_date, end_date)
+    
+    def export_fees_to_csv(self, start_date=None, end_date=None):
+        return self.export_to_csv('fees', start_date, end_date)
+    
+    def export_students_to_csv(self, start_date=None, end_date=None):
+        return self.export_to_csv('students', start_date, end_date)
+    
+    # Change Feed Methods
+    def get_changes(self, collection, since=None, after_id=None, limit=PAGE_SIZE):
+        """Documents changed after a watermark, oldest change first.
+        
+        The watermark is the (updated_at, document id) of the last change a
+        client has seen; the id breaks ties between writes stamped in the
+        same instant, so pages never skip or repeat a document. Returns
+        (changes, has_more), or None if the query failed.
+        """
+        try:
+            collection_ref = self.db.collection(collection)
+            query = collection_ref.order_by('updated_at').order_by(FieldPath.document_id())
+            
+            if since is not None and after_id:
+                query = query.start_after([since, collection_ref.document(after_id)])
+            elif since is not None:
+                query = query.where('updated_at', '>', since)
+            
+            docs = list(query.limit(limit + 1).stream())
+            
+            changes = []
+            for doc in docs[:limit]:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                changes.append(data)
+            
+            return changes, len(docs) > limit
+        except Exception as e:
+            log.error("Error getting changes for %s: %s", collection, e)
+            return None
+    
+    def backfill_updated_at(self, collection):
+        """Stamp updated_at on documents written before the change feed existed"""
+        try:
+            batch = self.db.batch()
+            pending = 0
+            stamped = 0
+            
+            query = self.db.collection(collection).order_by(FieldPath.document_id())
+            for doc in self.iter_documents(query):
+                # Legacy fee payments stored updated_at as an ISO string
+                if isinstance(doc.to_dict().get('updated_at'), datetime):
+                    continue
+                
+                batch.update(doc.reference, {'updated_at': firestore.SERVER_TIMESTAMP})
+                pending += 1
+                stamped += 1
+                if pending == PAGE_SIZE:
+                    batch.commit()
+                    batch = self.db.batch()
+                    pending = 0
+            
+            if pending:
+                batch.commit()
+            
+            log.info("Stamped updated_at on %s %s documents", stamped, collection, extra={"collection": collection, "sample": False})
+            return stamped
+        except Exception as e:
+            log.error("Error backfilling updated_at for %s: %s", collection, e)
+            return 0
+    
     def get_doc_id(self, col_name, key, value):
         try:
             collection_ref = self.db.collection(col_name)
@@ -118,7 +348,7 @@ class Database:
                 return docs[0].id
             return None
         except Exception as e:
-            print(f"Error getting document ID: {e}")
+            log.error("Error getting document ID: %s", e)
             return None
         
     def count_users(self):
@@ -129,7 +359,7 @@ class Database:
             count = result[0][0].value
             return int(count)
         except Exception as e:
-            print(f"Error counting users: {e}")
+            log.error("Error counting users: %s", e)
             return 0
     
     def validate_email(self, input_str):
@@ -153,7 +383,7 @@ class Database:
             docs = query.get()
             return len(docs) > 0
         except Exception as e:
-            print(f"Error checking user exists: {e}")
+            log.error("Error checking user exists: %s", e)
             return False
     
     def get_field(self, collection, key, value, required):
@@ -161,7 +391,7 @@ class Database:
             field = self.db.collection(collection).where(key, "==", value).get()[0]
             return field.to_dict().get(required)
         except Exception as e:
-            print(f"Error getting field: {e}")
+            log.error("Error getting field: %s", e)
             return None
     
     def change_user_password(self, password, username=None, email=None):
@@ -180,9 +410,9 @@ class Database:
                         "password": password
                     })
 
-            print("Password Changed Successfully")
+            log.info("Password Changed Successfully")
         except Exception as e:
-            print(f"Error changing password: {e}")
+            log.error("Error changing password: %s", e)
 
     def add_user(self, name, email, password):
         try:
@@ -193,9 +423,9 @@ class Database:
                 "password": f"{password.strip()}"
             })
             
-            print(f"User_{count + 1} Added")
+            log.info("User_%s Added", count + 1)
         except Exception as e:
-            print(f"Error adding user: {e}")
+            log.error("Error adding user: %s", e)
 
     def login_user(self, name, password):
         try:
@@ -209,7 +439,7 @@ class Database:
             return len(docs) > 0
                 
         except Exception as e:
-            print(f"Error in login_user: {e}")
+            log.error("Error in login_user: %s", e)
             return False
     
     def count_tenants(self):
@@ -220,7 +450,7 @@ class Database:
             count = result[0][0].value
             return int(count)
         except Exception as e:
-            print(f"Error counting tenants: {e}")
+            log.error("Error counting tenants: %s", e)
             return 0
     
     def count_complaints(self):
@@ -231,30 +461,25 @@ class Database:
             count = result[0][0].value
             return int(count)
         except Exception as e:
-            print(f"Error counting complaints: {e}")
+            log.error("Error counting complaints: %s", e)
             return 0
     
     def count_mess(self):
+        return self.get_mess_counts()["students"]
+    
+    def get_mess_counts(self, day=None):
+        """Students and meals marked on a day (default today), from the sharded counters"""
         try:
-            today_date = str(date.today())
-            
-            doc_ref = self.db.collection("messAttendance").document(today_date)
-            doc = doc_ref.get()
-
-            if doc.exists:
-                attendance_data = doc.to_dict()
-                count = len(attendance_data)  
-                return count
-            else:
-                return 0
+            return mess_attendance.read_counts(self.db, day or str(date.today()))
         except Exception as e:
-            print(f"Error counting mess: {e}")
-            return 0
+            log.error("Error counting mess: %s", e)
+            return dict.fromkeys(mess_attendance.COUNTED, 0)
     
     def update_tenant(self, id, name, t_type, email, phone, date, ac, sleep, smoking, room, status):
         try:
-            doc_id = self.get_doc_id("tenants", "id", int(id))
-            self.db.collection('tenants').document(doc_id).set({
+            stored = self.db.collection('tenants').where("id", "==", int(id)).get()[0]
+            # The tenant's previous room is read here so the occupancy index can move it
+            room_occupancy.write_tenant(self.db, stored.reference, {
                 "id": int(id),
                 "name": f"{name.strip()}",
                 "type": f"{t_type.strip()}",
@@ -266,16 +491,20 @@ class Database:
                 "sleep_time": f"{sleep.strip()}",
                 "smoking": f"{smoking.strip()}",
                 "status": f"{status}"
-            }, merge=True)
+            }, previous=stored.to_dict(), merge=True)
+            tenant_cache.invalidate()
             
-            print("Tenant details updated successfully")
+            log.info("Tenant details updated successfully")
         except Exception as e:
-            print(f"Error updating tenant: {e}")
+            log.error("Error updating tenant: %s", e)
     
     def add_tenant(self, id, name, t_type, email, phone, date, ac, sleep, smoking, room, status):
         try:
             count = self.count_tenants()
-            self.db.collection('tenants').document(f"ten_{count + 1}").set({
+            reference = self.db.collection('tenants').document(f"ten_{count + 1}")
+            # After a deletion the count can name an existing document, whose tenant then leaves the index
+            existing = reference.get()
+            room_occupancy.write_tenant(self.db, reference, {
                 "id": int(id),
                 "name": f"{name.strip()}",
                 "type": f"{t_type.strip()}",
@@ -287,11 +516,14 @@ class Database:
                 "sleep_time": f"{sleep.strip()}",
                 "smoking": f"{smoking.strip()}",
                 "status": f"{status}"
-            })
+            }, previous=existing.to_dict() if existing.exists else None)
+            tenant_cache.invalidate()
+            # A student re-admitted under the same id gets their ID card back
+            self.restore_pass(str(int(id)))
             
-            print(f"Tenant_{count + 1} Added")
+            log.info("Tenant_%s Added", count + 1)
         except Exception as e:
-            print(f"Error adding tenant: {e}")
+            log.error("Error adding tenant: %s", e)
     
     def get_tenant_s_details(self, ten_id, key=None):
         try:
@@ -307,7 +539,7 @@ class Database:
                     return doc
             return None
         except Exception as e:
-            print(f"Error getting tenant details: {e}")
+            log.error("Error getting tenant details: %s", e)
             return None
     
     def room_exists(self, room):
@@ -315,22 +547,22 @@ class Database:
             rooms = self.db.collection('rooms').where('room_no', '==', room).get()
             return len(rooms) > 0
         except Exception as e:
-            print(f"Error checking room exists: {e}")
+            log.error("Error checking room exists: %s", e)
             return False
     
     def count_rooms(self, d_board=False):
         try:
-            if not d_board:
-                room_ref = self.db.collection('rooms')
-            else:
-                room_ref = self.db.collection('rooms').where("status", "==", "Occupied")
+            if d_board:
+                # Occupied means every bed is taken, per the occupancy index
+                return sum(1 for room in self.get_room_occupancy() if room["status"] == room_occupancy.OCCUPIED)
             
+            room_ref = self.db.collection('rooms')
             count_query = room_ref.count()
             result = count_query.get()
             count = result[0][0].value
             return int(count)
         except Exception as e:
-            print(f"Error counting rooms: {e}")
+            log.error("Error counting rooms: %s", e)
             return 0
     
     def add_room(self, room_no, floor, capacity, ac, status):
@@ -344,26 +576,60 @@ class Database:
                 "status": status.strip()
             })
             
-            print(f"Room_{count + 1} Added")
+            log.info("Room_%s Added", count + 1)
         except Exception as e:
-            print(f"Error adding room: {e}")
+            log.error("Error adding room: %s", e)
     
     def get_rooms(self):
+        """Room numbers with a free bed that are not under maintenance"""
+        try:
+            return [room["room_no"] for room in self.get_room_occupancy()
+                    if room["status"] == room_occupancy.AVAILABLE]
+        except Exception as e:
+            log.error("Error getting rooms: %s", e)
+            return []
+    
+    def get_room_occupancy(self):
+        """Every room with its occupants and free beds, from the rooms and the occupancy index (two queries)"""
         try:
-            room_refs = self.db.collection('rooms')
-            rooms = room_refs.stream()
+            index = room_occupancy.read_index(self.db)
             
-            available = [
-                doc.to_dict().get('room_no')
-                for doc in rooms
-                if doc.to_dict().get('status') not in ["Occupied", "Under Maintenance"]
-            ]
+            rooms = []
+            for doc in self.db.collection('rooms').stream():
+                data = doc.to_dict()
+                occupants = index.get(str(data.get('room_no', '')).strip(), [])
+                rooms.append({
+                    "room_no": data.get('room_no'),
+                    "floor": data.get('floor'),
+                    "capacity": data.get('capacity'),
+                    "ac": data.get('ac'),
+                    "status": room_occupancy.room_status(data, occupants),
+                    "occupants": occupants,
+                    "free_beds": room_occupancy.free_beds(data, occupants)
+                })
             
-            return available
+            return rooms
         except Exception as e:
-            print(f"Error getting rooms: {e}")
+            log.error("Error getting room occupancy: %s", e)
             return []
     
+    def get_tenants_by_ids(self, ten_ids):
+        """Tenant documents by id, fetched together with "in" queries; returns {id: tenant}"""
+        try:
+            ten_ids = sorted({int(ten_id) for ten_id in ten_ids})
+            
+            tenants = {}
+            for start in range(0, len(ten_ids), IN_LIMIT):
+                query = self.db.collection('tenants').where("id", "in", ten_ids[start:start + IN_LIMIT])
+                for doc in query.stream():
+                    data = doc.to_dict()
+                    tenants[data.get('id')] = data
+            
+            return tenants
+        except Exception as e:
+            log.error("Error getting tenants by id: %s", e)
+            return {}
+    
     def get_tenants_details(self, ten_id=None, one_tenant=False):
         try:
             if not one_tenant:
@@ -398,26 +664,19 @@ class Database:
                             tenant_data.get('smoking'))
                 return None
         except Exception as e:
-            print(f"Error getting tenants details: {e}")
+            log.error("Error getting tenants details: %s", e)
             return [] if not one_tenant else None
     
     def get_rooms_details(self, room_no=None, edit=False):
         try:
             if not edit:
-                room_refs = self.db.collection('rooms')
-                rooms = room_refs.stream()
-                
-                rooms_data = []
-                
-                for doc in rooms:
-                    data = doc.to_dict()
-                    info = (data.get('room_no'), 
-                            data.get('floor'),
-                            data.get('capacity'),
-                            data.get('ac'),
-                            data.get('status'))
-                
-                    rooms_data.append(info)
+                # The status shown is the one the occupancy index implies, not the stored one
+                rooms_data = [(room['room_no'],
+                               room['floor'],
+                               room['capacity'],
+                               room['ac'],
+                               room['status'])
+                              for room in self.get_room_occupancy()]
             else:
                 rooms_data = self.db.collection('rooms').where('room_no', '==', room_no.strip()).get()[0].to_dict()
                 rooms_data = (rooms_data.get('room_no'), 
@@ -428,17 +687,24 @@ class Database:
                 
             return rooms_data
         except Exception as e:
-            print(f"Error getting rooms details: {e}")
+            log.error("Error getting rooms details: %s", e)
             return [] if not edit else None
     
     def delete_document(self, collection, key, value):
         try:
             result = self.db.collection(collection).where(key.strip(), '==', value).get()
-            self.db.collection(collection).document(result[0].id).delete()
-            print(f"Document '{result[0].id}' deleted successfully from {collection}")
+            if collection == "tenants":
+                # Frees the tenant's bed in the occupancy index in the same batch
+                room_occupancy.delete_tenant(self.db, result[0])
+                tenant_cache.invalidate()
+                # Their ID card is signed until the end of the year, so it is revoked
+                self.revoke_pass(str(value), 'STUDENT_ID', None, None, 'Tenant removed')
+            else:
+                self.db.collection(collection).document(result[0].id).delete()
+            log.info("Document '%s' deleted successfully from %s", result[0].id, collection, extra={"collection": collection})
             return True
         except Exception as e:
-            print("Error Deleting Document", e)
+            log.error("Error deleting document: %s", e)
             return False
     
     def update_room_details(self, doc_id, room_no, floor, capacity, ac, status):
@@ -451,41 +717,47 @@ class Database:
                 "status": status.strip()
             })
             
-            print(f"Room Data with {doc_id} is updated")
+            log.info("Room Data with %s is updated", doc_id, extra={"doc_id": doc_id})
         except Exception as e:
-            print(f"Error updating room: {e}")
+            log.error("Error updating room: %s", e)
     
     def save_mess_menu(self, week_menu):
         try:
-            self.db.collection("mess").document("strange_menu").set(week_menu)
-            print("Menu Saved Successfully")
+            version = menu_cache.save(self.db, week_menu)
+            log.info("Menu Saved Successfully (version %s)", version)
         except Exception as e:
-            print(f"Error saving menu: {e}")
+            log.error("Error saving menu: %s", e)
     
-    def get_mess_data(self):
+    def get_mess_data(self, page=1, per_page=None):
+        """Today's mess attendance sorted by student name, one page of per_page students (all without it)"""
         try:
             today_date = str(date.today())
             
-            doc = self.db.collection("messAttendance").document(today_date).get()
-            mess_data = doc.to_dict() or {} 
+            # Sorting by name needs the whole day; the records are small and read in one query
+            query = mess_attendance.day_query(self.db, today_date).select(["tenant_id", *mess_attendance.MEALS])
+            records = [doc.to_dict() for doc in query.stream()]
+            
+            # Every name in one lookup, normally served from the tenant cache
+            names = tenant_cache.lookup(self.db, [record.get("tenant_id") for record in records])
             
             new_list = []
 
-            for ten_id, attendance in mess_data.items():
-                try:
-                    ten_name = self.get_tenant_s_details(ten_id, "name")
-                except Exception as e:
-                    ten_name = f"Unknown ({ten_id})"
-                    print(f"Error fetching tenant name: {e}")
-
+            for record in records:
+                ten_id = record.get("tenant_id")
+                ten_name, _ = names.get(str(ten_id), (f"Unknown ({ten_id})", None))
                 new_list.append({
                     "name": ten_name,
-                    "attendance": attendance
+                    "attendance": {meal: bool(record.get(meal)) for meal in mess_attendance.MEALS}
                 })
 
+            new_list.sort(key=lambda row: str(row["name"]).casefold())
+            if per_page:
+                start = (page - 1) * per_page
+                new_list = new_list[start:start + per_page]
+
             return new_list
         except Exception as e:
-            print(f"Error getting mess data: {e}")
+            log.error("Error getting mess data: %s", e)
             return []
     
     def get_complaint_details(self):
@@ -505,7 +777,7 @@ class Database:
             
             return complaints
         except Exception as e:
-            print(f"Error getting complaints: {e}")
+            log.error("Error getting complaints: %s", e)
             return []
     
     def update_complaint_status(self, comp_id):
@@ -513,12 +785,13 @@ class Database:
             doc_id = self.get_doc_id("complaints", "id", comp_id)
             
             self.db.collection("complaints").document(doc_id).update({
-                "status": "resolved"
+                "status": "resolved",
+                "updated_at": firestore.SERVER_TIMESTAMP
             })
             
-            print("Complaint Status Updated")
+            log.info("Complaint Status Updated")
         except Exception as e:
-            print(f"Error updating complaint status: {e}")
+            log.error("Error updating complaint status: %s", e)
     
     def submit_complaint(self, tenant_id, description, complaint_type, priority):
         """Submit a new complaint"""
@@ -526,7 +799,7 @@ class Database:
             # Get tenant details
             tenant = self.get_tenant_s_details(tenant_id)
             if not tenant:
-                print(f"Tenant {tenant_id} not found")
+                log.warning("Tenant %s not found", tenant_id)
                 return False
             
             # Generate complaint ID
@@ -549,13 +822,14 @@ class Database:
                 "complaint_type": complaint_type,
                 "priority": priority,
                 "status": "pending",
-                "created_at": datetime.now().isoformat()
+                "created_at": datetime.now().isoformat(),
+                "updated_at": firestore.SERVER_TIMESTAMP
             })
             
-            print(f"Complaint {complaint_id} submitted successfully")
+            log.info("Complaint %s submitted successfully", complaint_id, extra={"complaint_id": complaint_id})
             return True
         except Exception as e:
-            print(f"Error submitting complaint: {e}")
+            log.error("Error submitting complaint: %s", e)
             return False
 
     # Message Methods
@@ -592,7 +866,7 @@ class Database:
             
             return list(conversations.values())
         except Exception as e:
-            print(f"Error getting conversations: {e}")
+            log.error("Error getting conversations: %s", e)
             return []
     
     def count_unread_messages(self, user_id, user_type):
@@ -603,7 +877,7 @@ class Database:
             docs = query.get()
             return len(docs)
         except Exception as e:
-            print(f"Error counting unread messages: {e}")
+            log.error("Error counting unread messages: %s", e)
             return 0
     
     def get_messages(self, user_id, user_type, inbox=True):
@@ -626,7 +900,7 @@ class Database:
             
             return messages
         except Exception as e:
-            print(f"Error getting messages: {e}")
+            log.error("Error getting messages: %s", e)
             return []
     
     def broadcast_message(self, sender_id, subject, message):
@@ -642,7 +916,7 @@ class Database:
             
             return count
         except Exception as e:
-            print(f"Error broadcasting message: {e}")
+            log.error("Error broadcasting message: %s", e)
             return 0
     
     def send_message(self, sender_id, sender_type, receiver_id, receiver_type, subject, message):
@@ -661,9 +935,9 @@ class Database:
                 'read': False
             })
             
-            print(f"Message sent from {sender_id} to {receiver_id}")
+            log.info("Message sent from %s to %s", sender_id, receiver_id, extra={"sender_id": sender_id, "receiver_id": receiver_id})
         except Exception as e:
-            print(f"Error sending message: {e}")
+            log.error("Error sending message: %s", e)
     
     def get_message_by_id(self, message_id):
         """Get a specific message by ID"""
@@ -675,25 +949,25 @@ class Database:
                 return data
             return None
         except Exception as e:
-            print(f"Error getting message: {e}")
+            log.error("Error getting message: %s", e)
             return None
     
     def mark_message_read(self, message_id):
         """Mark a message as read"""
         try:
             self.db.collection('messages').document(message_id).update({'read': True})
-            print(f"Message {message_id} marked as read")
+            log.info("Message %s marked as read", message_id, extra={"message_id": message_id})
         except Exception as e:
-            print(f"Error marking message as read: {e}")
+            log.error("Error marking message as read: %s", e)
     
     def delete_message(self, message_id):
         """Delete a message"""
         try:
             self.db.collection('messages').document(message_id).delete()
-            print(f"Message {message_id} deleted")
+            log.info("Message %s deleted", message_id, extra={"message_id": message_id})
             return True
         except Exception as e:
-            print(f"Error deleting message: {e}")
+            log.error("Error deleting message: %s", e)
             return False
     
     def get_conversation(self, admin_id, student_id):
@@ -725,7 +999,7 @@ class Database:
             
             return messages
         except Exception as e:
-            print(f"Error getting conversation: {e}")
+            log.error("Error getting conversation: %s", e)
             return []
     
     def delete_conversation(self, admin_id, student_id):
@@ -738,7 +1012,7 @@ class Database:
             
             return True
         except Exception as e:
-            print(f"Error deleting conversation: {e}")
+            log.error("Error deleting conversation: %s", e)
             return False
     
     # Fee Methods
@@ -764,7 +1038,7 @@ class Database:
             
             return fees
         except Exception as e:
-            print(f"Error getting fees: {e}")
+            log.error("Error getting fees: %s", e)
             return []
     
     def add_fee_record(self, student_id, amount, due_date, fee_type):
@@ -777,12 +1051,13 @@ class Database:
                 'fee_type': fee_type,
                 'status': 'pending',
                 'paid_amount': 0,
-                'created_at': datetime.now().isoformat()
+                'created_at': datetime.now().isoformat(),
+                'updated_at': firestore.SERVER_TIMESTAMP
             })
             
-            print(f"Fee record added for student {student_id}")
+            log.info("Fee record added for student %s", student_id, extra={"student_id": student_id})
         except Exception as e:
-            print(f"Error adding fee record: {e}")
+            log.error("Error adding fee record: %s", e)
     
     def update_fee_payment(self, fee_id, paid_amount, paid_date, payment_method, transaction_id=None, notes=None):
         """Update fee payment information"""
@@ -792,7 +1067,7 @@ class Database:
                 'paid_date': paid_date,
                 'payment_method': payment_method,
                 'status': 'paid',
-                'updated_at': datetime.now().isoformat()
+                'updated_at': firestore.SERVER_TIMESTAMP
             }
             
             if transaction_id:
@@ -802,9 +1077,9 @@ class Database:
             
             self.db.collection('fees').document(fee_id).update(update_data)
             
-            print(f"Fee payment updated for {fee_id}")
+            log.info("Fee payment updated for %s", fee_id, extra={"fee_id": fee_id})
         except Exception as e:
-            print(f"Error updating fee payment: {e}")
+            log.error("Error updating fee payment: %s", e)
     
     def get_fee_by_id(self, fee_id):
         """Get a specific fee record by ID"""
@@ -824,12 +1099,14 @@ class Database:
                 return data
             return None
         except Exception as e:
-            print(f"Error getting fee by ID: {e}")
+            log.error("Error getting fee by ID: %s", e)
             return None
     
     def export_fees_to_excel(self):
         """Export fees to Excel"""
         try:
+            import pandas as pd
+
             fees = self.get_all_fees()
             df = pd.DataFrame(fees)
             
@@ -839,7 +1116,7 @@ class Database:
             output.seek(0)
             return output
         except Exception as e:
-            print(f"Error exporting fees: {e}")
+            log.error("Error exporting fees: %s", e)
             return BytesIO()
     
     def get_payment_history(self, fee_id=None, student_id=None):
@@ -865,14 +1142,14 @@ class Database:
             else:
                 return []
         except Exception as e:
-            print(f"Error getting payment history: {e}")
+            log.error("Error getting payment history: %s", e)
             return []
 
     # Leave Request Management Methods
     def submit_leave_request(self, student_id, student_name, room, leave_from, leave_to, purpose, destination, emergency_contact):
         """Submit a leave request for admin approval"""
         try:
-            request_id = f"LR{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            request_id = new_id("LR")
             
             leave_request = {
                 'request_id': request_id,
@@ -888,54 +1165,44 @@ class Database:
                 'submitted_at': datetime.now().isoformat(),
                 'approved_at': None,
                 'approved_by': None,
-                'qr_code': None,
-                'pass_id': None
+                'qr_hash': None,
+                'pass_id': None,
+                'updated_at': firestore.SERVER_TIMESTAMP
             }
             
             doc_ref = self.db.collection("leave_requests").document(request_id)
             doc_ref.set(leave_request)
             
-            print(f"Leave request {request_id} submitted successfully")
+            log.info("Leave request %s submitted successfully", request_id)
             return request_id
         except Exception as e:
-            print(f"Error submitting leave request: {e}")
+            log.error("Error submitting leave request: %s", e)
             return None
     
     def get_pending_leave_requests(self):
         """Get all pending leave requests for admin approval"""
         try:
             requests_ref = self.db.collection("leave_requests")
-            docs = requests_ref.stream()
-            
-            requests = []
-            for doc in docs:
-                request_data = doc.to_dict()
-                if request_data.get('status') == 'Pending':
-                    requests.append(request_data)
+            docs = requests_ref.where('status', '==', 'Pending').stream()
             
-            # Sort by submitted_at in Python
+            # Sort by submitted_at in Python: ordering the filtered query would need a
+            # composite (status, submitted_at) index, and the pending set is small
+            requests = [doc.to_dict() for doc in docs]
             requests.sort(key=lambda x: x.get('submitted_at', ''), reverse=True)
             return requests
         except Exception as e:
-            print(f"Error getting pending leave requests: {e}")
+            log.error("Error getting pending leave requests: %s", e)
             return []
     
     def get_all_leave_requests(self):
         """Get all leave requests with status"""
         try:
             requests_ref = self.db.collection("leave_requests")
-            docs = requests_ref.stream()
+            docs = requests_ref.order_by('submitted_at', direction=firestore.Query.DESCENDING).stream()
             
-            requests = []
-            for doc in docs:
-                request_data = doc.to_dict()
-                requests.append(request_data)
-            
-            # Sort by submitted_at in Python
-            requests.sort(key=lambda x: x.get('submitted_at', ''), reverse=True)
-            return requests
+            return [doc.to_dict() for doc in docs]
         except Exception as e:
-            print(f"Error getting leave requests: {e}")
+            log.error("Error getting leave requests: %s", e)
             return []
     
     def approve_leave_request(self, request_id, admin_id):
@@ -951,9 +1218,10 @@ class Database:
             request_data = doc.to_dict()
             
             # Generate pass ID and update status
-            pass_id = f"L{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            pass_id = new_id("L")
             
             updates = {
+                'updated_at': firestore.SERVER_TIMESTAMP,
                 'status': 'Approved',
                 'approved_at': datetime.now().isoformat(),
                 'approved_by': admin_id,
@@ -962,18 +1230,20 @@ class Database:
             
             doc_ref.update(updates)
             
-            print(f"Leave request {request_id} approved successfully")
+            log.info("Leave request %s approved successfully", request_id)
             return True, pass_id
         except Exception as e:
-            print(f"Error approving leave request: {e}")
+            log.error("Error approving leave request: %s", e)
             return False, str(e)
     
     def reject_leave_request(self, request_id, admin_id, reason=None):
-        """Reject a leave request"""
+        """Reject a leave request, revoking its pass if one was already issued"""
         try:
             doc_ref = self.db.collection("leave_requests").document(request_id)
+            doc = doc_ref.get()
             
             updates = {
+                'updated_at': firestore.SERVER_TIMESTAMP,
                 'status': 'Rejected',
                 'rejected_at': datetime.now().isoformat(),
                 'rejected_by': admin_id,
@@ -982,17 +1252,50 @@ class Database:
             
             doc_ref.update(updates)
             
-            print(f"Leave request {request_id} rejected successfully")
+            issued_id = doc.to_dict().get('pass_id') if doc.exists else None
+            if issued_id:
+                self.revoke_pass(issued_id, 'LEAVE_PASS', request_id, admin_id, reason)
+            
+            log.info("Leave request %s rejected successfully", request_id)
             return True
         except Exception as e:
-            print(f"Error rejecting leave request: {e}")
+            log.error("Error rejecting leave request: %s", e)
             return False
     
+    def cancel_leave_request(self, request_id, admin_id, reason=None):
+        """Cancel an approved leave request and revoke its pass"""
+        try:
+            doc_ref = self.db.collection("leave_requests").document(request_id)
+            doc = doc_ref.get()
+            
+            if not doc.exists:
+                return False, "Request not found"
+            
+            updates = {
+                'updated_at': firestore.SERVER_TIMESTAMP,
+                'status': 'Cancelled',
+                'cancelled_at': datetime.now().isoformat(),
+                'cancelled_by': admin_id,
+                'cancellation_reason': reason or 'No reason provided'
+            }
+            
+            doc_ref.update(updates)
+            
+            issued_id = doc.to_dict().get('pass_id')
+            if issued_id:
+                self.revoke_pass(issued_id, 'LEAVE_PASS', request_id, admin_id, reason)
+            
+            log.info("Leave request %s cancelled successfully", request_id)
+            return True, issued_id
+        except Exception as e:
+            log.error("Error cancelling leave request: %s", e)
+            return False, str(e)
+    
     # Visitor Request Management Methods
     def submit_visitor_request(self, student_id, student_name, room, visitor_name, visitor_phone, visit_date, entry_time, purpose, valid_until):
         """Submit a visitor request for admin approval"""
         try:
-            request_id = f"VR{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            request_id = new_id("VR")
             
             visitor_request = {
                 'request_id': request_id,
@@ -1009,54 +1312,44 @@ class Database:
                 'submitted_at': datetime.now().isoformat(),
                 'approved_at': None,
                 'approved_by': None,
-                'qr_code': None,
-                'visitor_id': None
+                'qr_hash': None,
+                'visitor_id': None,
+                'updated_at': firestore.SERVER_TIMESTAMP
             }
             
             doc_ref = self.db.collection("visitor_requests").document(request_id)
             doc_ref.set(visitor_request)
             
-            print(f"Visitor request {request_id} submitted successfully")
+            log.info("Visitor request %s submitted successfully", request_id)
             return request_id
         except Exception as e:
-            print(f"Error submitting visitor request: {e}")
+            log.error("Error submitting visitor request: %s", e)
             return None
     
     def get_pending_visitor_requests(self):
         """Get all pending visitor requests for admin approval"""
         try:
             requests_ref = self.db.collection("visitor_requests")
-            docs = requests_ref.stream()
-            
-            requests = []
-            for doc in docs:
-                request_data = doc.to_dict()
-                if request_data.get('status') == 'Pending':
-                    requests.append(request_data)
+            docs = requests_ref.where('status', '==', 'Pending').stream()
             
-            # Sort by submitted_at in Python
+            # Sort by submitted_at in Python: ordering the filtered query would need a
+            # composite (status, submitted_at) index, and the pending set is small
+            requests = [doc.to_dict() for doc in docs]
             requests.sort(key=lambda x: x.get('submitted_at', ''), reverse=True)
             return requests
         except Exception as e:
-            print(f"Error getting pending visitor requests: {e}")
+            log.error("Error getting pending visitor requests: %s", e)
             return []
     
     def get_all_visitor_requests(self):
         """Get all visitor requests with status"""
         try:
             requests_ref = self.db.collection("visitor_requests")
-            docs = requests_ref.stream()
-            
-            requests = []
-            for doc in docs:
-                request_data = doc.to_dict()
-                requests.append(request_data)
+            docs = requests_ref.order_by('submitted_at', direction=firestore.Query.DESCENDING).stream()
             
-            # Sort by submitted_at in Python
-            requests.sort(key=lambda x: x.get('submitted_at', ''), reverse=True)
-            return requests
+            return [doc.to_dict() for doc in docs]
         except Exception as e:
-            print(f"Error getting visitor requests: {e}")
+            log.error("Error getting visitor requests: %s", e)
             return []
     
     def approve_visitor_request(self, request_id, admin_id):
@@ -1072,9 +1365,10 @@ class Database:
             request_data = doc.to_dict()
             
             # Generate visitor ID and update status
-            visitor_id = f"V{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            visitor_id = new_id("V")
             
             updates = {
+                'updated_at': firestore.SERVER_TIMESTAMP,
                 'status': 'Approved',
                 'approved_at': datetime.now().isoformat(),
                 'approved_by': admin_id,
@@ -1083,18 +1377,20 @@ class Database:
             
             doc_ref.update(updates)
             
-            print(f"Visitor request {request_id} approved successfully")
+            log.info("Visitor request %s approved successfully", request_id)
             return True, visitor_id
         except Exception as e:
-            print(f"Error approving visitor request: {e}")
+            log.error("Error approving visitor request: %s", e)
             return False, str(e)
     
     def reject_visitor_request(self, request_id, admin_id, reason=None):
-        """Reject a visitor request"""
+        """Reject a visitor request, revoking its pass if one was already issued"""
         try:
             doc_ref = self.db.collection("visitor_requests").document(request_id)
+            doc = doc_ref.get()
             
             updates = {
+                'updated_at': firestore.SERVER_TIMESTAMP,
                 'status': 'Rejected',
                 'rejected_at': datetime.now().isoformat(),
                 'rejected_by': admin_id,
@@ -1103,12 +1399,130 @@ class Database:
             
             doc_ref.update(updates)
             
-            print(f"Visitor request {request_id} rejected successfully")
+            issued_id = doc.to_dict().get('visitor_id') if doc.exists else None
+            if issued_id:
+                self.revoke_pass(issued_id, 'VISITOR_ENTRY', request_id, admin_id, reason)
+            
+            log.info("Visitor request %s rejected successfully", request_id)
             return True
         except Exception as e:
-            print(f"Error rejecting visitor request: {e}")
+            log.error("Error rejecting visitor request: %s", e)
             return False
     
+    def cancel_visitor_request(self, request_id, admin_id, reason=None):
+        """Cancel an approved visitor request and revoke its pass"""
+        try:
+            doc_ref = self.db.collection("visitor_requests").document(request_id)
+            doc = doc_ref.get()
+            
+            if not doc.exists:
+                return False, "Request not found"
+            
+            updates = {
+                'updated_at': firestore.SERVER_TIMESTAMP,
+                'status': 'Cancelled',
+                'cancelled_at': datetime.now().isoformat(),
+                'cancelled_by': admin_id,
+                'cancellation_reason': reason or 'No reason provided'
+            }
+            
+            doc_ref.update(updates)
+            
+            issued_id = doc.to_dict().get('visitor_id')
+            if issued_id:
+                self.revoke_pass(issued_id, 'VISITOR_ENTRY', request_id, admin_id, reason)
+            
+            log.info("Visitor request %s cancelled successfully", request_id)
+            return True, issued_id
+        except Exception as e:
+            log.error("Error cancelling visitor request: %s", e)
+            return False, str(e)
+    
+    # Pass Revocation Methods
+    def revoke_pass(self, pass_id, pass_type, request_id, admin_id, reason=None):
+        """Add an issued pass to the revocation list"""
+        try:
+            self.db.collection("revoked_passes").document(pass_id).set({
+                'pass_id': pass_id,
+                'pass_type': pass_type,
+                'request_id': request_id,
+                'revoked_by': admin_id,
+                'reason': reason or 'No reason provided',
+                'revoked_at': datetime.now().isoformat(),
+                'updated_at': firestore.SERVER_TIMESTAMP
+            })
+            
+            log.info("Pass %s revoked", pass_id, extra={"pass_id": pass_id})
+            return True
+        except Exception as e:
+            log.error("Error revoking pass: %s", e)
+            return False
+    
+    def restore_pass(self, pass_id):
+        """Take a revoked pass off the revocation list, e.g. the ID card of a re-admitted student"""
+        try:
+            doc_ref = self.db.collection("revoked_passes").document(pass_id)
+            if not doc_ref.get().exists:
+                return False
+            
+            doc_ref.update({
+                'restored_at': datetime.now().isoformat(),
+                'updated_at': firestore.SERVER_TIMESTAMP
+            })
+            
+            log.info("Pass %s restored", pass_id, extra={"pass_id": pass_id})
+            return True
+        except Exception as e:
+            log.error("Error restoring pass: %s", e)
+            return False
+    
+    def get_revoked_passes(self, since=None, after_id=None):
+        """Revoked passes written after an (updated_at, pass id) cursor, oldest first; all of them without one"""
+        try:
+            revoked_ref = self.db.collection("revoked_passes")
+            
+            if since is None:
+                # Everything, including passes revoked before updated_at was stamped
+                query = revoked_ref
+            else:
+                # The same cursor as the change feed: updated_at is the server's commit
+                # time, so a revocation cannot land behind a watermark already passed
+                query = revoked_ref.order_by('updated_at').order_by(FieldPath.document_id())
+                if after_id:
+                    query = query.start_after([since, revoked_ref.document(after_id)])
+                else:
+                    query = query.where('updated_at', '>', since)
+            
+            return [dict(doc.to_dict(), id=doc.id) for doc in query.stream()]
+        except Exception as e:
+            log.error("Error getting revoked passes: %s", e)
+            return []
+    
+    def move_inline_qr_codes_to_blobs(self, store):
+        """Move base64 qr_code images out of request documents into the blob store"""
+        moved = 0
+        
+        for collection in ("leave_requests", "visitor_requests"):
+            try:
+                for doc in self.db.collection(collection).stream():
+                    qr_code = doc.to_dict().get('qr_code')
+                    if not qr_code:
+                        continue
+                    
+                    encoded = qr_code.split(',', 1)[1] if qr_code.startswith('data:') else qr_code
+                    qr_hash = store.put_content(base64.b64decode(encoded))
+                    
+                    doc.reference.update({
+                        'qr_hash': qr_hash,
+                        'qr_code': firestore.DELETE_FIELD
+                    })
+                    moved += 1
+            except Exception as e:
+                log.error("Error moving QR codes from %s: %s", collection, e)
+        
+        log.info("Moved %s QR codes to blob store", moved, extra={"sample": False})
+        return moved
+    
     def get_leave_request_by_id(self, request_id):
         """Get a specific leave request by ID"""
         try:
@@ -1119,7 +1533,7 @@ class Database:
                 return doc.to_dict()
             return None
         except Exception as e:
-            print(f"Error getting leave request: {e}")
+            log.error("Error getting leave request: %s", e)
             return None
     
     def get_visitor_request_by_id(self, request_id):
@@ -1132,9 +1546,14 @@ class Database:
                 return doc.to_dict()
             return None
         except Exception as e:
-            print(f"Error getting visitor request: {e}")
+            log.error("Error getting visitor request: %s", e)
             return None
 
+# Shared by every route module; connects to the datastore on first use
+db = LazyObject(Database)
+# The same methods as coroutines, for async views that await independent reads together
+adb = AsyncDatabase(db)
+
 if __name__ == "__main__":
     app = Database()
-    print("Firebase Database initialized successfully")
\ No newline at end of file
+    log.info("Firebase Database initialized successfully", extra={"sample": False})
\ No newline at end of file
@@ -1,8 +1,12 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, jsonify
-from admin.database.firebase import Database
-from utils.ml_utils import predict_priority, extract_features
+from admin.database.firebase import db
+from utils.lazy import lazy_import
+from utils import headcount, room_occupancy
+
+# scikit-learn and the priority model load with the first prediction
+predict_priority = lazy_import('utils.ml_utils', 'predict_priority')
+extract_features = lazy_import('utils.ml_utils', 'extract_features')
 
-db = Database()
 ai_bp = Blueprint("ai", 
                   __name__,
                   template_folder="../templates")
@@ -25,30 +29,28 @@ class AIRoutes:
         sleeptime = data.get('sleeptime')
         smoking = data.get('smoking')
         
-        # Get available rooms
-        available_rooms = db.get_rooms()
+        # Get available rooms, with their occupants from the occupancy index
+        available_rooms = [room for room in db.get_room_occupancy() if room['status'] == 'Available']
         
         if not available_rooms:
             return jsonify({'success': False, 'message': 'No available rooms'})
         
-        # Get room details and score them
+        # Current tenants of every candidate room, in one batched fetch
+        residents = db.get_tenants_by_ids([ten_id for room in available_rooms for ten_id in room['occupants']])
+        
+        # Score the rooms
         room_scores = []
-        for room_no in available_rooms:
-            room_data = db.get_rooms_details(room_no, edit=True)
-            
-            # Get current tenants in the room
-            tenants = db.db.collection('tenants').where('room', '==', room_no).get()
+        for room in available_rooms:
+            tenants = [residents[ten_id] for ten_id in room['occupants'] if ten_id in residents]
             
             compatibility_score = 0
             
             # Check AC preference match
-            if room_data[3] == ac:  # room_data[3] is AC status
+            if room['ac'] == ac:
                 compatibility_score += 30
             
             # Check compatibility with existing roommates
-            for tenant in tenants:
-                tenant_data = tenant.to_dict()
-                
+            for tenant_data in tenants:
                 # Sleep time compatibility (within 2 hours)
                 try:
                     tenant_sleep = int(tenant_data.get('sleep_time', '22'))
@@ -70,12 +72,13 @@ class AIRoutes:
                     compatibility_score += 20
             
             room_scores.append({
-                'room_no': room_no,
+                'room_no': room['room_no'],
                 'score': compatibility_score,
-                'floor': room_data[1],
-                'capacity': room_data[2],
-                'ac': room_data[3],
-                'current_occupants': len(tenants)
+                'floor': room['floor'],
+                'capacity': room['capacity'],
+                'ac': room['ac'],
+                'current_occupants': len(room['occupants']),
+                'free_beds': room['free_beds']
             })
         
         # Sort by score (highest first)
@@ -203,18 +206,10 @@ class AIRoutes:
             # Get historical mess attendance data
             from datetime import datetime, timedelta
             
-            # Get last 7 days of attendance
-            attendance_data = []
-            for i in range(7):
-                date = (datetime.now() - timedelta(days=i)).date()
-                date_str = str(date)
-                
-                doc = db.db.collection("messAttendance").document(date_str).get()
-                if doc.exists:
-                    data = doc.to_dict()
-                    attendance_data.append(len(data))
-                else:
-                    attendance_data.append(0)
+            # Get the last 7 completed days of attendance, from the meal counters; today's
+            # partial count would pull the average down (as in the kitchen headcounts)
+            history = headcount.history(db.db, datetime.now().date() - timedelta(days=1))
+            attendance_data = [counts["students"] for counts in history]
             
             if not attendance_data or sum(attendance_data) == 0:
                 return jsonify({
@@ -223,15 +218,10 @@ class AIRoutes:
                     'message': 'No historical data available'
                 })
             
-            # Simple moving average forecast
+            # Simple moving average forecast, lowered on weekends (shared with the kitchen headcounts)
             avg_attendance = sum(attendance_data) / len(attendance_data)
-            
-            # Adjust for day of week (weekends typically have lower attendance)
             tomorrow = datetime.now() + timedelta(days=1)
-            if tomorrow.weekday() in [5, 6]:  # Saturday or Sunday
-                forecast = int(avg_attendance * 0.8)
-            else:
-                forecast = int(avg_attendance)
+            forecast = headcount.forecast(history, tomorrow)["students"]
             
             return jsonify({
                 'success': True,
@@ -264,15 +254,13 @@ class AIRoutes:
             if not student:
                 return jsonify({'success': False, 'message': 'Student not found'})
             
-            # Get all students in the same room
+            # Get all students in the same room, from the occupancy index
             room_no = student.get('room')
-            roommates = db.db.collection('tenants').where('room', '==', room_no).get()
+            roommates = db.get_tenants_by_ids(room_occupancy.occupants(db.db, room_no)) if room_no else {}
             
             compatibility_scores = []
             
-            for roommate in roommates:
-                roommate_data = roommate.to_dict()
-                
+            for roommate_data in roommates.values():
                 # Skip self
                 if roommate_data.get('id') == int(student_id):
                     continue
@@ -1,9 +1,16 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, send_file, jsonify, session
-from admin.database.firebase import Database
+from admin.database.firebase import db, adb
+from utils.csv_stream import csv_response
 from datetime import date, datetime, timedelta
+import asyncio
 import json
+from utils.log import get_logger
+
+log = get_logger("routes.attendance")
+
+# Days of history behind the smart attendance trends and low-attendance list
+TREND_DAYS = 30
 
-db = Database()
 attendance_bp = Blueprint('attendance',
                          __name__,
                          template_folder="../templates")
@@ -12,17 +19,25 @@ class AttendanceRoutes:
     
     @staticmethod
     @attendance_bp.route('/smart_attendance')
-    def smart_attendance():
+    async def smart_attendance():
         """Smart attendance dashboard with analytics"""
         if 'username' not in session:
             return redirect(url_for('auth.signin_page'))
         
         try:
             today = date.today()
-            tenants = db.get_tenants_details()
+            
+            # Every panel works from the tenant list and the last TREND_DAYS of attendance,
+            # so both are read once, concurrently, instead of per panel, day and student
+            tenants, attendance = await asyncio.gather(
+                adb.get_tenants_details(),
+                adb.get_attendance_between(str(today - timedelta(days=TREND_DAYS - 1)), str(today)))
+            attendance_by_date = {}
+            for record in attendance:
+                attendance_by_date.setdefault(record.get('date'), []).append(record)
             total_students = len(tenants)
             
-            today_attendance = db.get_attendance_by_date(str(today))
+            today_attendance = attendance_by_date.get(str(today), [])
             
             present_count = len([a for a in today_attendance if a.get('status') == 'Present'])
             absent_count = len([a for a in today_attendance if a.get('status') == 'Absent'])
@@ -32,10 +47,10 @@ class AttendanceRoutes:
             present_percentage = (present_count / total_students * 100) if total_students > 0 else 0
             absent_percentage = (absent_count / total_students * 100) if total_students > 0 else 0
             
-            weekly_data = AttendanceRoutes._get_weekly_attendance_data()
-            trends = AttendanceRoutes._get_attendance_trends()
-            poor_attendance = AttendanceRoutes._get_poor_attendance_students()
-            recent_records = AttendanceRoutes._get_recent_attendance_records()
+            weekly_data = AttendanceRoutes._get_weekly_attendance_data(attendance_by_date)
+            trends = AttendanceRoutes._get_attendance_trends(attendance_by_date)
+            poor_attendance = AttendanceRoutes._get_poor_attendance_students(tenants, attendance_by_date)
+            recent_records = AttendanceRoutes._get_recent_attendance_records(tenants, attendance_by_date)
             
             return render_template('smart_attendance.html',
                                  total_students=total_students,
@@ -119,7 +134,7 @@ class AttendanceRoutes:
                             db.mark_attendance(int(tenant_id), attendance_date, status)
                             success_count += 1
                     except Exception as e:
-                        print(f"Error marking attendance: {e}")
+                        log.error("Error marking attendance: %s", e)
                         continue
                 
                 return jsonify({
@@ -169,14 +184,13 @@ class AttendanceRoutes:
                              current_date=str(date.today()))
     
     @staticmethod
-    def _get_weekly_attendance_data():
+    def _get_weekly_attendance_data(attendance_by_date):
         """Get attendance data for the last 7 days"""
         weekly_data = []
         for i in range(6, -1, -1):
             date_obj = date.today() - timedelta(days=i)
-            date_str = str(date_obj)
             
-            attendance = db.get_attendance_by_date(date_str)
+            attendance = attendance_by_date.get(str(date_obj), [])
             present = len([a for a in attendance if a.get('status') == 'Present'])
             absent = len([a for a in attendance if a.get('status') == 'Absent'])
             
@@ -189,16 +203,16 @@ class AttendanceRoutes:
         return weekly_data
     
     @staticmethod
-    def _get_attendance_trends():
+    def _get_attendance_trends(attendance_by_date):
         """Get attendance trends and insights"""
         try:
             trends = []
             total_days = 0
             total_present = 0
             
-            for i in range(30):
+            for i in range(TREND_DAYS):
                 date_obj = date.today() - timedelta(days=i)
-                attendance = db.get_attendance_by_date(str(date_obj))
+                attendance = attendance_by_date.get(str(date_obj), [])
                 
                 if attendance:
                     present = len([a for a in attendance if a.get('status') == 'Present'])
@@ -215,8 +229,8 @@ class AttendanceRoutes:
             else:
                 insights.append("📉 Attendance needs improvement")
             
-            today_attendance = db.get_attendance_by_date(str(date.today()))
-            yesterday_attendance = db.get_attendance_by_date(str(date.today() - timedelta(days=1)))
+            today_attendance = attendance_by_date.get(str(date.today()), [])
+            yesterday_attendance = attendance_by_date.get(str(date.today() - timedelta(days=1)), [])
             
             today_present = len([a for a in today_attendance if a.get('status') == 'Present'])
             yesterday_present = len([a for a in yesterday_attendance if a.get('status') == 'Present'])
@@ -234,12 +248,20 @@ class AttendanceRoutes:
             return {'avg_attendance': 0, 'insights': []}
     
     @staticmethod
-    def _get_poor_attendance_students():
+    def _get_poor_attendance_students(tenants, attendance_by_date):
         """Get students with poor attendance (less than 70%)"""
         try:
-            tenants = db.get_tenants_details()
             poor_attendance = []
             
+            # tenant_id -> that student's first record, per day
+            daily_records = []
+            for i in range(TREND_DAYS):
+                date_obj = date.today() - timedelta(days=i)
+                records = {}
+                for record in attendance_by_date.get(str(date_obj), []):
+                    records.setdefault(record.get('tenant_id'), record)
+                daily_records.append(records)
+            
             for tenant in tenants:
                 tenant_id = tenant[0]
                 tenant_name = tenant[1]
@@ -248,11 +270,8 @@ class AttendanceRoutes:
                 total_days = 0
                 present_days = 0
                 
-                for i in range(30):
-                    date_obj = date.today() - timedelta(days=i)
-                    attendance = db.get_attendance_by_date(str(date_obj))
-                    
-                    student_record = next((a for a in attendance if a.get('tenant_id') == tenant_id), None)
+                for records in daily_records:
+                    student_record = records.get(tenant_id)
                     if student_record:
                         total_days += 1
                         if student_record.get('status') == 'Present':
@@ -273,20 +292,19 @@ class AttendanceRoutes:
             poor_attendance.sort(key=lambda x: x['attendance_rate'])
             return poor_attendance[:10]
         except Exception as e:
-            print(f"Error in _get_poor_attendance_students: {e}")
+            log.error("Error in _get_poor_attendance_students: %s", e)
             return []
     
     @staticmethod
-    def _get_recent_attendance_records():
+    def _get_recent_attendance_records(tenants, attendance_by_date):
         """Get recent attendance records with student details"""
         try:
             recent_records = []
-            tenants = db.get_tenants_details()
             tenant_dict = {tenant[0]: {'name': tenant[1], 'room': tenant[2]} for tenant in tenants}
             
             for i in range(3):
                 date_obj = date.today() - timedelta(days=i)
-                attendance = db.get_attendance_by_date(str(date_obj))
+                attendance = attendance_by_date.get(str(date_obj), [])
                 
                 for record in attendance:
                     tenant_id = record.get('tenant_id')
@@ -303,7 +321,7 @@ class AttendanceRoutes:
             recent_records.sort(key=lambda x: x['date'], reverse=True)
             return recent_records[:20]
         except Exception as e:
-            print(f"Error in _get_recent_attendance_records: {e}")
+            log.error("Error in _get_recent_attendance_records: %s", e)
             return []
     
     @staticmethod
@@ -346,3 +364,20 @@ class AttendanceRoutes:
             as_attachment=True,
             download_name=f'attendance_{date.today()}.xlsx'
         )
+    
+    @staticmethod
+    @attendance_bp.route('/export_attendance_csv')
+    def export_attendance_csv():
+        """Stream attendance as CSV, optionally limited to ?start_date=&end_date="""
+        start_date = request.args.get('start_date') or None
+        end_date = request.args.get('end_date') or None
+        # Checked before streaming: once the header has gone out an error can only cut the file short
+        try:
+            for value in (start_date, end_date):
+                if value:
+                    date.fromisoformat(value)
+        except ValueError:
+            return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+        
+        return csv_response(db.export_attendance_to_csv(start_date, end_date),
+                            f'attendance_{date.today()}.csv')
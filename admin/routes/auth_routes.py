@@ -1,10 +1,12 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, session
-from admin.database.firebase import Database
+from admin.database.firebase import db
 from datetime import datetime, timedelta
 from utils.email_service import EmailService
 import random 
+from utils.log import get_logger
+
+log = get_logger("routes.auth")
 
-db = Database()
 auth_bp = Blueprint('auth',
                     __name__,
                     template_folder="../templates",
@@ -85,7 +87,7 @@ class AuthRoutes:
                 flash("Incorrect password. Please try again.", "error")
                 return redirect(url_for("auth.signin_page"))
         except Exception as e:
-            print(f"Login error: {e}")
+            log.error("Login error: %s", e)
             flash("An error occurred during login. Please try again.", "error")
             return redirect(url_for("auth.signin_page"))
     
@@ -153,7 +155,7 @@ class AuthRoutes:
                     flash("Username not found in our records", "error")
                     return render_template('verify_user.html')
         except Exception as e:
-            print(f"Error in verify_code: {e}")
+            log.error("Error in verify_code: %s", e)
             flash("Error processing request. Please try again.", "error")
             return render_template('verify_user.html')
         
@@ -216,7 +218,7 @@ class AuthRoutes:
             flash("Password changed successfully", "success")
             return redirect(url_for('auth.signin_page'))
         except Exception as e:
-            print(f"Error changing password: {e}")
+            log.error("Error changing password: %s", e)
             flash("Error changing password. Please try again.", "error")
             return render_template("new_password.html")
     
@@ -1,7 +1,9 @@
 from flask import request, redirect, url_for, Blueprint
-from admin.database.firebase import Database
+from admin.database.firebase import db
+from utils.log import get_logger
+
+log = get_logger("routes.complaint")
 
-db = Database()
 complaint_bp = Blueprint('complaint',
                          __name__,
                          template_folder="../templates",
@@ -14,7 +16,7 @@ class ComplaintRoutes:
     def mark_complaint_solved():
         comp_id = request.form.get("complaint_id")
         
-        print(comp_id)
+        log.debug("Resolving complaint %s", comp_id)
         
         db.update_complaint_status(comp_id)
         
@@ -1,7 +1,9 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, session
-from admin.database.firebase import Database
+from admin.database.firebase import db
+from utils.log import get_logger
+
+log = get_logger("routes.dashboard")
 
-db = Database()
 dashboard_bp = Blueprint('dashboard',
                          __name__,
                          template_folder="../templates")
@@ -77,16 +79,15 @@ class DashboardRoutes:
         page = int(request.args.get('page', 1))
         per_page = 5
         
-        all_data = db.get_mess_data()
-        
-        total_pages = (len(all_data) + per_page -1 ) // per_page
+        # Totals come from the day's counters; the page is sorted by name across the whole day
+        counts = db.get_mess_counts()
+        data = db.get_mess_data(page, per_page)
         
-        start = (page - 1) * per_page
-        end = start + per_page
-        data = all_data[start:end]
+        total_pages = (counts["students"] + per_page -1 ) // per_page
         
         return render_template('mess.html',
                                data = data,
+                               counts = counts,
                                page = page,
                                total_pages = total_pages)
 
@@ -98,7 +99,7 @@ class DashboardRoutes:
         
         all_data = db.get_complaint_details()
         
-        print(all_data)
+        log.debug("Complaints: %s", all_data)
                 
         total_pages = (len(all_data) + per_page -1 ) // per_page
         
@@ -1,25 +1,52 @@
-from flask import Blueprint, send_file
-from admin.database.firebase import Database
-from datetime import date
+from flask import Blueprint, send_file, request, session, jsonify, url_for
+from admin.database.firebase import db, EXPORTS, CHANGE_FEEDS
+from utils.csv_stream import csv_response
+from utils.jobs import job_manager
+from utils.exports import build_export, FORMATS
+from utils.lazy import lazy_import
+from datetime import date, datetime, timezone
+import hmac
+import os
+
+# pyarrow is only loaded once a columnar export is requested
+columnar_snapshots = lazy_import('utils.columnar', 'columnar_snapshots')
+SCHEMAS = lazy_import('utils.columnar', 'SCHEMAS')
+
+# Identical export requests within this window share one job and artifact
+EXPORT_DEDUPE_SECONDS = int(os.getenv("EXPORT_DEDUPE_SECONDS", "600"))
+
+# Bearer token for unattended sync clients such as the accounting import
+EXPORT_API_TOKEN = os.getenv("EXPORT_API_TOKEN")
 
-db = Database()
 export_bp = Blueprint('export',
                      __name__,
                      template_folder="../templates")
 
 class ExportRoutes:
     
+    @staticmethod
+    def _sync_authorized():
+        if 'username' in session:
+            return True
+        
+        auth = request.headers.get('Authorization', '')
+        return bool(EXPORT_API_TOKEN) and auth.startswith('Bearer ') and \
+            hmac.compare_digest(auth[len('Bearer '):], EXPORT_API_TOKEN)
+    
+    @staticmethod
+    def _parse_watermark(watermark):
+        """'<updated_at ISO>|<document id>' or a bare ISO timestamp -> (datetime, id)"""
+        # An unencoded '+' in the UTC offset arrives as a space
+        timestamp, _, doc_id = watermark.replace(' ', '+').partition('|')
+        since = datetime.fromisoformat(timestamp)
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return since, doc_id or None
+    
     @staticmethod
     @export_bp.route('/export_students_csv')
     def export_students_csv():
-        output = db.export_students_to_csv()
-        
-        return send_file(
-            output,
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=f'students_{date.today()}.csv'
-        )
+        return csv_response(db.export_students_to_csv(), f'students_{date.today()}.csv')
     
     @staticmethod
     @export_bp.route('/export_students_excel')
@@ -32,3 +59,131 @@ class ExportRoutes:
             as_attachment=True,
             download_name=f'students_{date.today()}.xlsx'
         )
+    
+    @staticmethod
+    @export_bp.route('/jobs', methods=['POST'])
+    def create_export_job():
+        """Queue a background export: {dataset, format, start_date, end_date}"""
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        data = request.json or {}
+        dataset = data.get('dataset')
+        fmt = data.get('format', 'xlsx')
+        start_date = data.get('start_date') or None
+        end_date = data.get('end_date') or None
+        
+        if dataset not in EXPORTS:
+            return jsonify({'error': f"Unknown dataset, expected one of {', '.join(EXPORTS)}"}), 400
+        if fmt not in FORMATS:
+            return jsonify({'error': 'Unsupported format'}), 400
+        try:
+            for value in (start_date, end_date):
+                if value:
+                    date.fromisoformat(value)
+        except ValueError:
+            return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+        
+        params = {'dataset': dataset, 'format': fmt, 'start_date': start_date, 'end_date': end_date}
+        columns = EXPORTS[dataset][2]
+        job, created = job_manager.submit(
+            'export', params,
+            lambda job: build_export(job, db, dataset, columns, fmt, start_date, end_date),
+            dedupe_ttl=EXPORT_DEDUPE_SECONDS)
+        
+        result = job.to_dict()
+        result.update({
+            'deduplicated': not created,
+            'status_url': url_for('export.export_job_status', job_id=job.id),
+            'download_url': url_for('export.download_export', job_id=job.id)
+        })
+        return jsonify(result), 202 if created else 200
+    
+    @staticmethod
+    @export_bp.route('/jobs/<job_id>')
+    def export_job_status(job_id):
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        job = job_manager.get(job_id)
+        if job is None or job.kind not in ('export', 'columnar'):
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(job.to_dict())
+    
+    @staticmethod
+    @export_bp.route('/jobs/<job_id>/download')
+    def download_export(job_id):
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        job = job_manager.get(job_id)
+        if job is None or job.kind != 'export':
+            return jsonify({'error': 'Job not found'}), 404
+        if job.status != 'done':
+            return jsonify({'error': 'Export is not finished', 'status': job.status}), 409
+        
+        return send_file(job.artifact_path, mimetype=job.mimetype,
+                         as_attachment=True, download_name=job.artifact)
+    
+    @staticmethod
+    @export_bp.route('/columnar', methods=['POST'])
+    def create_columnar_job():
+        """Bring Parquet snapshots up to date in the background: {datasets: [...]}"""
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        datasets = (request.json or {}).get('datasets') or list(SCHEMAS)
+        unknown = [name for name in datasets if name not in SCHEMAS]
+        if unknown:
+            return jsonify({'error': f"Unknown datasets: {', '.join(unknown)}"}), 400
+        
+        job, created = job_manager.submit(
+            'columnar', {'datasets': sorted(datasets), 'day': date.today().isoformat()},
+            lambda job: columnar_snapshots.run(db, datasets, job),
+            dedupe_ttl=EXPORT_DEDUPE_SECONDS)
+        
+        result = job.to_dict()
+        result.update({
+            'deduplicated': not created,
+            'status_url': url_for('export.export_job_status', job_id=job.id),
+            'snapshot_dir': columnar_snapshots.root
+        })
+        return jsonify(result), 202 if created else 200
+    
+    @staticmethod
+    @export_bp.route('/changes/<collection>')
+    def export_changes(collection):
+        """Documents changed since ?since=<watermark>, paged with ?limit= (max 1000)"""
+        if not ExportRoutes._sync_authorized():
+            return jsonify({'error': 'Unauthorized'}), 401
+        if collection not in CHANGE_FEEDS:
+            return jsonify({'error': f"Unknown collection, expected one of {', '.join(CHANGE_FEEDS)}"}), 400
+        
+        watermark = request.args.get('since')
+        limit = min(max(request.args.get('limit', 500, type=int), 1), 1000)
+        try:
+            since, after_id = ExportRoutes._parse_watermark(watermark) if watermark else (None, None)
+        except ValueError:
+            return jsonify({'error': 'Invalid watermark'}), 400
+        
+        result = db.get_changes(collection, since, after_id, limit)
+        if result is None:
+            return jsonify({'error': 'Failed to read changes'}), 500
+        changes, has_more = result
+        
+        for change in changes:
+            for key, value in change.items():
+                if isinstance(value, datetime):
+                    change[key] = value.isoformat()
+        
+        if changes:
+            watermark = f"{changes[-1]['updated_at']}|{changes[-1]['id']}"
+        
+        return jsonify({
+            'collection': collection,
+            'changes': changes,
+            'count': len(changes),
+            'has_more': has_more,
+            'watermark': watermark
+        })
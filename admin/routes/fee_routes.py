@@ -1,8 +1,8 @@
-from flask import request, render_template, flash, redirect, url_for, Blueprint, send_file
-from admin.database.firebase import Database
+from flask import request, render_template, flash, redirect, url_for, Blueprint, send_file, jsonify
+from admin.database.firebase import db
+from utils.csv_stream import csv_response
 from datetime import date
 
-db = Database()
 fee_bp = Blueprint('fee',
                   __name__,
                   template_folder="../templates")
@@ -89,6 +89,21 @@ class FeeRoutes:
             download_name=f'fees_{date.today()}.xlsx'
         )
     
+    @staticmethod
+    @fee_bp.route('/export_fees_csv')
+    def export_fees_csv():
+        start_date = request.args.get('start_date') or None
+        end_date = request.args.get('end_date') or None
+        # Checked before streaming: once the header has gone out an error can only cut the file short
+        try:
+            for value in (start_date, end_date):
+                if value:
+                    date.fromisoformat(value)
+        except ValueError:
+            return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+        
+        return csv_response(db.export_fees_to_csv(start_date, end_date), f'fees_{date.today()}.csv')
+    
     @staticmethod
     @fee_bp.route('/payment_history/<fee_id>')
     def payment_history(fee_id):
@@ -1,7 +1,14 @@
-from flask import request, render_template, flash, redirect, url_for, Blueprint
-from admin.database.firebase import Database
+from flask import request, render_template, flash, redirect, url_for, Blueprint, session, jsonify, Response
+from admin.database.firebase import db
+from utils.mess_menu import DAYS
+from utils.headcount import headcounts, event_stream, STREAM_SECONDS, SYNC_STREAM_SECONDS
+import hmac
+import os
+
+# Token for the kitchen display, which is not logged in as an admin. Sent as a
+# bearer token or, from EventSource (which cannot set headers), as ?token=
+KITCHEN_DISPLAY_TOKEN = os.getenv("KITCHEN_DISPLAY_TOKEN")
 
-db = Database()
 mess_bp = Blueprint('mess',
                          __name__,
                          template_folder="../templates",
@@ -10,12 +17,20 @@ mess_bp = Blueprint('mess',
 
 class MessRoutes:
     
+    @staticmethod
+    def _kitchen_authorized():
+        if 'username' in session:
+            return True
+        
+        auth = request.headers.get('Authorization', '')
+        token = auth[len('Bearer '):] if auth.startswith('Bearer ') else request.args.get('token', '')
+        return bool(KITCHEN_DISPLAY_TOKEN) and hmac.compare_digest(token, KITCHEN_DISPLAY_TOKEN)
+    
     @mess_bp.route('/save_menu', methods=['POST'])
     def save_menu():
         week_menu = {}
 
-        days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']
-        for day in days:
+        for day in DAYS:
             week_menu[day] = {
                 "breakfast": request.form.get(f"{day}_breakfast"),
                 "lunch": request.form.get(f"{day}_lunch"),
@@ -26,3 +41,39 @@ class MessRoutes:
 
         return redirect(url_for('dashboard.manage_mess'))
     
+    @staticmethod
+    @mess_bp.route('/headcount')
+    def headcount():
+        """Per-meal headcounts for today (live) and the next 7 days (forecast)"""
+        if not MessRoutes._kitchen_authorized():
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        return jsonify(dict(headcounts.get(db.db), success=True))
+    
+    @staticmethod
+    @mess_bp.route('/headcount/stream')
+    def headcount_stream():
+        """The same headcounts as server-sent events, pushed whenever they change"""
+        if not MessRoutes._kitchen_authorized():
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        # A single-threaded worker would be killed by gunicorn's timeout mid-stream
+        seconds = STREAM_SECONDS
+        if not request.environ.get('wsgi.multithread'):
+            seconds = min(seconds, SYNC_STREAM_SECONDS)
+        
+        response = Response(event_stream(db.db, seconds=seconds), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # Stop proxies such as nginx from buffering events before relaying them
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    
+    @staticmethod
+    @mess_bp.route('/kitchen')
+    def kitchen_display():
+        """Full-screen headcount board for the kitchen"""
+        if not MessRoutes._kitchen_authorized():
+            return redirect(url_for('auth.signin_page'))
+        
+        return render_template('kitchen.html', token=request.args.get('token', ''))
+    
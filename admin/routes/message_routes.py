@@ -1,8 +1,10 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, session, jsonify
-from admin.database.firebase import Database
+from admin.database.firebase import db
 from datetime import datetime, date, timedelta
+from utils.log import get_logger
+
+log = get_logger("routes.message")
 
-db = Database()
 message_bp = Blueprint('message',
                       __name__,
                       template_folder="../templates")
@@ -216,7 +218,7 @@ class MessageRoutes:
             
             return {'conversations': formatted_conversations}
         except Exception as e:
-            print(f"Error getting conversations: {e}")
+            log.error("Error getting conversations: %s", e)
             return {'conversations': []}
     
     @staticmethod
@@ -243,7 +245,7 @@ class MessageRoutes:
             
             return {'messages': formatted_messages}
         except Exception as e:
-            print(f"Error getting conversation: {e}")
+            log.error("Error getting conversation: %s", e)
             return {'messages': []}
     
     @staticmethod
@@ -268,5 +270,5 @@ class MessageRoutes:
             
             return {'success': True}
         except Exception as e:
-            print(f"Error sending message: {e}")
+            log.error("Error sending message: %s", e)
             return {'success': False, 'error': str(e)}
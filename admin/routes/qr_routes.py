@@ -1,16 +1,62 @@
-from flask import request, render_template, flash, redirect, url_for, Blueprint, session, jsonify
-from admin.database.firebase import Database
-from utils.qr_utils import qr_generator
+from flask import request, render_template, flash, redirect, url_for, Blueprint, session, jsonify, Response, send_file
+from admin.database.firebase import db
+from firebase_admin import firestore
+from utils.id_utils import new_id
+from utils.qr_tokens import pass_signer, is_token
+from utils.revocation import revocation_list, verify_pass
+from utils.qr_render import render_data_url, store_png, qr_renderer, image_response, MIME_TYPES
+from utils.blob_store import blob_store
+from utils.jobs import job_manager
+from utils.lazy import lazy_import
 from datetime import datetime, timedelta
 import json
 
-db = Database()
+# QR generation and Pillow card rendering load on first use
+qr_generator = lazy_import('utils.qr_utils', 'qr_generator')
+build_id_cards = lazy_import('utils.id_cards', 'build_id_cards')
+
 qr_bp = Blueprint('qr',
                   __name__,
                   template_folder="../templates")
 
 class QRRoutes:
     
+    @staticmethod
+    def _parse_datetime(value, end_of_day=False):
+        """Parse a date or datetime-local form value"""
+        parsed = datetime.fromisoformat(str(value).strip())
+        if end_of_day and len(str(value).strip()) == 10:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed
+    
+    @staticmethod
+    def _sign_leave_pass(leave_data):
+        """Sign a leave pass token valid from leave_from to leave_to"""
+        valid_from = QRRoutes._parse_datetime(leave_data['leave_from'])
+        valid_until = QRRoutes._parse_datetime(leave_data['leave_to'], end_of_day=True)
+        
+        return pass_signer.sign('LEAVE_PASS', leave_data['pass_id'], leave_data['student_id'],
+                                valid_from, valid_until)
+    
+    @staticmethod
+    def _sign_visitor_pass(visitor_data, student_id):
+        """Sign a visitor token valid from the entry time until valid_until"""
+        if visitor_data.get('visit_date') and visitor_data.get('entry_time'):
+            valid_from = QRRoutes._parse_datetime(f"{visitor_data['visit_date']}T{visitor_data['entry_time']}")
+        else:
+            valid_from = QRRoutes._parse_datetime(visitor_data['entry_time'])
+        valid_until = QRRoutes._parse_datetime(visitor_data['valid_until'], end_of_day=True)
+        
+        return pass_signer.sign('VISITOR_ENTRY', visitor_data['visitor_id'], student_id,
+                                valid_from, valid_until)
+    
+    @staticmethod
+    def _verify_qr_data(qr_data, at=None):
+        """Verify a signed pass token in-process, falling back to legacy JSON payloads"""
+        if is_token(qr_data):
+            return verify_pass(qr_data, at)
+        return qr_generator.verify_qr_code(qr_data)
+    
     @staticmethod
     @qr_bp.route('/digital_documents')
     def digital_documents():
@@ -53,18 +99,116 @@ class QRRoutes:
             # Add tenant_id to student_data
             student_data['tenant_id'] = student_id
             
-            qr_code = qr_generator.generate_student_id_qr(student_data)
-            if qr_code:
-                return jsonify({
-                    'success': True,
-                    'qr_code': qr_code,
-                    'student_data': student_data
+            qr_token = pass_signer.sign_student_id(student_id)
+            qr_code, _ = qr_renderer.data_url(qr_token)
+            
+            response = jsonify({
+                'success': True,
+                'qr_code': qr_code,
+                'qr_token': qr_token,
+                'student_data': student_data
+            })
+            response.add_etag()
+            return response.make_conditional(request)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @staticmethod
+    @qr_bp.route('/student_qr_image/<student_id>')
+    def student_qr_image(student_id):
+        """Student ID QR as a PNG or SVG image (?format=png|svg&size=N)"""
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        fmt = request.args.get('format', 'png')
+        size = min(max(request.args.get('size', 8, type=int), 1), 40)
+        if fmt not in MIME_TYPES:
+            return jsonify({'error': 'Unsupported format'}), 400
+        
+        return image_response(pass_signer.sign_student_id(student_id), fmt, size)
+    
+    @staticmethod
+    @qr_bp.route('/student_id_cards', methods=['POST'])
+    def student_id_cards():
+        """Start a background job rendering ID cards for many students as a ZIP or PDF"""
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        try:
+            data = request.json or {}
+            fmt = data.get('format', 'zip')
+            if fmt not in ('zip', 'pdf'):
+                return jsonify({'error': 'Unsupported format'}), 400
+            
+            student_ids = set(data.get('student_ids') or [])
+            room = data.get('room')
+            tenant_type = data.get('type')
+            status = data.get('status')
+            
+            # Tenant tuples are (id, name, room, type, date, status)
+            cards = []
+            for tenant_id, name, room_no, t_type, _, t_status in db.get_tenants_details():
+                if student_ids and tenant_id not in student_ids:
+                    continue
+                if room and str(room_no) != str(room):
+                    continue
+                if tenant_type and t_type != tenant_type:
+                    continue
+                if status and t_status != status:
+                    continue
+                cards.append({
+                    'student_id': tenant_id,
+                    'name': name,
+                    'room': room_no,
+                    'type': t_type,
+                    'token': pass_signer.sign_student_id(tenant_id)
                 })
-            else:
-                return jsonify({'error': 'Failed to generate QR code'}), 500
+            
+            if not cards:
+                return jsonify({'error': 'No students match the selection'}), 404
+            
+            params = {'format': fmt, 'count': len(cards), 'requested_by': session.get('username')}
+            job, _ = job_manager.submit('id_cards', params, lambda job: build_id_cards(job, cards, fmt))
+            
+            return jsonify({
+                'success': True,
+                'job_id': job.id,
+                'count': len(cards),
+                'status_url': url_for('qr.student_id_cards_status', job_id=job.id),
+                'download_url': url_for('qr.student_id_cards_download', job_id=job.id)
+            }), 202
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
+    @staticmethod
+    @qr_bp.route('/student_id_cards/<job_id>')
+    def student_id_cards_status(job_id):
+        """Progress of an ID card batch job"""
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        job = job_manager.get(job_id)
+        if job is None or job.kind != 'id_cards':
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(job.to_dict())
+    
+    @staticmethod
+    @qr_bp.route('/student_id_cards/<job_id>/download')
+    def student_id_cards_download(job_id):
+        """Download the finished ZIP or PDF of an ID card batch job"""
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        job = job_manager.get(job_id)
+        if job is None or job.kind != 'id_cards':
+            return jsonify({'error': 'Job not found'}), 404
+        if job.status != 'done':
+            return jsonify({'error': 'Job is not finished', 'status': job.status}), 409
+        
+        return send_file(job.artifact_path, mimetype=job.mimetype,
+                         as_attachment=True, download_name=job.artifact)
+    
     @staticmethod
     @qr_bp.route('/visitor_management')
     def visitor_management():
@@ -89,7 +233,7 @@ class QRRoutes:
         
         try:
             visitor_data = {
-                'visitor_id': f"V{datetime.now().strftime('%Y%m%d%H%M%S')}",
+                'visitor_id': new_id("V"),
                 'name': request.json.get('name'),
                 'phone': request.json.get('phone'),
                 'visiting_student': request.json.get('visiting_student'),
@@ -100,12 +244,14 @@ class QRRoutes:
                 'approved_by': session.get('username', 'Admin')
             }
             
-            qr_code = qr_generator.generate_visitor_entry_qr(visitor_data)
+            qr_token = QRRoutes._sign_visitor_pass(visitor_data, visitor_data['visiting_student'])
+            qr_code = render_data_url(qr_token)
             if qr_code:
                 # In a real system, save visitor data to database
                 return jsonify({
                     'success': True,
                     'qr_code': qr_code,
+                    'qr_token': qr_token,
                     'visitor_data': visitor_data
                 })
             else:
@@ -137,7 +283,7 @@ class QRRoutes:
         
         try:
             leave_data = {
-                'pass_id': f"L{datetime.now().strftime('%Y%m%d%H%M%S')}",
+                'pass_id': new_id("L"),
                 'student_id': request.json.get('student_id'),
                 'student_name': request.json.get('student_name'),
                 'room': request.json.get('room'),
@@ -149,12 +295,14 @@ class QRRoutes:
                 'approved_by': session.get('username', 'Admin')
             }
             
-            qr_code = qr_generator.generate_leave_pass_qr(leave_data)
+            qr_token = QRRoutes._sign_leave_pass(leave_data)
+            qr_code = render_data_url(qr_token)
             if qr_code:
                 # In a real system, save leave data to database
                 return jsonify({
                     'success': True,
                     'qr_code': qr_code,
+                    'qr_token': qr_token,
                     'leave_data': leave_data
                 })
             else:
@@ -171,12 +319,87 @@ class QRRoutes:
         
         try:
             qr_data = request.json.get('qr_data')
-            verification_result = qr_generator.verify_qr_code(qr_data)
+            revocation_list.refresh(db)
+            verification_result = QRRoutes._verify_qr_data(qr_data)
+            
+            # ID card tokens carry only the student id; add display details for the scanner
+            data = verification_result.get('data') or {}
+            if is_token(qr_data) and verification_result.get('valid') and data.get('type') == 'STUDENT_ID':
+                student = db.get_tenant_s_details(data['student_id'])
+                if not student:
+                    # Removed since the card was signed, and not yet on this worker's revocation list
+                    return jsonify({'valid': False, 'error': 'Student not found', 'data': data})
+                data.update({
+                    'name': student.get('name'),
+                    'room': student.get('room'),
+                    'phone': student.get('phone')
+                })
             
             return jsonify(verification_result)
         except Exception as e:
             return jsonify({'valid': False, 'error': str(e)}), 500
     
+    @staticmethod
+    @qr_bp.route('/bulk_verify', methods=['POST'])
+    def bulk_verify():
+        """Verify a backlog of scans recorded while a scanner was offline"""
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        scans = request.json.get('scans', [])
+        if len(scans) > 5000:
+            return jsonify({'error': 'Too many scans in one request (max 5000)'}), 400
+        
+        # The scanner has been out of sync, so always pick up the latest revocations
+        revocation_list.refresh(db, force=True)
+        
+        results = []
+        for scan in scans:
+            try:
+                scanned_at = scan.get('scanned_at')
+                at = datetime.fromisoformat(scanned_at) if scanned_at else None
+                result = QRRoutes._verify_qr_data(scan.get('qr_data'), at)
+            except Exception as e:
+                result = {'valid': False, 'error': str(e)}
+            
+            result['scan_id'] = scan.get('scan_id')
+            results.append(result)
+        
+        return jsonify({
+            'success': True,
+            'verified': len(results),
+            'valid_count': sum(1 for r in results if r.get('valid')),
+            'results': results
+        })
+    
+    @staticmethod
+    @qr_bp.route('/revocations')
+    def revocations():
+        """Compact revocation filter for scanners to hold offline"""
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        revocation_list.refresh(db)
+        return jsonify(revocation_list.snapshot())
+    
+    @staticmethod
+    @qr_bp.route('/blob/<digest>')
+    def qr_blob(digest):
+        """Serve a stored QR image; blobs are immutable so they cache indefinitely"""
+        if 'username' not in session and 'tenant_id' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        data = blob_store.get(digest)
+        if data is None:
+            return jsonify({'error': 'QR image not found'}), 404
+        
+        response = Response(data, mimetype='image/png')
+        response.set_etag(digest)
+        response.cache_control.private = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+        return response.make_conditional(request)
+    
     @staticmethod
     @qr_bp.route('/qr_scanner')
     def qr_scanner():
@@ -215,17 +438,20 @@ class QRRoutes:
                         'approved_by': admin_id
                     }
                     
-                    qr_code = qr_generator.generate_leave_pass_qr(leave_data)
+                    qr_token = QRRoutes._sign_leave_pass(leave_data)
+                    qr_hash = store_png(qr_token)
+                    qr_code = url_for('qr.qr_blob', digest=qr_hash)
                     
-                    # Update the request with QR code
-                    if qr_code:
-                        doc_ref = db.db.collection("leave_requests").document(request_id)
-                        doc_ref.update({'qr_code': qr_code})
+                    # The request keeps only the image hash, not the image
+                    doc_ref = db.db.collection("leave_requests").document(request_id)
+                    doc_ref.update({'qr_hash': qr_hash, 'qr_token': qr_token, 'updated_at': firestore.SERVER_TIMESTAMP})
                     
                     return jsonify({
                         'success': True,
                         'message': 'Leave request approved successfully',
                         'qr_code': qr_code,
+                        'qr_hash': qr_hash,
+                        'qr_token': qr_token,
                         'leave_data': leave_data
                     })
             
@@ -247,6 +473,7 @@ class QRRoutes:
             success = db.reject_leave_request(request_id, admin_id, reason)
             
             if success:
+                revocation_list.refresh(db, force=True)
                 return jsonify({
                     'success': True,
                     'message': 'Leave request rejected successfully'
@@ -285,17 +512,20 @@ class QRRoutes:
                         'approved_by': admin_id
                     }
                     
-                    qr_code = qr_generator.generate_visitor_entry_qr(visitor_data)
+                    qr_token = QRRoutes._sign_visitor_pass(visitor_data, request_data['student_id'])
+                    qr_hash = store_png(qr_token)
+                    qr_code = url_for('qr.qr_blob', digest=qr_hash)
                     
-                    # Update the request with QR code
-                    if qr_code:
-                        doc_ref = db.db.collection("visitor_requests").document(request_id)
-                        doc_ref.update({'qr_code': qr_code})
+                    # The request keeps only the image hash, not the image
+                    doc_ref = db.db.collection("visitor_requests").document(request_id)
+                    doc_ref.update({'qr_hash': qr_hash, 'qr_token': qr_token, 'updated_at': firestore.SERVER_TIMESTAMP})
                     
                     return jsonify({
                         'success': True,
                         'message': 'Visitor request approved successfully',
                         'qr_code': qr_code,
+                        'qr_hash': qr_hash,
+                        'qr_token': qr_token,
                         'visitor_data': visitor_data
                     })
             
@@ -317,6 +547,7 @@ class QRRoutes:
             success = db.reject_visitor_request(request_id, admin_id, reason)
             
             if success:
+                revocation_list.refresh(db, force=True)
                 return jsonify({
                     'success': True,
                     'message': 'Visitor request rejected successfully'
@@ -326,3 +557,53 @@ class QRRoutes:
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)})
     
+    @staticmethod
+    @qr_bp.route('/cancel_leave_request/<request_id>', methods=['POST'])
+    def cancel_leave_request(request_id):
+        """Cancel an approved leave request and revoke its pass"""
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        try:
+            admin_id = session.get('username', 'admin')
+            reason = (request.json or {}).get('reason', 'No reason provided')
+            
+            success, result = db.cancel_leave_request(request_id, admin_id, reason)
+            
+            if success:
+                revocation_list.refresh(db, force=True)
+                return jsonify({
+                    'success': True,
+                    'message': 'Leave request cancelled successfully',
+                    'revoked_pass_id': result
+                })
+            
+            return jsonify({'success': False, 'error': result})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)})
+    
+    @staticmethod
+    @qr_bp.route('/cancel_visitor_request/<request_id>', methods=['POST'])
+    def cancel_visitor_request(request_id):
+        """Cancel an approved visitor request and revoke its pass"""
+        if 'username' not in session:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        try:
+            admin_id = session.get('username', 'admin')
+            reason = (request.json or {}).get('reason', 'No reason provided')
+            
+            success, result = db.cancel_visitor_request(request_id, admin_id, reason)
+            
+            if success:
+                revocation_list.refresh(db, force=True)
+                return jsonify({
+                    'success': True,
+                    'message': 'Visitor request cancelled successfully',
+                    'revoked_pass_id': result
+                })
+            
+            return jsonify({'success': False, 'error': result})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)})
+    
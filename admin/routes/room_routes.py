@@ -1,12 +1,11 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint
-from admin.database.firebase import Database
+from admin.database.firebase import db
 
 room_bp = Blueprint('room',
                     __name__,
                     template_folder="../templates",
                     static_folder="static",
                     static_url_path="/admin_static")
-db = Database()
 
 class RoomRoutes:
     
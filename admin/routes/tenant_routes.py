@@ -1,7 +1,10 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, session
-from admin.database.firebase import Database
+from admin.database.firebase import db
+from utils.log import get_logger
+from utils.revocation import revocation_list
+
+log = get_logger("routes.tenant")
 
-db = Database()
 tenant_bp = Blueprint('tenant',
                       __name__,
                       template_folder="../templates",
@@ -53,12 +56,14 @@ class TenantRoutes:
         try:
             result = db.delete_document("tenants", "id", int(tenant_id))
             if result:
+                # Their ID card is revoked with them; stop honouring it here at once
+                revocation_list.refresh(db, force=True)
                 flash("Student deleted successfully", "success")
             else:
                 flash("Error deleting student", "error")
         except Exception as e:
             flash("Error deleting student", "error")
-            print(f"Delete error: {e}")
+            log.error("Delete error: %s", e)
         
         return redirect(url_for('dashboard.manage_tenants'))
     
@@ -1,95 +1,217 @@
+import time
+
+# Cold start is measured from here, before Flask and the route modules are imported
+_started = time.perf_counter()
+
 from flask import Flask, render_template
 from flask_mail import Mail
+import click
 from datetime import timedelta
+import importlib
 import os
 
-from admin.routes.auth_routes import auth_bp
-from admin.routes.tenant_routes import tenant_bp
-from admin.routes.dashboard_routes import dashboard_bp
-from admin.routes.room_routes import room_bp
-from admin.routes.mess_routes import mess_bp
-from admin.routes.complaint_routes import complaint_bp
-from admin.routes.attendance_routes import attendance_bp
-from admin.routes.fee_routes import fee_bp
-from admin.routes.export_routes import export_bp
-from admin.routes.message_routes import message_bp
-from admin.routes.ai_routes import ai_bp
-from admin.routes.qr_routes import qr_bp
-
-from tenant.routes.t_auth_routes import t_auth_bp
-from tenant.routes.t_dashboard_routes import t_dashboard_bp
-from tenant.routes.t_messroutes import t_mess_bp
-from tenant.routes.t_complaint_routes import t_comp_bp
-from tenant.routes.t_message_routes import t_message_bp
-from tenant.routes.t_chatbot_routes import t_chatbot_bp
-from tenant.routes.t_qr_routes import t_qr_bp
-
-
-app = Flask(__name__)
-app.secret_key = os.getenv("SECRET_KEY", "stranger_s8")
-
-# Mail configuration
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
-app.config['MAIL_USERNAME'] = os.getenv("MAIL_USERNAME")
-app.config['MAIL_PASSWORD'] = os.getenv("MAIL_PASSWORD")
-app.config['SESSION_PERMANENT'] = True
-
-mail = Mail(app)
-app.mail = mail
-
-
-# ------------------ Admin Blueprints ------------------
-
-app.register_blueprint(auth_bp, url_prefix="/admin")
-app.register_blueprint(tenant_bp, url_prefix="/manage_tenants")
-app.register_blueprint(dashboard_bp, url_prefix="/AdminDashboard")
-app.register_blueprint(room_bp, url_prefix="/manage_rooms")
-app.register_blueprint(mess_bp, url_prefix="/manage_mess")
-app.register_blueprint(complaint_bp, url_prefix="/manage_complaints")
-app.register_blueprint(attendance_bp, url_prefix="/manage_attendance")
-app.register_blueprint(fee_bp, url_prefix="/manage_fees")
-app.register_blueprint(export_bp, url_prefix="/export")
-app.register_blueprint(message_bp, url_prefix="/messages")
-app.register_blueprint(ai_bp, url_prefix="/ai")
-app.register_blueprint(qr_bp, url_prefix="/qr")
-
-
-# ------------------ Tenant Blueprints ------------------
-
-app.register_blueprint(t_auth_bp, url_prefix="/tenant")
-app.register_blueprint(t_dashboard_bp, url_prefix="/TenantDashboard")
-app.register_blueprint(t_mess_bp, url_prefix="/TenantMess")
-app.register_blueprint(t_comp_bp, url_prefix="/Complaint")
-app.register_blueprint(t_message_bp, url_prefix="/student_messages")
-app.register_blueprint(t_chatbot_bp, url_prefix="/student_chatbot")
-app.register_blueprint(t_qr_bp, url_prefix="/student_qr")
-
-
-app.permanent_session_lifetime = timedelta(days=30)
+from utils.log import init_logging, get_logger
+from utils.request_stats import init_request_stats
+from utils.metrics import init_metrics, APP_COLD_START
 
+# Configured before anything logs, so every logger has a handler
+init_logging()
 
-# ------------------ Main Routes ------------------
+log = get_logger("app")
+
+# (module, blueprint, url prefix). Modules are imported by create_app(); the
+# heavy libraries they use (pandas, scikit-learn, pyarrow, Pillow, qrcode) and
+# the datastore connection are only loaded when a request first needs them.
+BLUEPRINTS = [
+    # ------------------ Admin Blueprints ------------------
+    ("admin.routes.auth_routes", "auth_bp", "/admin"),
+    ("admin.routes.tenant_routes", "tenant_bp", "/manage_tenants"),
+    ("admin.routes.dashboard_routes", "dashboard_bp", "/AdminDashboard"),
+    ("admin.routes.room_routes", "room_bp", "/manage_rooms"),
+    ("admin.routes.mess_routes", "mess_bp", "/manage_mess"),
+    ("admin.routes.complaint_routes", "complaint_bp", "/manage_complaints"),
+    ("admin.routes.attendance_routes", "attendance_bp", "/manage_attendance"),
+    ("admin.routes.fee_routes", "fee_bp", "/manage_fees"),
+    ("admin.routes.export_routes", "export_bp", "/export"),
+    ("admin.routes.message_routes", "message_bp", "/messages"),
+    ("admin.routes.ai_routes", "ai_bp", "/ai"),
+    ("admin.routes.qr_routes", "qr_bp", "/qr"),
+
+    # ------------------ Tenant Blueprints ------------------
+    ("tenant.routes.t_auth_routes", "t_auth_bp", "/tenant"),
+    ("tenant.routes.t_dashboard_routes", "t_dashboard_bp", "/TenantDashboard"),
+    ("tenant.routes.t_messroutes", "t_mess_bp", "/TenantMess"),
+    ("tenant.routes.t_complaint_routes", "t_comp_bp", "/Complaint"),
+    ("tenant.routes.t_message_routes", "t_message_bp", "/student_messages"),
+    ("tenant.routes.t_chatbot_routes", "t_chatbot_bp", "/student_chatbot"),
+    ("tenant.routes.t_qr_routes", "t_qr_bp", "/student_qr"),
+]
+
+
+def register_blueprints(app):
+    for module, name, prefix in BLUEPRINTS:
+        blueprint = getattr(importlib.import_module(module), name)
+        app.register_blueprint(blueprint, url_prefix=prefix)
 
-@app.route('/')
-def starting_splash():
-    return render_template('splash.html')
 
+def create_app():
+    app = Flask(__name__)
+    app.secret_key = os.getenv("SECRET_KEY", "stranger_s8")
 
-@app.route('/HostelManager')
-def starting_menu():
-    return render_template('portal.html')
+    # Mail configuration
+    app.config['MAIL_SERVER'] = 'smtp.gmail.com'
+    app.config['MAIL_PORT'] = 587
+    app.config['MAIL_USE_TLS'] = True
+    app.config['MAIL_USERNAME'] = os.getenv("MAIL_USERNAME")
+    app.config['MAIL_PASSWORD'] = os.getenv("MAIL_PASSWORD")
+    app.config['SESSION_PERMANENT'] = True
 
+    mail = Mail(app)
+    app.mail = mail
 
-@app.route('/admin_login')
-def admin_portal():
-    return render_template('signin.html')
+    # Request ids on every log line, echoed back as X-Request-ID
+    init_logging(app)
 
+    # Datastore reads/writes per request in Server-Timing and the logs
+    init_request_stats(app)
+
+    # Prometheus metrics at /metrics (latency, in-flight requests, datastore, caches, jobs)
+    init_metrics(app)
+
+    register_blueprints(app)
+
+    app.permanent_session_lifetime = timedelta(days=30)
+
+    register_main_routes(app)
+    register_commands(app)
+    return app
+
+
+# ------------------ Main Routes ------------------
 
-@app.route('/tenant_login')
-def tenant_portal():
-    return render_template('tenant-signin.html')
+def register_main_routes(app):
+
+    @app.route('/')
+    def starting_splash():
+        return render_template('splash.html')
+
+    @app.route('/HostelManager')
+    def starting_menu():
+        return render_template('portal.html')
+
+    @app.route('/admin_login')
+    def admin_portal():
+        return render_template('signin.html')
+
+    @app.route('/tenant_login')
+    def tenant_portal():
+        return render_template('tenant-signin.html')
+
+
+# ------------------ CLI Commands ------------------
+
+def register_commands(app):
+
+    @app.cli.command("migrate-qr-blobs")
+    def migrate_qr_blobs():
+        """Move inline base64 QR images from request documents into the blob store"""
+        from admin.database.firebase import db
+        from utils.blob_store import blob_store
+
+        db.move_inline_qr_codes_to_blobs(blob_store)
+
+    @app.cli.command("export-columnar")
+    @click.argument("datasets", nargs=-1)
+    def export_columnar(datasets):
+        """Write new daily Parquet partitions and fresh snapshots for analytics"""
+        from admin.database.firebase import db
+        from utils.columnar import columnar_snapshots
+
+        summary = columnar_snapshots.run(db, list(datasets) or None)
+        for dataset, written in summary.items():
+            if isinstance(written, dict):
+                print(f"{dataset}: {len(written)} new partitions, {sum(written.values())} rows")
+            else:
+                print(f"{dataset}: snapshot of {written} rows")
+
+    @app.cli.command("backfill-updated-at")
+    @click.argument("collections", nargs=-1)
+    def backfill_updated_at(collections):
+        """Stamp updated_at on existing documents so the change feed includes them"""
+        from admin.database.firebase import db, CHANGE_FEEDS
+
+        for collection in collections or CHANGE_FEEDS:
+            db.backfill_updated_at(collection)
+
+    @app.cli.command("migrate-firestore-to-sqlite")
+    @click.argument("collections", nargs=-1)
+    @click.option("--path", default=None, help="SQLite file (default: SQLITE_PATH)")
+    @click.option("--subcollections", is_flag=True, help="Also copy nested subcollections")
+    def migrate_firestore_to_sqlite(collections, path, subcollections):
+        """Copy Firestore collections into the SQLite backend (STORAGE_BACKEND=sqlite)"""
+        import storage
+        from storage.migrate import copy_collections
+
+        target = storage.SQLiteClient(path)
+        try:
+            summary = copy_collections(storage.create_client("firestore"), target, list(collections) or None,
+                                       subcollections=subcollections)
+            target.analyze()
+        finally:
+            target.close()
+
+        for collection, copied in summary.items():
+            print(f"{collection}: {copied} documents")
+        print(f"Copied into {target.path}")
+
+    @app.cli.command("migrate-mess-attendance")
+    @click.argument("days", nargs=-1)
+    @click.option("--delete-legacy", is_flag=True, help="Remove each messAttendance day document once copied")
+    def migrate_mess_attendance(days, delete_legacy):
+        """Split per-day messAttendance documents into per-student records and meal counters"""
+        import storage
+        from utils.mess_attendance import migrate_legacy
+
+        summary = migrate_legacy(storage.get_db(), list(days) or None, delete=delete_legacy)
+        for day, students in summary.items():
+            print(f"{day}: {students} students")
+        print(f"Migrated {len(summary)} days")
+
+    @app.cli.command("rebuild-mess-counters")
+    @click.argument("days", nargs=-1, required=True)
+    def rebuild_mess_counters(days):
+        """Recount the meal counters of the given days (YYYY-MM-DD) from their records"""
+        import storage
+        from utils.mess_attendance import rebuild_counts
+
+        for day in days:
+            counts = rebuild_counts(storage.get_db(), day)
+            print(f"{day}: " + ", ".join(f"{field} {value}" for field, value in counts.items()))
+
+    @app.cli.command("rebuild-room-occupancy")
+    def rebuild_room_occupancy():
+        """Rebuild the room occupancy index from the tenants collection"""
+        import storage
+        from utils.room_occupancy import rebuild
+
+        rooms = rebuild(storage.get_db())
+        print(f"Indexed {sum(len(ids) for ids in rooms.values())} tenants in {len(rooms)} rooms")
+
+    @app.cli.command("startup-profile")
+    @click.option("--top", default=20, help="Number of packages to list")
+    def startup_profile(top):
+        """Show which imports make up the app's cold start"""
+        from utils.startup_profile import profile, print_profile
+
+        print_profile(profile(), top)
+
+
+app = create_app()
+
+COLD_START_SECONDS = time.perf_counter() - _started
+APP_COLD_START.set(COLD_START_SECONDS)
+log.info("App ready in %.0fms", COLD_START_SECONDS * 1000,
+         extra={"cold_start_ms": round(COLD_START_SECONDS * 1000, 1)})
 
 
 # ------------------ Run App ------------------
@@ -0,0 +1,11 @@
+# ASGI entry point, e.g. `uvicorn asgi:app --workers 4`.
+#
+# Flask itself stays WSGI: each request runs on a worker thread, and async
+# views (such as smart attendance) run their coroutines there, awaiting
+# independent datastore reads together through admin.database.firebase.adb.
+# The adapter lets the app be served by an ASGI server next to other ASGI apps.
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app as flask_app
+
+app = WsgiToAsgi(flask_app)
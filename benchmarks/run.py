@@ -0,0 +1,283 @@
+"""Load test the app through its real routes against a seeded local store.
+
+    python -m benchmarks.run                                  # 60 tenants, 1 year, 4 clients
+    python -m benchmarks.run --tenants 300 --years 2 --clients 16 --requests 20
+    python -m benchmarks.run --baseline instance/benchmarks/baseline.json
+
+Each run seeds a synthetic hostel (see benchmarks.seed) into the memory or
+SQLite backend, drives the Flask app with concurrent test clients and
+writes p50/p95/p99 latency, throughput and datastore reads per request to
+a JSON file. Passing --baseline compares against an earlier result and
+exits non-zero on a regression.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import storage
+from storage import instrument
+from benchmarks.seed import seed_hostel, ADMIN_USERNAME
+
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  "instance", "benchmarks")
+
+# p95 may grow by this fraction over the baseline before it counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+
+def build_scenarios(today):
+    """Routes under test: name -> (session role, method, path, JSON body)"""
+    month_ago = today - timedelta(days=30)
+    return {
+        "dashboard": ("admin", "GET", "/AdminDashboard/dashboard", None),
+        "smart_attendance": ("admin", "GET", "/manage_attendance/smart_attendance", None),
+        "inbox": ("admin", "GET", "/messages/inbox", None),
+        "manage_mess": ("admin", "GET", "/AdminDashboard/manage_mess?page=1", None),
+        "fees": ("admin", "GET", "/manage_fees/fees?page=1", None),
+        "export_attendance_csv": ("admin", "GET",
+                                  f"/manage_attendance/export_attendance_csv?start_date={month_ago}&end_date={today}",
+                                  None),
+        "predict_room": ("admin", "POST", "/ai/predictRoom",
+                         {"ten_type": "Student", "ac": "AC", "sleeptime": "22", "smoking": "No"}),
+        "chat": ("tenant", "POST", "/student_chatbot/chat", {"message": "show my fees"}),
+    }
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+def summarize(samples, wall_seconds):
+    latencies = sorted(latency for latency, _, _ in samples)
+    reads = [count for _, count, _ in samples]
+    count = len(samples)
+    return {
+        "requests": count,
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / count * 1000, 2) if count else 0.0,
+        "max_ms": round(latencies[-1] * 1000, 2) if count else 0.0,
+        "throughput_rps": round(count / wall_seconds, 2) if wall_seconds else 0.0,
+        "reads_per_request": round(sum(reads) / count, 1) if count else 0.0,
+        "max_reads": max(reads, default=0),
+    }
+
+
+def _client(app, role, tenant_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        if role == "admin":
+            session["username"] = ADMIN_USERNAME
+        else:
+            session["tenant_id"] = str(tenant_id)
+    return client
+
+
+def _timed_request(client, method, path, body):
+    """Issue one request and drain the body; returns (seconds, datastore reads, ok)
+
+    Reads are the request's own DatastoreStats, which also collect what
+    async views do on pool threads, rather than this thread's counter.
+    """
+    token = instrument.begin()
+    stats = instrument.current()
+    start = time.perf_counter()
+    try:
+        response = client.open(path, method=method, json=body)
+        # Streamed responses (CSV exports) only do their work while being read
+        response.get_data()
+        ok = response.status_code < 300
+        response.close()
+    except Exception as e:
+        print(f"Request {method} {path} failed: {e}")
+        ok = False
+    finally:
+        instrument.end(token)
+    return time.perf_counter() - start, stats.reads, ok
+
+
+def run_load(app, scenarios, clients, requests_per_client, tenant_ids):
+    """Run every scenario requests_per_client times on each of `clients` threads"""
+    samples = {name: [] for name in scenarios}
+    lock = threading.Lock()
+    ready = threading.Barrier(clients + 1)
+    names = list(scenarios)
+
+    def worker(index):
+        tenant_id = tenant_ids[index % len(tenant_ids)]
+        sessions = {role: _client(app, role, tenant_id) for role in ("admin", "tenant")}
+        # Each client starts at a different scenario so they do not move in lockstep
+        order = names[index % len(names):] + names[:index % len(names)]
+        ready.wait()
+        for _ in range(requests_per_client):
+            for name in order:
+                role, method, path, body = scenarios[name]
+                sample = _timed_request(sessions[role], method, path, body)
+                with lock:
+                    samples[name].append(sample)
+
+    threads = [threading.Thread(target=worker, args=(index,), daemon=True) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Scenarios that got slower than tolerance allows or read more documents than the baseline"""
+    regressions = []
+    for name, current in result["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        if before["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        # Reads are deterministic for the same seed, so any increase is real
+        if current["reads_per_request"] > before["reads_per_request"]:
+            regressions.append(f"{name}: reads/request {before['reads_per_request']} -> "
+                               f"{current['reads_per_request']}")
+        if current["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {current['errors']}")
+    return regressions
+
+
+def print_report(result):
+    header = f"{'scenario':<24}{'reqs':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>8}{'reads':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = list(result["scenarios"].items()) + [("TOTAL", result["total"])]
+    for name, stats in rows:
+        print(f"{name:<24}{stats['requests']:>6}{stats['errors']:>5}{stats['p50_ms']:>10}{stats['p95_ms']:>10}"
+              f"{stats['p99_ms']:>10}{stats['throughput_rps']:>8}{stats['reads_per_request']:>9}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Hostel manager load test and benchmark")
+    parser.add_argument("--tenants", type=int, default=60)
+    parser.add_argument("--rooms", type=int, default=None, help="default: one room per two tenants")
+    parser.add_argument("--years", type=float, default=1.0, help="years of attendance history")
+    parser.add_argument("--messages", type=int, default=8, help="messages per tenant")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=10, help="passes over every scenario per client")
+    parser.add_argument("--scenarios", nargs="*", help="only run these scenarios")
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="sqlite")
+    parser.add_argument("--sqlite-path", help="reuse or keep this database instead of a temporary one")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="result file (default: instance/benchmarks/<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier result to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    today = date.today()
+
+    tmp_dir = None
+    if args.backend == "memory":
+        client = storage.MemoryClient()
+    else:
+        path = args.sqlite_path
+        if not path:
+            tmp_dir = tempfile.TemporaryDirectory(prefix="hostel-bench-")
+            path = os.path.join(tmp_dir.name, "bench.sqlite3")
+        client = storage.SQLiteClient(path)
+
+    try:
+        seed_start = time.perf_counter()
+        if client.collection("users").limit(1).get():
+            print(f"Reusing seeded database at {args.sqlite_path}")
+            counts = None
+        else:
+            counts = seed_hostel(client, tenants=args.tenants, rooms=args.rooms, years=args.years,
+                                 messages_per_tenant=args.messages, today=today, seed=args.seed)
+            if args.backend == "sqlite":
+                client.analyze()
+            print(f"Seeded {sum(counts.values())} documents in {time.perf_counter() - seed_start:.1f}s")
+        seed_seconds = time.perf_counter() - seed_start
+
+        # The shared Database connects on first use, so the seeded client only has
+        # to be in place before the first request
+        storage.set_db(client)
+        app = importlib.import_module("app").app
+
+        scenarios = build_scenarios(today)
+        if args.scenarios:
+            unknown = set(args.scenarios) - set(scenarios)
+            if unknown:
+                sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))} (expected {', '.join(scenarios)})")
+            scenarios = {name: scenarios[name] for name in args.scenarios}
+
+        tenant_ids = [doc.to_dict()["id"] for doc in client.collection("tenants").select(["id"]).stream()]
+
+        # One untimed pass compiles templates and fills lazy caches
+        warmup = _client(app, "admin", tenant_ids[0]), _client(app, "tenant", tenant_ids[0])
+        for role, method, path, body in scenarios.values():
+            _timed_request(warmup[0] if role == "admin" else warmup[1], method, path, body)
+
+        samples, wall_seconds = run_load(app, scenarios, args.clients, args.requests, tenant_ids)
+    finally:
+        client.close()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+    result = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "seeded": counts,
+        "seed_seconds": round(seed_seconds, 2),
+        "wall_seconds": round(wall_seconds, 2),
+        "total": summarize([s for values in samples.values() for s in values], wall_seconds),
+        "scenarios": {name: summarize(values, wall_seconds) for name, values in samples.items()},
+    }
+
+    output = args.output or os.path.join(DEFAULT_OUTPUT_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print_report(result)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
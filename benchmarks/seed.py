@@ -0,0 +1,200 @@
+import random
+from datetime import date, datetime, timedelta
+
+from utils import mess_attendance, mess_menu, room_occupancy
+
+# Documents per write batch while seeding (Firestore's batch limit)
+BATCH_SIZE = 500
+
+ADMIN_USERNAME = "admin"
+ADMIN_PASSWORD = "admin123"
+TENANT_PASSWORD = "tenant123"
+
+FIRST_NAMES = ["Aarav", "Priya", "Rohan", "Ananya", "Vikram", "Sneha", "Arjun", "Kavya", "Rahul", "Meera",
+               "Karan", "Isha", "Aditya", "Pooja", "Nikhil", "Divya", "Siddharth", "Neha", "Manish", "Riya"]
+LAST_NAMES = ["Sharma", "Patel", "Reddy", "Iyer", "Singh", "Gupta", "Nair", "Das", "Mehta", "Joshi"]
+FEE_TYPES = ["Hostel Rent", "Mess Fee", "Electricity", "Maintenance"]
+COMPLAINT_TYPES = ["Plumbing", "Electrical", "Cleaning", "Internet", "Furniture"]
+PAYMENT_METHODS = ["UPI", "Cash", "Card", "Bank Transfer"]
+MEALS = ["breakfast", "lunch", "dinner"]
+
+
+class _Writer:
+    """Buffers sets into batches of BATCH_SIZE and counts what was written"""
+
+    def __init__(self, client):
+        self.client = client
+        self.batch = client.batch()
+        self.pending = 0
+        self.counts = {}
+
+    def set(self, collection, doc_id, data):
+        self.batch.set(self.client.collection(collection).document(doc_id), data)
+        self.counts[collection] = self.counts.get(collection, 0) + 1
+        self.pending += 1
+        if self.pending >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.batch.commit()
+            self.batch = self.client.batch()
+            self.pending = 0
+
+
+def _days(start, end):
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def seed_hostel(client, tenants=60, rooms=None, years=1.0, messages_per_tenant=8, complaints_per_tenant=2,
+                today=None, seed=42):
+    """Fill a storage client with a synthetic hostel, shaped the way the app writes it.
+
+    Generates an admin user, rooms, tenants with login credentials, daily
+    attendance and mess attendance for the last `years` years, monthly
+    fees, complaints, message threads and the weekly menu. The same seed
+    always produces the same hostel. Returns documents written per collection.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    first_day = today - timedelta(days=max(int(years * 365), 1) - 1)
+    rooms = rooms or max(tenants // 2, 1)
+    writer = _Writer(client)
+
+    writer.set("users", "user_1", {"username": ADMIN_USERNAME, "email": "admin@hostel.test",
+                                   "password": ADMIN_PASSWORD})
+
+    room_numbers = []
+    for index in range(rooms):
+        room_no = f"{index // 20 + 1}{index % 20 + 1:02d}"
+        room_numbers.append(room_no)
+        writer.set("rooms", f"room_{index + 1}", {
+            "room_no": room_no,
+            "floor": str(index // 20 + 1),
+            "capacity": rng.choice([2, 3, 4]),
+            "ac": rng.choice(["AC", "Non-AC"]),
+            "status": rng.choice(["Available", "Available", "Occupied", "Under Maintenance"])
+        })
+
+    tenant_ids = []
+    names = {}
+    occupants = {}
+    for index in range(tenants):
+        tenant_id = 1001 + index
+        tenant_ids.append(tenant_id)
+        name = names[tenant_id] = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        tenant = {
+            "id": tenant_id,
+            "name": name,
+            "type": rng.choice(["Student", "Working Professional"]),
+            "email": f"{name.split()[0].lower()}.{tenant_id}@hostel.test",
+            "phone": f"9{rng.randint(100000000, 999999999)}",
+            "room": room_numbers[index % rooms],
+            "date": str(first_day + timedelta(days=rng.randint(0, 30))),
+            "ac": rng.choice(["AC", "Non-AC"]),
+            "sleep_time": str(rng.choice([21, 22, 23, 24])),
+            "smoking": rng.choice(["Yes", "No", "No", "No"]),
+            "status": rng.choice(["Active", "Active", "Active", "Inactive"])
+        }
+        writer.set("tenants", f"ten_{index + 1}", tenant)
+        writer.set("tenant_auth", f"auth_{tenant_id}", {"tenant_id": str(tenant_id), "password": TENANT_PASSWORD})
+        room = room_occupancy.occupied_room(tenant)
+        if room:
+            occupants.setdefault(room, []).append(tenant_id)
+
+    for room, ids in occupants.items():
+        writer.set(room_occupancy.COLLECTION, room_occupancy.index_id(room), {"room_no": room, "occupants": ids})
+
+    for day in _days(first_day, today):
+        date_str = str(day)
+        mess_counts = dict.fromkeys(mess_attendance.COUNTED, 0)
+        for tenant_id in tenant_ids:
+            status = rng.choices(["Present", "Absent", "Leave"], weights=[85, 10, 5])[0]
+            marked = datetime.combine(day, datetime.min.time()) + timedelta(hours=21, minutes=rng.randint(0, 90))
+            writer.set("attendance", f"{tenant_id}_{date_str}", {
+                "tenant_id": tenant_id,
+                "student_id": tenant_id,
+                "date": date_str,
+                "status": status,
+                "time": marked.strftime('%H:%M:%S'),
+                "timestamp": marked.isoformat(),
+                "updated_at": marked
+            })
+
+            meals = {meal: True for meal in MEALS if rng.random() < 0.7}
+            if meals:
+                writer.set(mess_attendance.RECORDS, mess_attendance.record_id(date_str, tenant_id),
+                           mess_attendance.record(date_str, tenant_id, meals))
+                mess_counts["students"] += 1
+                for meal in meals:
+                    mess_counts[meal] += 1
+        if mess_counts["students"]:
+            writer.set(mess_attendance.shards_path(date_str), "0", mess_counts)
+
+    for tenant_id in tenant_ids:
+        for month_start in _days(first_day, today):
+            if month_start.day != 1 and month_start != first_day:
+                continue
+            due_date = month_start.replace(day=min(month_start.day + 9, 28))
+            amount = float(rng.choice([4500, 5000, 6500]))
+            paid = due_date < today and rng.random() < 0.85
+            created = datetime.combine(month_start, datetime.min.time())
+            fee = {
+                "student_id": tenant_id,
+                "amount": amount,
+                "due_date": str(due_date),
+                "fee_type": rng.choice(FEE_TYPES),
+                "status": "paid" if paid else "pending",
+                "paid_amount": amount if paid else 0,
+                "created_at": created.isoformat(),
+                "updated_at": created
+            }
+            if paid:
+                fee.update({"paid_date": str(due_date - timedelta(days=rng.randint(0, 5))),
+                            "payment_method": rng.choice(PAYMENT_METHODS),
+                            "transaction_id": f"TXN{rng.randint(10 ** 9, 10 ** 10 - 1)}"})
+            writer.set("fees", f"fee_{tenant_id}_{month_start:%Y%m}", fee)
+
+    complaint_count = 0
+    for index, tenant_id in enumerate(tenant_ids):
+        for _ in range(complaints_per_tenant):
+            complaint_count += 1
+            created = datetime.combine(first_day, datetime.min.time()) + timedelta(
+                minutes=rng.randint(0, (today - first_day).days * 24 * 60))
+            writer.set("complaints", f"COMP_{complaint_count:04d}", {
+                "id": f"COMP_{complaint_count:04d}",
+                "ten_id": str(tenant_id),
+                "ten_name": names[tenant_id],
+                "ten_room": room_numbers[index % rooms],
+                "description": "Synthetic complaint for load testing",
+                "complaint_type": rng.choice(COMPLAINT_TYPES),
+                "priority": rng.choice(["low", "medium", "high"]),
+                "status": rng.choice(["pending", "resolved", "resolved"]),
+                "created_at": created.isoformat(),
+                "updated_at": created
+            })
+
+    for tenant_id in tenant_ids:
+        sent = datetime.combine(today, datetime.min.time()) - timedelta(days=rng.randint(0, 60))
+        for number in range(messages_per_tenant):
+            from_student = number % 2 == 0
+            sent += timedelta(minutes=rng.randint(5, 600))
+            writer.set("messages", f"msg_{tenant_id}_{number:03d}", {
+                "sender_id": tenant_id if from_student else ADMIN_USERNAME,
+                "sender_type": "student" if from_student else "admin",
+                "receiver_id": ADMIN_USERNAME if from_student else tenant_id,
+                "receiver_type": "admin" if from_student else "student",
+                "subject": "Room query" if from_student else "Re: Room query",
+                "message": "Synthetic message for load testing",
+                "timestamp": sent.isoformat(),
+                "read": number < messages_per_tenant - 2
+            })
+
+    menu = {day: {meal: f"{day.title()} {meal}" for meal in MEALS} for day in mess_menu.DAYS}
+    writer.set(mess_menu.COLLECTION, mess_menu.DOCUMENT, dict(menu, version="seed"))
+
+    writer.flush()
+    return writer.counts
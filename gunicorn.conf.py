@@ -0,0 +1,66 @@
+import gc
+import os
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '10000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+
+# More than one thread runs gthread workers, so a long-lived response such as a
+# kitchen display's headcount stream neither takes a whole worker nor trips the
+# timeout. GUNICORN_THREADS=1 gives sync workers, which are killed once one request
+# runs past `timeout`; the app then ends its streams before that (see utils/headcount.py).
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+
+# The app is imported once in the master and its immutable assets (ML model,
+# chatbot index, templates, QR/imaging libraries) are built there, then shared
+# copy-on-write by the forked workers. PRELOAD_APP=0 loads it in each worker instead.
+preload_app = os.getenv("PRELOAD_APP", "1") != "0"
+
+# Metrics from every worker are written here and merged at /metrics. It has to be
+# set before the app (and prometheus_client) is imported, which this file is.
+PROMETHEUS_DIR = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "prometheus"))
+os.makedirs(PROMETHEUS_DIR, exist_ok=True)
+
+if preload_app:
+    # No collections while the app is imported, so the objects it creates are packed
+    # together instead of around freed gaps; warm_up() freezes them before fork
+    gc.disable()
+
+
+def on_starting(server):
+    # Samples left by a previous run would otherwise be added to this one's. A
+    # preloaded app has already written the master's own files, so those stay.
+    suffix = f"_{os.getpid()}.db"
+    for name in os.listdir(PROMETHEUS_DIR):
+        if not name.endswith(suffix):
+            os.remove(os.path.join(PROMETHEUS_DIR, name))
+
+
+def when_ready(server):
+    if preload_app:
+        from utils.warmup import warm_up
+
+        warm_up(server.app.wsgi())
+        gc.enable()
+
+
+def pre_fork(server, worker):
+    # Runs in the master, which knows every live worker: take the lowest free slot,
+    # so a replacement worker reuses the id of the one it replaces
+    used = {getattr(other, "id_slot", None) for other in server.WORKERS.values()}
+    worker.id_slot = next(slot for slot in range(len(used) + 1) if slot not in used)
+
+
+def post_fork(server, worker):
+    # Frozen objects stay out of the worker's collections; everything it allocates is collected as usual
+    gc.enable()
+
+    from utils.id_utils import id_generator, worker_id_for_slot
+    id_generator.reset_worker(worker_id_for_slot(worker.id_slot))
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,77 @@
+import os
+import threading
+
+from storage.base import BaseClient, NotFound, AlreadyExists, read_count
+from storage.instrument import InstrumentedClient
+from storage.memory import MemoryClient
+from storage.sqlite import SQLiteClient
+
+BACKENDS = {
+    "firestore": "Firebase Firestore",
+    "memory": "the in-memory store",
+    "sqlite": "SQLite",
+}
+
+_client = None
+_owned = False
+_lock = threading.Lock()
+
+
+def backend_name():
+    backend = os.getenv("STORAGE_BACKEND", "firestore")
+    return BACKENDS.get(backend, backend)
+
+
+def create_client(backend=None):
+    """Build a client for STORAGE_BACKEND: firestore (default), memory or sqlite"""
+    backend = backend or os.getenv("STORAGE_BACKEND", "firestore")
+
+    if backend == "memory":
+        return MemoryClient()
+    if backend == "sqlite":
+        return SQLiteClient()
+    if backend == "firestore":
+        # Imported lazily so the local backends run without Firebase credentials
+        from firebase_connection import firebase_connection
+        return firebase_connection.get_db()
+    raise ValueError(f"Unknown storage backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+def _instrumented(client):
+    # DATASTORE_STATS=0 hands out the bare client, without per-request accounting
+    if client is None or os.getenv("DATASTORE_STATS", "1") == "0":
+        return client
+    return InstrumentedClient(client)
+
+
+def get_db():
+    """Process-wide client shared by the admin and tenant Database classes"""
+    global _client, _owned
+    with _lock:
+        if _client is None:
+            _client = _instrumented(create_client())
+            _owned = True
+        return _client
+
+
+def set_db(client):
+    """Replace the shared client, e.g. with a seeded MemoryClient for benchmarks"""
+    global _client, _owned
+    with _lock:
+        _client = _instrumented(client)
+        _owned = False
+
+
+def _drop_after_fork():
+    # A connection opened by the parent (gRPC channel, SQLite handle) cannot be
+    # shared with a forked worker; the worker connects again on first use.
+    # Clients handed in through set_db() are kept.
+    global _client, _owned, _lock
+    _lock = threading.Lock()
+    if _owned:
+        _client = None
+        _owned = False
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_drop_after_fork)
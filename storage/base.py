@@ -0,0 +1,539 @@
+import copy
+import math
+import random
+import string
+import threading
+from datetime import datetime, timezone
+
+# Write transforms are recognised by identity/type, so the app's
+# firebase_admin.firestore sentinels work against these backends unchanged.
+try:
+    from google.cloud.firestore_v1.transforms import (
+        SERVER_TIMESTAMP, DELETE_FIELD, Increment, ArrayUnion, ArrayRemove,
+    )
+except ImportError:
+    class _Sentinel:
+        def __init__(self, description):
+            self.description = description
+
+        def __repr__(self):
+            return f"Sentinel: {self.description}"
+
+    class _ValueList:
+        def __init__(self, values):
+            self.values = list(values)
+
+    class Increment:
+        def __init__(self, value):
+            self.value = value
+
+    class ArrayUnion(_ValueList):
+        pass
+
+    class ArrayRemove(_ValueList):
+        pass
+
+    SERVER_TIMESTAMP = _Sentinel("Value used to set a document field to the server timestamp.")
+    DELETE_FIELD = _Sentinel("Value used to delete a field in a document.")
+
+try:
+    from google.api_core.exceptions import NotFound, AlreadyExists
+except ImportError:
+    class NotFound(Exception):
+        pass
+
+    class AlreadyExists(Exception):
+        pass
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+DOCUMENT_ID = "__name__"
+
+INEQUALITY_OPS = ("<", "<=", ">", ">=", "!=", "not-in")
+OPERATORS = ("==", "!=", "<", "<=", ">", ">=", "in", "not-in", "array-contains", "array-contains-any")
+
+AUTO_ID_CHARS = string.ascii_letters + string.digits
+
+# Firestore's cross-type ordering: null < bool < number < timestamp < string < bytes < reference < array < map
+RANK_NULL, RANK_BOOL, RANK_NUMBER, RANK_TIMESTAMP, RANK_STRING, RANK_BYTES, RANK_REFERENCE, RANK_ARRAY, RANK_MAP = \
+    0, 1, 2, 3, 4, 5, 6, 8, 9
+
+_MISSING = object()
+
+# Billed reads made by the current thread, counted the way Firestore bills
+# them: one per document returned, one for an empty query result, and one
+# per 1000 index entries of a count() aggregation
+_reads = threading.local()
+
+
+def auto_id():
+    return "".join(random.choice(AUTO_ID_CHARS) for _ in range(20))
+
+
+def read_count():
+    """Document reads made so far by the calling thread; diff two calls to meter a request"""
+    return getattr(_reads, "count", 0)
+
+
+def _record_reads(count):
+    _reads.count = read_count() + count
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+def to_utc(value):
+    """Timestamps are stored timezone-aware in UTC, as Firestore returns them"""
+    if value.tzinfo is None:
+        # The Firestore client also treats naive datetimes as UTC
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def type_rank(value):
+    if value is None:
+        return RANK_NULL
+    if isinstance(value, bool):
+        return RANK_BOOL
+    if isinstance(value, (int, float)):
+        return RANK_NUMBER
+    if isinstance(value, datetime):
+        return RANK_TIMESTAMP
+    if isinstance(value, str):
+        return RANK_STRING
+    if isinstance(value, bytes):
+        return RANK_BYTES
+    if isinstance(value, DocumentReference):
+        return RANK_REFERENCE
+    if isinstance(value, (list, tuple)):
+        return RANK_ARRAY
+    if isinstance(value, dict):
+        return RANK_MAP
+    raise TypeError(f"Unsupported value type: {type(value).__name__}")
+
+
+def sort_key(value):
+    """Total order over stored values matching Firestore's, for sorting and comparing"""
+    rank = type_rank(value)
+    if rank == RANK_TIMESTAMP:
+        return rank, to_utc(value)
+    if rank == RANK_REFERENCE:
+        return rank, value.path
+    if rank == RANK_ARRAY:
+        return rank, tuple(sort_key(v) for v in value)
+    if rank == RANK_MAP:
+        return rank, tuple((k, sort_key(v)) for k, v in sorted(value.items()))
+    if rank == RANK_NULL:
+        return rank, 0
+    return rank, value
+
+
+def get_field(data, field_path, doc_id=None):
+    """Value at a dotted field path, or _MISSING"""
+    if field_path == DOCUMENT_ID:
+        return doc_id
+    value = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _resolve(value, existing):
+    """Apply a write transform against the existing field value"""
+    if value is SERVER_TIMESTAMP:
+        return utc_now()
+    if isinstance(value, Increment):
+        return (existing if isinstance(existing, (int, float)) and not isinstance(existing, bool) else 0) + value.value
+    if isinstance(value, ArrayUnion):
+        current = list(existing) if isinstance(existing, list) else []
+        return current + [v for v in value.values if v not in current]
+    if isinstance(value, ArrayRemove):
+        return [v for v in existing if v not in value.values] if isinstance(existing, list) else []
+    if isinstance(value, dict):
+        return {k: _resolve(v, _MISSING) for k, v in value.items() if v is not DELETE_FIELD}
+    if isinstance(value, datetime):
+        return to_utc(value)
+    if isinstance(value, (list, tuple)):
+        return [_resolve(v, _MISSING) for v in value]
+    return value
+
+
+def _set_path(data, parts, value):
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+
+    if value is DELETE_FIELD:
+        data.pop(parts[-1], None)
+    else:
+        data[parts[-1]] = _resolve(value, data.get(parts[-1], _MISSING))
+
+
+def _merge(target, updates):
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            _set_path(target, [key], value)
+
+
+def apply_write(existing, write):
+    """Return the new document data for a write, or None for a delete.
+
+    Shared by every backend so set/merge/update/transform semantics are
+    identical regardless of where documents live.
+    """
+    kind, data, option = write.kind, write.data, write.option
+
+    if kind == "delete":
+        return None
+    if kind == "create":
+        if existing is not None:
+            raise AlreadyExists(f"Document already exists: {write.path}")
+        kind = "set"
+    if kind == "set":
+        if option and existing is not None:
+            result = copy.deepcopy(existing)
+            _merge(result, data)
+            return result
+        return _resolve(data, _MISSING)
+    if kind == "update":
+        if existing is None:
+            raise NotFound(f"No document to update: {write.path}")
+        result = copy.deepcopy(existing)
+        for field_path, value in data.items():
+            _set_path(result, field_path.split("."), value)
+        return result
+    raise ValueError(f"Unknown write kind: {kind}")
+
+
+class Write:
+    def __init__(self, kind, reference, data=None, option=None):
+        self.kind = kind
+        self.reference = reference
+        self.data = data or {}
+        self.option = option
+
+    @property
+    def path(self):
+        return self.reference.path
+
+
+class WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, read_time=None, projection=None):
+        self.reference = reference
+        self._data = data
+        self.read_time = read_time or utc_now()
+        self._projection = projection
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        if self._data is None:
+            return None
+        if self._projection is None:
+            return copy.deepcopy(self._data)
+
+        result = {}
+        for field_path in self._projection:
+            value = get_field(self._data, field_path)
+            if value is not _MISSING:
+                _set_path(result, field_path.split("."), copy.deepcopy(value))
+        return result
+
+    def get(self, field_path):
+        value = get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class DocumentReference:
+    def __init__(self, client, collection_path, doc_id):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+
+    @property
+    def path(self):
+        return f"{self._collection_path}/{self.id}"
+
+    @property
+    def parent(self):
+        return CollectionReference(self._client, self._collection_path)
+
+    def __eq__(self, other):
+        return isinstance(other, DocumentReference) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+    def __deepcopy__(self, memo):
+        # References are immutable handles; copying one must not copy the client
+        return self
+
+    def __repr__(self):
+        return f"<DocumentReference {self.path}>"
+
+    def collection(self, name):
+        return CollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths=None, transaction=None):
+        data = self._client._get(self._collection_path, self.id)
+        _record_reads(1)
+        return DocumentSnapshot(self, data, projection=field_paths)
+
+    def _commit(self, write):
+        return self._client._commit([write])[0]
+
+    def create(self, document_data):
+        return self._commit(Write("create", self, document_data))
+
+    def set(self, document_data, merge=False):
+        return self._commit(Write("set", self, document_data, merge))
+
+    def update(self, field_updates, option=None):
+        return self._commit(Write("update", self, field_updates))
+
+    def delete(self, option=None):
+        return self._commit(Write("delete", self))
+
+
+class Query:
+    """Immutable query builder; backends execute it via _client._run_query / _count"""
+
+    ASCENDING = ASCENDING
+    DESCENDING = DESCENDING
+
+    def __init__(self, client, collection_path, filters=(), orders=(), limit=None, offset=0,
+                 start=None, end=None, projection=None):
+        self._client = client
+        self._collection_path = collection_path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._offset = offset
+        self._start = start
+        self._end = end
+        self._projection = projection
+
+    def _copy(self, **changes):
+        params = dict(filters=self._filters, orders=self._orders, limit=self._limit, offset=self._offset,
+                      start=self._start, end=self._end, projection=self._projection)
+        params.update(changes)
+        return Query(self._client, self._collection_path, **params)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {op_string}")
+        if field_path == DOCUMENT_ID:
+            value = self._document_id_value(value)
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def _document_id_value(self, value):
+        if isinstance(value, (list, tuple)):
+            return [self._document_id_value(v) for v in value]
+        return value.id if isinstance(value, DocumentReference) else value
+
+    def order_by(self, field_path, direction=ASCENDING):
+        if direction not in (ASCENDING, DESCENDING):
+            raise ValueError(f"Invalid direction: {direction}")
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def start_at(self, document_fields):
+        return self._copy(start=(document_fields, True))
+
+    def start_after(self, document_fields):
+        return self._copy(start=(document_fields, False))
+
+    def end_before(self, document_fields):
+        return self._copy(end=(document_fields, True))
+
+    def end_at(self, document_fields):
+        return self._copy(end=(document_fields, False))
+
+    def normalized_orders(self):
+        """Explicit orders, then unordered inequality fields, then document id (Firestore's implicit ordering)"""
+        orders = list(self._orders)
+        ordered = [field for field, _ in orders]
+        last_direction = orders[-1][1] if orders else ASCENDING
+
+        for field, op, _ in self._filters:
+            if op in INEQUALITY_OPS and field not in ordered:
+                orders.append((field, last_direction))
+                ordered.append(field)
+
+        if DOCUMENT_ID not in ordered:
+            orders.append((DOCUMENT_ID, last_direction))
+        return orders
+
+    def cursor_values(self, cursor):
+        """Resolve a snapshot, dict or list cursor into one value per normalized order"""
+        if cursor is None:
+            return None
+        document_fields, before = cursor
+        orders = self.normalized_orders()
+
+        if isinstance(document_fields, DocumentSnapshot):
+            snapshot = document_fields
+            values = [snapshot.id if field == DOCUMENT_ID else get_field(snapshot._data or {}, field)
+                      for field, _ in orders]
+        elif isinstance(document_fields, dict):
+            values = []
+            for field, _ in orders:
+                if field not in document_fields:
+                    break
+                values.append(document_fields[field])
+        else:
+            values = list(document_fields)
+
+        values = [self._document_id_value(v) if field == DOCUMENT_ID else v
+                  for (field, _), v in zip(orders, values)]
+        return values, before
+
+    def stream(self, transaction=None):
+        rows = self._client._run_query(self)
+        _record_reads(max(len(rows), 1))
+        for doc_id, data in rows:
+            reference = DocumentReference(self._client, self._collection_path, doc_id)
+            yield DocumentSnapshot(reference, data, projection=self._projection)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+    def count(self, alias=None):
+        return AggregationQuery(self, alias or "field_1")
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+
+    @property
+    def id(self):
+        return self._collection_path.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, self._collection_path, document_id or auto_id())
+
+    def add(self, document_data, document_id=None):
+        reference = self.document(document_id)
+        result = reference.create(document_data)
+        return result.update_time, reference
+
+    def list_documents(self, page_size=None):
+        for doc in self.select([]).stream():
+            yield doc.reference
+
+
+class AggregationResult:
+    def __init__(self, alias, value, read_time=None):
+        self.alias = alias
+        self.value = value
+        self.read_time = read_time
+
+
+class AggregationQuery:
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias
+
+    def get(self, transaction=None):
+        count = self._query._client._count(self._query)
+        _record_reads(max(math.ceil(count / 1000), 1))
+        return [[AggregationResult(self._alias, count, utc_now())]]
+
+    def stream(self, transaction=None):
+        yield from self.get()
+
+
+class WriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def create(self, reference, document_data):
+        self._writes.append(Write("create", reference, document_data))
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(Write("set", reference, document_data, merge))
+
+    def update(self, reference, field_updates, option=None):
+        self._writes.append(Write("update", reference, field_updates))
+
+    def delete(self, reference, option=None):
+        self._writes.append(Write("delete", reference))
+
+    def __len__(self):
+        return len(self._writes)
+
+    def commit(self, retry=None, timeout=None):
+        writes, self._writes = self._writes, []
+        return self._client._commit(writes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+
+class BaseClient:
+    """Firestore-compatible client surface over a pluggable document store.
+
+    Backends implement _get, _commit (atomic), _run_query and _count;
+    everything the app calls on db.collection(...) is shared.
+    """
+
+    def collection(self, collection_path):
+        return CollectionReference(self, collection_path)
+
+    def document(self, document_path):
+        collection_path, _, doc_id = document_path.rpartition("/")
+        return DocumentReference(self, collection_path, doc_id)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def close(self):
+        pass
+
+    def _get(self, collection_path, doc_id):
+        raise NotImplementedError
+
+    def _commit(self, writes):
+        raise NotImplementedError
+
+    def _run_query(self, query):
+        raise NotImplementedError
+
+    def _count(self, query):
+        raise NotImplementedError
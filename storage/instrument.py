@@ -0,0 +1,333 @@
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+# Stats for the unit of work in progress (normally one Flask request);
+# calls made outside one, e.g. from CLI commands or job threads, are not counted
+_current = ContextVar("datastore_stats", default=None)
+
+
+def _shape_path(path):
+    """Collection path with document ids replaced, so subcollections of different parents match"""
+    parts = path.split("/")
+    return "/".join("*" if index % 2 else part for index, part in enumerate(parts))
+
+
+def _unwrap(value):
+    if isinstance(value, (_Query, _Document, _Batch)):
+        return value._target
+    if isinstance(value, dict):
+        return {key: _unwrap(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap(v) for v in value)
+    return value
+
+
+def _record(kind, shape, reads=0, writes=0, seconds=0.0):
+    stats = _current.get()
+    while stats is not None:
+        stats.add(kind, shape, reads, writes, seconds)
+        stats = stats.parent
+
+
+class DatastoreStats:
+    """Datastore calls made during one request.
+
+    Reads are counted the way Firestore bills them: one per document
+    returned, one for an empty result and one per 1000 entries counted by
+    an aggregation. `shapes` counts each query shape (collection, filtered
+    and ordered fields, without values); the same shape issued many times
+    in one request is the signature of an N+1 loop. Async views may
+    record from several pool threads at once. Calls are also added to
+    `parent`, the stats that were current when these began, so a caller
+    wrapping a whole request (the benchmarks) sees everything it did.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+        self.queries = 0
+        self.lookups = 0
+        self.commits = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def add(self, kind, shape, reads=0, writes=0, seconds=0.0):
+        with self._lock:
+            if kind == "query":
+                self.queries += 1
+            elif kind == "lookup":
+                self.lookups += 1
+            else:
+                self.commits += 1
+            self.reads += reads
+            self.writes += writes
+            self.seconds += seconds
+            self.shapes[shape] += 1
+
+    @property
+    def calls(self):
+        return self.queries + self.lookups + self.commits
+
+    def repeated(self, threshold):
+        """Shapes issued more than threshold times, most frequent first"""
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+    def server_timing(self):
+        return (f'db;dur={self.seconds * 1000:.1f};desc="{self.reads} reads, {self.writes} writes, '
+                f'{self.queries} queries, {self.lookups} lookups"')
+
+    def to_dict(self):
+        return {
+            "reads": self.reads,
+            "writes": self.writes,
+            "queries": self.queries,
+            "lookups": self.lookups,
+            "commits": self.commits,
+            "ms": round(self.seconds * 1000, 1),
+        }
+
+
+def begin():
+    """Start counting calls in the current context; pass the token to end()"""
+    return _current.set(DatastoreStats(_current.get()))
+
+
+def current():
+    return _current.get()
+
+
+def end(token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # Token from another context (e.g. a streamed response finishing elsewhere)
+        _current.set(None)
+
+
+class _Query:
+    """Wraps a collection or query, remembering its shape as it is built"""
+
+    def __init__(self, target, path, shape=()):
+        self._target = target
+        self._path = path
+        self._shape = shape
+
+    def _extend(self, target, *part):
+        return _Query(target, self._path, self._shape + (part,))
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            part = ("where", getattr(filter, "field_path", "?"), getattr(filter, "op_string", "?"))
+            return self._extend(self._target.where(filter=_unwrap(filter)), *part)
+        return self._extend(self._target.where(field_path, op_string, _unwrap(value)), "where", field_path, op_string)
+
+    def order_by(self, field_path, *args, **kwargs):
+        return self._extend(self._target.order_by(field_path, *args, **kwargs), "order by", field_path)
+
+    def select(self, field_paths):
+        return self._extend(self._target.select(field_paths), "select")
+
+    def limit(self, count):
+        return self._extend(self._target.limit(count), "limit")
+
+    def limit_to_last(self, count):
+        return self._extend(self._target.limit_to_last(count), "limit")
+
+    def offset(self, num_to_skip):
+        return self._extend(self._target.offset(num_to_skip), "offset")
+
+    def start_at(self, document_fields):
+        return self._extend(self._target.start_at(_unwrap(document_fields)), "cursor")
+
+    def start_after(self, document_fields):
+        return self._extend(self._target.start_after(_unwrap(document_fields)), "cursor")
+
+    def end_before(self, document_fields):
+        return self._extend(self._target.end_before(_unwrap(document_fields)), "cursor")
+
+    def end_at(self, document_fields):
+        return self._extend(self._target.end_at(_unwrap(document_fields)), "cursor")
+
+    def describe(self):
+        words = [_shape_path(self._path)]
+        for part in self._shape:
+            words.extend(str(word) for word in part)
+        return " ".join(words)
+
+    def stream(self, *args, **kwargs):
+        iterator = iter(self._target.stream(*args, **kwargs))
+        count = 0
+        seconds = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    doc = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    seconds += time.perf_counter() - start
+                count += 1
+                yield doc
+        finally:
+            _record("query", "query " + self.describe(), reads=max(count, 1), seconds=seconds)
+
+    def get(self, *args, **kwargs):
+        start = time.perf_counter()
+        docs = self._target.get(*args, **kwargs)
+        _record("query", "query " + self.describe(), reads=max(len(docs), 1),
+                seconds=time.perf_counter() - start)
+        return docs
+
+    def count(self, alias=None):
+        return _Aggregation(self._target.count(alias=alias), "count " + self.describe())
+
+    def document(self, document_id=None):
+        return _Document(self._target.document(document_id), self._path)
+
+    def add(self, document_data, document_id=None):
+        start = time.perf_counter()
+        result = self._target.add(_unwrap(document_data), document_id=document_id)
+        _record("commit", "write " + _shape_path(self._path), writes=1, seconds=time.perf_counter() - start)
+        return result
+
+
+class _Aggregation:
+    def __init__(self, target, shape):
+        self._target = target
+        self._shape = shape
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def get(self, *args, **kwargs):
+        start = time.perf_counter()
+        results = self._target.get(*args, **kwargs)
+        total = sum(result.value for row in results for result in row if isinstance(result.value, int))
+        _record("query", self._shape, reads=max(-(-total // 1000), 1), seconds=time.perf_counter() - start)
+        return results
+
+
+class _Document:
+    def __init__(self, target, collection_path):
+        self._target = target
+        self._path = collection_path
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __eq__(self, other):
+        return self._target == _unwrap(other)
+
+    def __hash__(self):
+        return hash(self._target)
+
+    def _write(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        result = method(*args, **kwargs)
+        _record("commit", "write " + _shape_path(self._path), writes=1, seconds=time.perf_counter() - start)
+        return result
+
+    def get(self, *args, **kwargs):
+        start = time.perf_counter()
+        snapshot = self._target.get(*args, **kwargs)
+        _record("lookup", "get " + _shape_path(self._path) + "/*", reads=1, seconds=time.perf_counter() - start)
+        return snapshot
+
+    def create(self, document_data):
+        return self._write(self._target.create, _unwrap(document_data))
+
+    def set(self, document_data, merge=False):
+        return self._write(self._target.set, _unwrap(document_data), merge=merge)
+
+    def update(self, field_updates, *args, **kwargs):
+        return self._write(self._target.update, _unwrap(field_updates), *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._write(self._target.delete, *args, **kwargs)
+
+    def collection(self, name):
+        return _Query(self._target.collection(name), f"{self._path}/{self._target.id}/{name}")
+
+
+class _Batch:
+    def __init__(self, target):
+        self._target = target
+        self._writes = 0
+        self._collections = set()
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def __len__(self):
+        return len(self._target)
+
+    def _stage(self, method, reference, *args, **kwargs):
+        self._writes += 1
+        if isinstance(reference, _Document):
+            self._collections.add(_shape_path(reference._path))
+        else:
+            self._collections.add(_shape_path(reference.path.rpartition("/")[0]))
+        return method(_unwrap(reference), *(_unwrap(arg) for arg in args), **kwargs)
+
+    def create(self, reference, document_data):
+        return self._stage(self._target.create, reference, document_data)
+
+    def set(self, reference, document_data, merge=False):
+        return self._stage(self._target.set, reference, document_data, merge=merge)
+
+    def update(self, reference, field_updates, *args, **kwargs):
+        return self._stage(self._target.update, reference, field_updates, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        return self._stage(self._target.delete, reference, *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._target.commit(*args, **kwargs)
+        finally:
+            _record("commit", "batch " + ",".join(sorted(self._collections)), writes=self._writes,
+                    seconds=time.perf_counter() - start)
+            self._writes = 0
+            self._collections = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+
+
+class InstrumentedClient:
+    """Wraps a Firestore (or local backend) client so every call is counted.
+
+    Collections, queries, documents and batches handed out are thin
+    wrappers that record reads, writes and round-trip time into the
+    current DatastoreStats; anything else is passed straight through.
+    Snapshots are the backend's own, so writes made through
+    snapshot.reference are not counted.
+    """
+
+    def __init__(self, client):
+        self._target = client
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+    def collection(self, collection_path):
+        return _Query(self._target.collection(collection_path), collection_path)
+
+    def document(self, document_path):
+        return _Document(self._target.document(document_path), document_path.rpartition("/")[0])
+
+    def batch(self):
+        return _Batch(self._target.batch())
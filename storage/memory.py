@@ -0,0 +1,122 @@
+import threading
+
+from storage.base import (BaseClient, WriteResult, apply_write, get_field, sort_key, type_rank, utc_now,
+                          DESCENDING, _MISSING)
+
+
+def _equal(value, target):
+    return sort_key(value) == sort_key(target)
+
+
+def _compare_values(value, target):
+    a, b = sort_key(value), sort_key(target)
+    return (a > b) - (a < b)
+
+
+def matches(value, op, target):
+    """Firestore filter semantics: missing fields never match, ranges only match the same type"""
+    if value is _MISSING:
+        return False
+    if op == "==":
+        return _equal(value, target)
+    if op == "!=":
+        return value is not None and not _equal(value, target)
+    if op == "in":
+        return any(_equal(value, t) for t in target)
+    if op == "not-in":
+        return value is not None and not any(_equal(value, t) for t in target)
+    if op == "array-contains":
+        return isinstance(value, list) and any(_equal(v, target) for v in value)
+    if op == "array-contains-any":
+        return isinstance(value, list) and any(_equal(v, t) for v in value for t in target)
+
+    if type_rank(value) != type_rank(target):
+        return False
+    result = _compare_values(value, target)
+    return {"<": result < 0, "<=": result <= 0, ">": result > 0, ">=": result >= 0}[op]
+
+
+def compare_keys(keys, values, orders):
+    """Compare a row's order keys against cursor values, honouring each order's direction"""
+    for key, value, (_, direction) in zip(keys, values, orders):
+        result = _compare_values(key, value)
+        if result:
+            return -result if direction == DESCENDING else result
+    return 0
+
+
+def run_query(query, documents):
+    """Evaluate a Query over (id, data) pairs: filter, order, apply cursors, offset and limit"""
+    orders = query.normalized_orders()
+
+    rows = []
+    for doc_id, data in documents:
+        if not all(matches(get_field(data, field, doc_id), op, value) for field, op, value in query._filters):
+            continue
+        keys = [get_field(data, field, doc_id) for field, _ in orders]
+        # Ordering by a field excludes documents that do not have it
+        if any(key is _MISSING for key in keys):
+            continue
+        rows.append((keys, doc_id, data))
+
+    # Stable sorts from the least significant order give a multi-direction sort
+    for index in range(len(orders) - 1, -1, -1):
+        rows.sort(key=lambda row: sort_key(row[0][index]), reverse=orders[index][1] == DESCENDING)
+
+    start = query.cursor_values(query._start)
+    if start is not None:
+        values, before = start
+        rows = [row for row in rows if compare_keys(row[0], values, orders) > (-1 if before else 0)]
+
+    end = query.cursor_values(query._end)
+    if end is not None:
+        values, before = end
+        rows = [row for row in rows if compare_keys(row[0], values, orders) < (0 if before else 1)]
+
+    rows = rows[query._offset:]
+    if query._limit is not None:
+        rows = rows[:query._limit]
+    return [(doc_id, data) for _, doc_id, data in rows]
+
+
+class MemoryClient(BaseClient):
+    """Documents held in process memory; state is lost when the process exits.
+
+    Stored dicts are never mutated in place (every write builds a new one),
+    so snapshots can share them and only copy on to_dict().
+    """
+
+    def __init__(self):
+        self._collections = {}
+        self._lock = threading.RLock()
+
+    def _get(self, collection_path, doc_id):
+        with self._lock:
+            return self._collections.get(collection_path, {}).get(doc_id)
+
+    def _commit(self, writes):
+        with self._lock:
+            # Stage every write first so a failing one leaves nothing applied
+            staged = {}
+            for write in writes:
+                key = (write.reference._collection_path, write.reference.id)
+                existing = staged[key] if key in staged else self._get(*key)
+                staged[key] = apply_write(existing, write)
+
+            for (collection_path, doc_id), data in staged.items():
+                collection = self._collections.setdefault(collection_path, {})
+                if data is None:
+                    collection.pop(doc_id, None)
+                else:
+                    collection[doc_id] = data
+
+        now = utc_now()
+        return [WriteResult(now) for _ in writes]
+
+    def _run_query(self, query):
+        with self._lock:
+            documents = list(self._collections.get(query._collection_path, {}).items())
+        return run_query(query, documents)
+
+    def _count(self, query):
+        return len(self._run_query(query))
@@ -0,0 +1,64 @@
+from storage.base import DOCUMENT_ID
+
+# Documents per read page and per write batch (Firestore's batch limit)
+BATCH_SIZE = 500
+
+
+def convert(value, target):
+    """Rebuild a Firestore value for the target client.
+
+    DocumentReferences are re-pointed at the target so they resolve there,
+    and GeoPoints (which the local backends have no type for) become maps.
+    """
+    if hasattr(value, "latitude") and hasattr(value, "longitude"):
+        return {"latitude": value.latitude, "longitude": value.longitude}
+    if hasattr(value, "path") and hasattr(value, "collection") and hasattr(value, "id"):
+        return target.document(value.path)
+    if isinstance(value, dict):
+        return {key: convert(v, target) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [convert(v, target) for v in value]
+    return value
+
+
+def copy_collection(source_ref, target, path, batch_size=BATCH_SIZE, subcollections=False):
+    """Copy one collection page by page in document id order; returns documents copied"""
+    copied = 0
+    last = None
+    while True:
+        query = source_ref.order_by(DOCUMENT_ID).limit(batch_size)
+        if last is not None:
+            query = query.start_after(last)
+        docs = list(query.stream())
+        if not docs:
+            break
+
+        batch = target.batch()
+        for doc in docs:
+            batch.set(target.collection(path).document(doc.id), convert(doc.to_dict(), target))
+        batch.commit()
+        copied += len(docs)
+
+        if subcollections:
+            for doc in docs:
+                for child in doc.reference.collections():
+                    copied += copy_collection(child, target, f"{path}/{doc.id}/{child.id}",
+                                              batch_size, subcollections)
+
+        last = docs[-1]
+        if len(docs) < batch_size:
+            break
+    return copied
+
+
+def copy_collections(source, target, collections=None, batch_size=BATCH_SIZE, subcollections=False):
+    """Copy collections (default: every top-level one) from source to target.
+
+    Writes are idempotent sets, so an interrupted run can simply be repeated.
+    Returns the number of documents copied per collection.
+    """
+    names = collections or [ref.id for ref in source.collections()]
+    summary = {}
+    for name in names:
+        summary[name] = copy_collection(source.collection(name), target, name, batch_size, subcollections)
+    return summary
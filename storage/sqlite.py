@@ -0,0 +1,373 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from storage.base import (BaseClient, DocumentReference, WriteResult, apply_write, to_utc, type_rank, utc_now,
+                          DESCENDING, DOCUMENT_ID,
+                          RANK_NULL, RANK_BOOL, RANK_TIMESTAMP, RANK_BYTES, RANK_REFERENCE, RANK_ARRAY, RANK_MAP)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "hostel.sqlite3")
+
+# JSON has no timestamp, bytes or reference type, so those are stored as
+# strings behind a private-use prefix. Timestamps are fixed-width UTC, so
+# they sort chronologically as text.
+MARKER = "\ue000"
+TIMESTAMP_PREFIX = MARKER + "t"
+BYTES_PREFIX = MARKER + "b"
+REFERENCE_PREFIX = MARKER + "r"
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+# Fields the app filters or orders on across collections: tenant ids, dates,
+# statuses and timestamps. Each index covers every collection.
+INDEXED_FIELDS = ("id", "date", "status", "student_id", "tenant_id", "ten_id", "room",
+                  "timestamp", "submitted_at", "updated_at")
+
+# Seconds a writer waits for the lock before raising "database is locked"
+BUSY_TIMEOUT = 10
+MMAP_SIZE = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+) WITHOUT ROWID
+"""
+
+
+def encode(value):
+    if isinstance(value, datetime):
+        return TIMESTAMP_PREFIX + to_utc(value).strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, bytes):
+        return BYTES_PREFIX + base64.b64encode(value).decode("ascii")
+    if isinstance(value, DocumentReference):
+        return REFERENCE_PREFIX + value.path
+    if isinstance(value, dict):
+        return {key: encode(v) for key, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(v) for v in value]
+    return value
+
+
+def decode(value, client):
+    if isinstance(value, str) and value.startswith(MARKER):
+        prefix, body = value[:2], value[2:]
+        if prefix == TIMESTAMP_PREFIX:
+            return datetime.strptime(body, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc)
+        if prefix == BYTES_PREFIX:
+            return base64.b64decode(body)
+        if prefix == REFERENCE_PREFIX:
+            return client.document(body)
+        return value
+    if isinstance(value, dict):
+        return {key: decode(v, client) for key, v in value.items()}
+    if isinstance(value, list):
+        return [decode(v, client) for v in value]
+    return value
+
+
+def dumps(data):
+    return json.dumps(encode(data), separators=(",", ":"), sort_keys=True, ensure_ascii=False)
+
+
+def json_path(field_path):
+    # Paths are inlined rather than bound so expression indexes can match them
+    parts = ".".join('"' + part.replace('"', '""') + '"' for part in field_path.split("."))
+    return "'$." + parts.replace("'", "''") + "'"
+
+
+def rank_sql(type_expr, value_expr):
+    """SQL for the Firestore type rank of a JSON value (see storage.base)"""
+    return (f"CASE {type_expr} WHEN 'null' THEN 0 WHEN 'true' THEN 1 WHEN 'false' THEN 1 "
+            f"WHEN 'integer' THEN 2 WHEN 'real' THEN 2 "
+            f"WHEN 'text' THEN CASE substr({value_expr}, 1, 2) WHEN '{TIMESTAMP_PREFIX}' THEN 3 "
+            f"WHEN '{BYTES_PREFIX}' THEN 5 WHEN '{REFERENCE_PREFIX}' THEN 6 ELSE 4 END "
+            f"WHEN 'array' THEN 8 WHEN 'object' THEN 9 END")
+
+
+class Field:
+    """SQL expressions for one field path of the data column"""
+
+    def __init__(self, field_path):
+        path = json_path(field_path)
+        self.type = f"json_type(data, {path})"
+        self.value = f"json_extract(data, {path})"
+        self.rank = rank_sql(self.type, self.value)
+        self.path = path
+
+
+def sql_value(value):
+    """(rank, parameter) for comparing a Python value against Field expressions"""
+    rank = type_rank(value)
+    if rank == RANK_BOOL:
+        return rank, int(value)
+    if rank in (RANK_ARRAY, RANK_MAP):
+        return rank, dumps(value)
+    if rank in (RANK_TIMESTAMP, RANK_BYTES, RANK_REFERENCE):
+        return rank, encode(value)
+    return rank, value
+
+
+def _equals(rank_expr, value_expr, value, params):
+    if value is None:
+        return f"({rank_expr}) = {RANK_NULL}"
+    rank, param = sql_value(value)
+    params.extend([rank, param])
+    return f"(({rank_expr}) = ? AND {value_expr} = ?)"
+
+
+def _exists(field):
+    return f"({field.type} IS NOT NULL AND {field.type} != 'null')"
+
+
+def filter_sql(field_path, op, value, params):
+    if field_path == DOCUMENT_ID:
+        if op in ("in", "not-in"):
+            params.extend(value)
+            placeholders = ", ".join("?" for _ in value) or "NULL"
+            return f"id {'IN' if op == 'in' else 'NOT IN'} ({placeholders})"
+        params.append(value)
+        return f"id {'=' if op == '==' else op} ?"
+
+    field = Field(field_path)
+
+    if op == "==":
+        return _equals(field.rank, field.value, value, params)
+    if op == "!=":
+        return f"({_exists(field)} AND NOT {_equals(field.rank, field.value, value, params)})"
+    if op in ("in", "not-in"):
+        terms = " OR ".join(_equals(field.rank, field.value, v, params) for v in value) or "0"
+        return f"({terms})" if op == "in" else f"({_exists(field)} AND NOT ({terms}))"
+    if op in ("array-contains", "array-contains-any"):
+        targets = [value] if op == "array-contains" else value
+        element_rank = rank_sql("e.type", "e.value")
+        terms = " OR ".join(_equals(element_rank, "e.value", v, params) for v in targets) or "0"
+        return f"({field.type} = 'array' AND EXISTS (SELECT 1 FROM json_each(data, {field.path}) AS e WHERE {terms}))"
+
+    rank, param = sql_value(value)
+    params.extend([rank, param])
+    return f"(({field.rank}) = ? AND {field.value} {op} ?)"
+
+
+def _cursor_sql(columns, values, after, inclusive, params):
+    """Lexicographic keyset condition over (expression, descending) columns"""
+    terms = []
+    for index, ((expr, descending), value) in enumerate(zip(columns, values)):
+        prefix = [f"{columns[i][0]} IS ?" for i in range(index)]
+        params.extend(values[:index])
+        greater = after != descending
+        terms.append("(" + " AND ".join(prefix + [f"{expr} {'>' if greater else '<'} ?"]) + ")")
+        params.append(value)
+    if inclusive:
+        terms.append("(" + " AND ".join(f"{expr} IS ?" for expr, _ in columns[:len(values)]) + ")")
+        params.extend(values)
+    return "(" + " OR ".join(terms) + ")"
+
+
+def query_sql(query, select="id, data"):
+    """Translate a Query into SQL and parameters"""
+    params = [query._collection_path]
+    where = ["collection = ?"]
+    for field_path, op, value in query._filters:
+        where.append(filter_sql(field_path, op, value, params))
+
+    orders = query.normalized_orders()
+    columns = []
+    for field_path, direction in orders:
+        descending = direction == DESCENDING
+        if field_path == DOCUMENT_ID:
+            columns.append(("id", descending))
+        else:
+            field = Field(field_path)
+            # Ordering by a field excludes documents that do not have it
+            where.append(f"{field.type} IS NOT NULL")
+            columns.append((f"({field.rank})", descending))
+            columns.append((field.value, descending))
+
+    for cursor, after in ((query._start, True), (query._end, False)):
+        resolved = query.cursor_values(cursor)
+        if resolved is None:
+            continue
+        values, before = resolved
+        flat = []
+        for (field_path, _), value in zip(orders, values):
+            if field_path == DOCUMENT_ID:
+                flat.append(value)
+            else:
+                flat.extend(sql_value(value))
+        # start_at / end_at include the cursor row; start_after / end_before do not
+        inclusive = before if after else not before
+        where.append(_cursor_sql(columns, flat, after, inclusive, params))
+
+    order_sql = ", ".join(f"{expr} {'DESC' if descending else 'ASC'}" for expr, descending in columns)
+    sql = f"SELECT {select} FROM documents WHERE {' AND '.join(where)} ORDER BY {order_sql}"
+    if query._limit is not None or query._offset:
+        sql += " LIMIT ? OFFSET ?"
+        params.extend([-1 if query._limit is None else query._limit, query._offset])
+    return sql, params
+
+
+class _ThreadConnection:
+    """A thread's connection, kept in thread-local storage so it is dropped when the thread exits"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.pid = os.getpid()
+
+
+class SQLiteClient(BaseClient):
+    """Documents stored as JSON rows in a single SQLite table.
+
+    Filters, ordering, cursors, limits and counts are translated to SQL over
+    json_extract(), using the same type ranking as Firestore. The database
+    runs in WAL mode with one connection per thread, so readers never
+    block each other or the single writer; a thread's connection is closed
+    when the thread exits. ":memory:" is private to a connection, so that
+    database stays on one shared connection used under the lock.
+    """
+
+    def __init__(self, path=None, indexed_fields=INDEXED_FIELDS):
+        self.path = path or os.getenv("SQLITE_PATH", DEFAULT_PATH)
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._local = threading.local()
+        self._shared = None
+        self._connections = []
+        # Reentrant: _commit reads through _get while holding the shared connection
+        self._lock = threading.RLock()
+
+        with self._use() as conn:
+            conn.execute(SCHEMA)
+            for field_path in indexed_fields:
+                self.ensure_index(field_path)
+
+            # Without statistics the planner prefers the primary key (it already
+            # yields id order) over the field indexes, so gather them once
+            analyzed = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+            if not analyzed and conn.execute("SELECT 1 FROM documents LIMIT 1").fetchone():
+                self.analyze()
+
+    def _connect(self):
+        # The check is off so a connection can be closed from another thread:
+        # by close(), or by whichever thread drops an exited thread's locals
+        conn = sqlite3.connect(self.path, check_same_thread=False,
+                               isolation_level=None, timeout=BUSY_TIMEOUT)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        return conn
+
+    def _connection(self):
+        if self.path == ":memory:":
+            with self._lock:
+                if self._shared is None:
+                    self._shared = self._connect()
+                    self._connections.append(self._shared)
+                return self._shared
+
+        holder = getattr(self._local, "holder", None)
+        # A connection inherited across fork() must not be used by the child
+        if holder is None or holder.pid != os.getpid():
+            conn = self._connect()
+            with self._lock:
+                self._connections.append(conn)
+            holder = self._local.holder = _ThreadConnection(conn)
+            weakref.finalize(holder, self._release, conn, holder.pid)
+        return holder.conn
+
+    def _release(self, conn, pid):
+        # Runs once the owning thread has exited (or close() has dropped the locals)
+        with self._lock:
+            if conn not in self._connections:
+                return
+            self._connections.remove(conn)
+        # A forked child leaves the parent's connections to the parent
+        if os.getpid() == pid:
+            conn.close()
+
+    @contextmanager
+    def _use(self):
+        """This thread's connection; the shared ":memory:" one is held under the lock for the whole use"""
+        if self.path == ":memory:":
+            with self._lock:
+                yield self._connection()
+        else:
+            yield self._connection()
+
+    def ensure_index(self, field_path):
+        """Index a field so equality, range and order_by on it avoid a table scan"""
+        field = Field(field_path)
+        name = "idx_" + "".join(c if c.isalnum() else "_" for c in field_path)
+        # Same expressions query_sql emits, so the planner can match them
+        with self._use() as conn:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON documents (collection, ({field.rank}), {field.value}, id)")
+
+    def analyze(self):
+        """Refresh planner statistics, e.g. after a bulk import"""
+        with self._use() as conn:
+            conn.execute("ANALYZE")
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._shared = None
+        if connections:
+            connections[0].execute("PRAGMA optimize")
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def _get(self, collection_path, doc_id):
+        with self._use() as conn:
+            row = conn.execute("SELECT data FROM documents WHERE collection = ? AND id = ?",
+                               (collection_path, doc_id)).fetchone()
+        return decode(json.loads(row[0]), self) if row else None
+
+    def _commit(self, writes):
+        with self._use() as conn:
+            # IMMEDIATE takes the write lock up front, so the read-modify-write below is atomic
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                staged = {}
+                for write in writes:
+                    key = (write.reference._collection_path, write.reference.id)
+                    existing = staged[key] if key in staged else self._get(*key)
+                    staged[key] = apply_write(existing, write)
+
+                for (collection_path, doc_id), data in staged.items():
+                    if data is None:
+                        conn.execute("DELETE FROM documents WHERE collection = ? AND id = ?",
+                                     (collection_path, doc_id))
+                    else:
+                        conn.execute("INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)",
+                                     (collection_path, doc_id, dumps(data)))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+        now = utc_now()
+        return [WriteResult(now) for _ in writes]
+
+    def _run_query(self, query):
+        sql, params = query_sql(query)
+        with self._use() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [(doc_id, decode(json.loads(data), self)) for doc_id, data in rows]
+
+    def _count(self, query):
+        sql, params = query_sql(query, select="1")
+        with self._use() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+
+    def explain(self, query):
+        """SQLite's plan for a query, to check which index it uses"""
+        sql, params = query_sql(query)
+        with self._use() as conn:
+            return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
@@ -1,10 +1,20 @@
 import warnings
 import re
 from datetime import date, datetime
-import pandas as pd
 from io import BytesIO
-from firebase_connection import firebase_connection
+import storage
 from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+from utils.id_utils import new_id
+from utils.lazy import LazyObject
+from utils.write_behind import write_buffer, deep_merge
+from utils import mess_attendance
+from utils.mess_menu import menu_cache
+from utils.tenant_cache import tenant_cache, IN_LIMIT
+from utils import room_occupancy
+from utils.log import get_logger
+
+log = get_logger("db.tenant")
 
 warnings.filterwarnings("ignore")
 
@@ -19,15 +29,15 @@ class Database:
             self.db = Database._db_instance
     
     def connect(self):
-        """Connect to Firebase Firestore using singleton connection"""
+        """Connect to the configured storage backend using the shared client"""
         try:
-            self.db = firebase_connection.get_db()
+            self.db = storage.get_db()
             if self.db:
-                print("✅ Tenant Database connected to Firebase Firestore")
+                log.info("✅ Tenant Database connected to %s", storage.backend_name(), extra={"sample": False})
             else:
-                print("❌ Failed to connect to Firebase Firestore")
+                log.error("❌ Failed to connect to %s", storage.backend_name())
         except Exception as e:
-            print(f"❌ Error connecting to Firebase: {e}")
+            log.error("❌ Error connecting to Firebase: %s", e)
             self.db = None
     
     # Attendance Methods
@@ -43,12 +53,13 @@ class Database:
                 "date": date_str,
                 "status": status,
                 "time": current_time,
-                "timestamp": timestamp
+                "timestamp": timestamp,
+                "updated_at": firestore.SERVER_TIMESTAMP
             })
             
-            print(f"Attendance marked for student {student_id}")
+            log.info("Attendance marked for student %s", student_id, extra={"student_id": student_id})
         except Exception as e:
-            print(f"Error marking attendance: {e}")
+            log.error("Error marking attendance: %s", e)
     
     def get_attendance_by_date(self, date_str):
         try:
@@ -63,7 +74,7 @@ class Database:
             
             return result
         except Exception as e:
-            print(f"Error getting attendance: {e}")
+            log.error("Error getting attendance: %s", e)
             return []
     
     def get_all_attendance(self, start_date=None, end_date=None):
@@ -95,11 +106,13 @@ class Database:
             
             return result
         except Exception as e:
-            print(f"Error getting all attendance: {e}")
+            log.error("Error getting all attendance: %s", e)
             return []
     
     def export_attendance_to_excel(self):
         attendance = self.get_all_attendance()
+        import pandas as pd
+
         df = pd.DataFrame(attendance)
         
         output = BytesIO()
@@ -118,7 +131,7 @@ class Database:
                 return docs[0].id
             return None
         except Exception as e:
-            print(f"Error getting document ID: {e}")
+            log.error("Error getting document ID: %s", e)
             return None
         
     def count_users(self):
@@ -129,7 +142,7 @@ class Database:
             count = result[0][0].value
             return int(count)
         except Exception as e:
-            print(f"Error counting users: {e}")
+            log.error("Error counting users: %s", e)
             return 0
     
     def validate_email(self, input_str):
@@ -150,7 +163,7 @@ class Database:
             docs = query.get()
             return len(docs) > 0
         except Exception as e:
-            print(f"Error checking user exists: {e}")
+            log.error("Error checking user exists: %s", e)
             return False
     
     def get_field(self, collection, key, value, required):
@@ -158,7 +171,7 @@ class Database:
             field = self.db.collection(collection).where(key, "==", value).get()[0]
             return field.to_dict().get(required)
         except Exception as e:
-            print(f"Error getting field: {e}")
+            log.error("Error getting field: %s", e)
             return None
     
     def change_user_password(self, password, username=None, email=None):
@@ -177,9 +190,9 @@ class Database:
                         "password": password
                     })
 
-            print("Password Changed Successfully")
+            log.info("Password Changed Successfully")
         except Exception as e:
-            print(f"Error changing password: {e}")
+            log.error("Error changing password: %s", e)
 
     def add_user(self, name, email, password):
         try:
@@ -190,9 +203,9 @@ class Database:
                 "password": f"{password.strip()}"
             })
             
-            print(f"User_{count + 1} Added")
+            log.info("User_%s Added", count + 1)
         except Exception as e:
-            print(f"Error adding user: {e}")
+            log.error("Error adding user: %s", e)
 
     def login_user(self, name, password):
         try:
@@ -201,14 +214,14 @@ class Database:
             docs = query.get()
             
             if docs:
-                print(f"Login successful for user {name}")
+                log.info("Login successful for user %s", name)
                 return True
             else:
-                print(f"Invalid credentials for user {name}")
+                log.warning("Invalid credentials for user %s", name)
                 return False
                 
         except Exception as e:
-            print(f"Error in login_user: {e}")
+            log.error("Error in login_user: %s", e)
             return False
     
     def count_tenants(self):
@@ -219,7 +232,7 @@ class Database:
             count = result[0][0].value
             return int(count)
         except Exception as e:
-            print(f"Error counting tenants: {e}")
+            log.error("Error counting tenants: %s", e)
             return 0
     
     def count_complaints(self):
@@ -230,30 +243,23 @@ class Database:
             count = result[0][0].value
             return int(count)
         except Exception as e:
-            print(f"Error counting complaints: {e}")
+            log.error("Error counting complaints: %s", e)
             return 0
     
     def count_mess(self):
         try:
             today_date = str(date.today())
             
-            doc_ref = self.db.collection("messAttendance").document(today_date)
-            doc = doc_ref.get()
-
-            if doc.exists:
-                attendance_data = doc.to_dict()
-                count = len(attendance_data)  
-                return count
-            else:
-                return 0
+            return mess_attendance.read_counts(self.db, today_date)["students"]
         except Exception as e:
-            print(f"Error counting mess: {e}")
+            log.error("Error counting mess: %s", e)
             return 0
     
     def update_tenant(self, id, name, t_type, email, phone, date, ac, sleep, smoking, room, status):
         try:
-            doc_id = self.get_doc_id("tenants", "id", int(id))
-            self.db.collection('tenants').document(doc_id).set({
+            stored = self.db.collection('tenants').where("id", "==", int(id)).get()[0]
+            # The tenant's previous room is read here so the occupancy index can move it
+            room_occupancy.write_tenant(self.db, stored.reference, {
                 "id": int(id),
                 "name": f"{name.strip()}",
                 "type": f"{t_type.strip()}",
@@ -265,16 +271,20 @@ class Database:
                 "sleep_time": f"{sleep.strip()}",
                 "smoking": f"{smoking.strip()}",
                 "status": f"{status}"
-            }, merge=True)
+            }, previous=stored.to_dict(), merge=True)
+            tenant_cache.invalidate()
             
-            print("Tenant details updated successfully")
+            log.info("Tenant details updated successfully")
         except Exception as e:
-            print(f"Error updating tenant: {e}")
+            log.error("Error updating tenant: %s", e)
     
     def add_tenant(self, id, name, t_type, email, phone, date, ac, sleep, smoking, room, status):
         try:
             count = self.count_tenants()
-            self.db.collection('tenants').document(f"ten_{count + 1}").set({
+            reference = self.db.collection('tenants').document(f"ten_{count + 1}")
+            # After a deletion the count can name an existing document, whose tenant then leaves the index
+            existing = reference.get()
+            room_occupancy.write_tenant(self.db, reference, {
                 "id": int(id),
                 "name": f"{name.strip()}",
                 "type": f"{t_type.strip()}",
@@ -286,11 +296,12 @@ class Database:
                 "sleep_time": f"{sleep.strip()}",
                 "smoking": f"{smoking.strip()}",
                 "status": f"{status}"
-            })
+            }, previous=existing.to_dict() if existing.exists else None)
+            tenant_cache.invalidate()
             
-            print(f"Tenant_{count + 1} Added")
+            log.info("Tenant_%s Added", count + 1)
         except Exception as e:
-            print(f"Error adding tenant: {e}")
+            log.error("Error adding tenant: %s", e)
     
     def get_tenant_s_details(self, ten_id, key=None):
         try:
@@ -306,7 +317,7 @@ class Database:
                     return doc
             return None
         except Exception as e:
-            print(f"Error getting tenant details: {e}")
+            log.error("Error getting tenant details: %s", e)
             return None
     
     # Tenant-specific methods
@@ -321,7 +332,7 @@ class Database:
             docs = query.get()
             return len(docs) > 0
         except Exception as e:
-            print(f"Error validating tenant: {e}")
+            log.error("Error validating tenant: %s", e)
             return False
     
     def signup_tenant(self, tenant_id, password):
@@ -341,10 +352,10 @@ class Database:
                 "password": password
             })
             
-            print(f"Tenant {tenant_id} signup successful")
+            log.info("Tenant %s signup successful", tenant_id, extra={"tenant_id": tenant_id})
             return True
         except Exception as e:
-            print(f"Error signing up tenant: {e}")
+            log.error("Error signing up tenant: %s", e)
             return False
     
     def login_tenant(self, tenant_id, password):
@@ -359,7 +370,7 @@ class Database:
             
             return len(docs) > 0
         except Exception as e:
-            print(f"Error logging in tenant: {e}")
+            log.error("Error logging in tenant: %s", e)
             return False
     
     def get_tenant_details(self, tenant_id, field=None):
@@ -380,35 +391,35 @@ class Database:
                     return docs[0].to_dict()
             return None
         except Exception as e:
-            print(f"Error getting room details: {e}")
+            log.error("Error getting room details: %s", e)
             return None
     
     def get_room_tenant_details(self, tenant_id, room_no):
-        """Get all tenants in the same room"""
+        """Get all tenants in the same room, from the occupancy index"""
         try:
-            tenants_ref = self.db.collection('tenants')
-            query = tenants_ref.where("room", "==", room_no).where("status", "==", "active")
-            docs = query.stream()
+            if not room_no:
+                return []
+            
+            occupants = room_occupancy.occupants(self.db, room_no)
             
             result = []
-            for doc in docs:
-                data = doc.to_dict()
-                result.append(data)
+            for start in range(0, len(occupants), IN_LIMIT):
+                query = self.db.collection('tenants').where("id", "in", occupants[start:start + IN_LIMIT])
+                for doc in query.stream():
+                    data = doc.to_dict()
+                    result.append(data)
             
             return result
         except Exception as e:
-            print(f"Error getting room tenant details: {e}")
+            log.error("Error getting room tenant details: %s", e)
             return []
     
     def get_menu_data(self):
-        """Get mess menu data"""
+        """Get mess menu data, in week order (cached; see utils.mess_menu)"""
         try:
-            menu_doc = self.db.collection("mess").document("strange_menu").get()
-            if menu_doc.exists:
-                return menu_doc.to_dict()
-            return {}
+            return menu_cache.get(self.db)
         except Exception as e:
-            print(f"Error getting menu data: {e}")
+            log.error("Error getting menu data: %s", e)
             return {}
     
     def get_complaint_details(self, tenant_id):
@@ -425,7 +436,7 @@ class Database:
             
             return result
         except Exception as e:
-            print(f"Error getting complaint details: {e}")
+            log.error("Error getting complaint details: %s", e)
             return []
     
     def submit_complaint(self, tenant_id, description, complaint_type, priority):
@@ -453,15 +464,34 @@ class Database:
                 "complaint_type": complaint_type,
                 "priority": priority,
                 "status": "pending",
-                "created_at": datetime.now().isoformat()
+                "created_at": datetime.now().isoformat(),
+                "updated_at": firestore.SERVER_TIMESTAMP
             })
             
-            print(f"Complaint {complaint_id} submitted successfully")
+            log.info("Complaint %s submitted successfully", complaint_id, extra={"complaint_id": complaint_id})
             return True
         except Exception as e:
-            print(f"Error submitting complaint: {e}")
+            log.error("Error submitting complaint: %s", e)
             return False
     
+    def _mess_record(self, day, tenant_id):
+        """The tenant's record for a day including writes not flushed yet, or None"""
+        record_id = mess_attendance.record_id(day, tenant_id)
+        doc = self.db.collection(mess_attendance.RECORDS).document(record_id).get()
+        
+        stored = doc.to_dict() if doc.exists else None
+        pending = write_buffer.pending(mess_attendance.RECORDS, record_id)
+        return deep_merge(stored or {}, pending) if pending else stored
+    
+    def get_tenant_mess_attendance(self, tenant_id):
+        """Meals the tenant has marked for today, including ones not flushed to the datastore yet"""
+        try:
+            marked = self._mess_record(str(date.today()), tenant_id) or {}
+            return {meal: True for meal in mess_attendance.MEALS if marked.get(meal)}
+        except Exception as e:
+            log.error("Error getting mess attendance: %s", e)
+            return {}
+    
     def save_tenant_attendance(self, tenant_id, breakfast, lunch, dinner):
         """Save tenant mess attendance"""
         try:
@@ -475,16 +505,21 @@ class Database:
             if dinner:
                 attendance_data["dinner"] = True
             
-            # Update the mess attendance document
-            doc_ref = self.db.collection("messAttendance").document(today)
-            doc_ref.set({
-                str(tenant_id): attendance_data
-            }, merge=True)
+            # Each student has their own record per day; the day's counters only get
+            # the meals this submission adds. Everyone submits in the same few minutes,
+            # so both are buffered and written once a second.
+            previous = self._mess_record(today, tenant_id)
+            write_buffer.put(mess_attendance.RECORDS, mess_attendance.record_id(today, tenant_id),
+                             mess_attendance.record(today, tenant_id, attendance_data))
+            
+            deltas = mess_attendance.counter_deltas(previous, attendance_data)
+            if deltas:
+                write_buffer.increment(mess_attendance.shards_path(today), mess_attendance.process_shard(), deltas)
             
-            print(f"Mess attendance saved for tenant {tenant_id}")
+            log.info("Mess attendance saved for tenant %s", tenant_id, extra={"tenant_id": tenant_id})
             return True
         except Exception as e:
-            print(f"Error saving mess attendance: {e}")
+            log.error("Error saving mess attendance: %s", e)
             return False
 
     # Message Methods for Tenants
@@ -508,7 +543,7 @@ class Database:
             
             return messages
         except Exception as e:
-            print(f"Error getting messages: {e}")
+            log.error("Error getting messages: %s", e)
             return []
     
     def count_unread_messages(self, student_id):
@@ -519,7 +554,7 @@ class Database:
             docs = query.get()
             return len(docs)
         except Exception as e:
-            print(f"Error counting unread messages: {e}")
+            log.error("Error counting unread messages: %s", e)
             return 0
     
     def send_message_to_admin(self, student_id, subject, message):
@@ -538,9 +573,9 @@ class Database:
                 'read': False
             })
             
-            print(f"Message sent from student {student_id} to admin")
+            log.info("Message sent from student %s to admin", student_id, extra={"student_id": student_id})
         except Exception as e:
-            print(f"Error sending message to admin: {e}")
+            log.error("Error sending message to admin: %s", e)
     
     def get_message_by_id(self, message_id):
         """Get a specific message by ID"""
@@ -552,25 +587,25 @@ class Database:
                 return data
             return None
         except Exception as e:
-            print(f"Error getting message: {e}")
+            log.error("Error getting message: %s", e)
             return None
     
     def mark_message_read(self, message_id):
         """Mark a message as read"""
         try:
             self.db.collection('messages').document(message_id).update({'read': True})
-            print(f"Message {message_id} marked as read")
+            log.info("Message %s marked as read", message_id, extra={"message_id": message_id})
         except Exception as e:
-            print(f"Error marking message as read: {e}")
+            log.error("Error marking message as read: %s", e)
     
     def delete_message(self, message_id):
         """Delete a message"""
         try:
             self.db.collection('messages').document(message_id).delete()
-            print(f"Message {message_id} deleted")
+            log.info("Message %s deleted", message_id, extra={"message_id": message_id})
             return True
         except Exception as e:
-            print(f"Error deleting message: {e}")
+            log.error("Error deleting message: %s", e)
             return False
     
     def get_conversation_with_admin(self, student_id):
@@ -602,7 +637,7 @@ class Database:
             
             return messages
         except Exception as e:
-            print(f"Error getting conversation with admin: {e}")
+            log.error("Error getting conversation with admin: %s", e)
             return []
     
     def delete_conversation_with_admin(self, student_id):
@@ -615,14 +650,14 @@ class Database:
             
             return True
         except Exception as e:
-            print(f"Error deleting conversation with admin: {e}")
+            log.error("Error deleting conversation with admin: %s", e)
             return False
 
     # Leave Request Methods for Students
     def submit_leave_request(self, student_id, student_name, room, leave_from, leave_to, purpose, destination, emergency_contact):
         """Submit a leave request for admin approval"""
         try:
-            request_id = f"LR{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            request_id = new_id("LR")
             
             leave_request = {
                 'request_id': request_id,
@@ -638,17 +673,18 @@ class Database:
                 'submitted_at': datetime.now().isoformat(),
                 'approved_at': None,
                 'approved_by': None,
-                'qr_code': None,
-                'pass_id': None
+                'qr_hash': None,
+                'pass_id': None,
+                'updated_at': firestore.SERVER_TIMESTAMP
             }
             
             doc_ref = self.db.collection("leave_requests").document(request_id)
             doc_ref.set(leave_request)
             
-            print(f"Leave request {request_id} submitted successfully")
+            log.info("Leave request %s submitted successfully", request_id)
             return request_id
         except Exception as e:
-            print(f"Error submitting leave request: {e}")
+            log.error("Error submitting leave request: %s", e)
             return None
     
     def get_my_leave_requests(self, student_id):
@@ -667,7 +703,7 @@ class Database:
             requests.sort(key=lambda x: x.get('submitted_at', ''), reverse=True)
             return requests
         except Exception as e:
-            print(f"Error getting student leave requests: {e}")
+            log.error("Error getting student leave requests: %s", e)
             return []
     
     def get_leave_request_by_id(self, request_id):
@@ -680,14 +716,14 @@ class Database:
                 return doc.to_dict()
             return None
         except Exception as e:
-            print(f"Error getting leave request: {e}")
+            log.error("Error getting leave request: %s", e)
             return None
     
     # Visitor Request Methods for Students
     def submit_visitor_request(self, student_id, student_name, room, visitor_name, visitor_phone, visit_date, entry_time, purpose, valid_until):
         """Submit a visitor request for admin approval"""
         try:
-            request_id = f"VR{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            request_id = new_id("VR")
             
             visitor_request = {
                 'request_id': request_id,
@@ -704,17 +740,18 @@ class Database:
                 'submitted_at': datetime.now().isoformat(),
                 'approved_at': None,
                 'approved_by': None,
-                'qr_code': None,
-                'visitor_id': None
+                'qr_hash': None,
+                'visitor_id': None,
+                'updated_at': firestore.SERVER_TIMESTAMP
             }
             
             doc_ref = self.db.collection("visitor_requests").document(request_id)
             doc_ref.set(visitor_request)
             
-            print(f"Visitor request {request_id} submitted successfully")
+            log.info("Visitor request %s submitted successfully", request_id)
             return request_id
         except Exception as e:
-            print(f"Error submitting visitor request: {e}")
+            log.error("Error submitting visitor request: %s", e)
             return None
     
     def get_my_visitor_requests(self, student_id):
@@ -733,7 +770,7 @@ class Database:
             requests.sort(key=lambda x: x.get('submitted_at', ''), reverse=True)
             return requests
         except Exception as e:
-            print(f"Error getting student visitor requests: {e}")
+            log.error("Error getting student visitor requests: %s", e)
             return []
     
     def get_visitor_request_by_id(self, request_id):
@@ -746,9 +783,31 @@ class Database:
                 return doc.to_dict()
             return None
         except Exception as e:
-            print(f"Error getting visitor request: {e}")
+            log.error("Error getting visitor request: %s", e)
             return None
 
+    def get_revoked_passes(self, since=None, after_id=None):
+        """Revoked passes written after an (updated_at, pass id) cursor, oldest first; all of them without one"""
+        try:
+            revoked_ref = self.db.collection("revoked_passes")
+            
+            if since is None:
+                # Everything, including passes revoked before updated_at was stamped
+                query = revoked_ref
+            else:
+                # The same cursor as the change feed: updated_at is the server's commit
+                # time, so a revocation cannot land behind a watermark already passed
+                query = revoked_ref.order_by('updated_at').order_by(FieldPath.document_id())
+                if after_id:
+                    query = query.start_after([since, revoked_ref.document(after_id)])
+                else:
+                    query = query.where('updated_at', '>', since)
+            
+            return [dict(doc.to_dict(), id=doc.id) for doc in query.stream()]
+        except Exception as e:
+            log.error("Error getting revoked passes: %s", e)
+            return []
+
     def get_tenant_by_email(self, email):
         """Get tenant details by email"""
         try:
@@ -760,7 +819,7 @@ class Database:
                 return docs[0].to_dict()
             return None
         except Exception as e:
-            print(f"Error getting tenant by email: {e}")
+            log.error("Error getting tenant by email: %s", e)
             return None
     
     def tenant_has_auth(self, tenant_id):
@@ -771,7 +830,7 @@ class Database:
             docs = query.get()
             return len(docs) > 0
         except Exception as e:
-            print(f"Error checking tenant auth: {e}")
+            log.error("Error checking tenant auth: %s", e)
             return False
     
     def change_tenant_password(self, tenant_id, new_password):
@@ -782,13 +841,16 @@ class Database:
                 self.db.collection("tenant_auth").document(doc_id).update({
                     "password": new_password
                 })
-                print(f"Password changed for tenant {tenant_id}")
+                log.info("Password changed for tenant %s", tenant_id, extra={"tenant_id": tenant_id})
                 return True
             return False
         except Exception as e:
-            print(f"Error changing tenant password: {e}")
+            log.error("Error changing tenant password: %s", e)
             return False
 
+# Shared by every route module; connects to the datastore on first use
+db = LazyObject(Database)
+
 if __name__ == "__main__":
     app = Database()
-    print("Tenant Firebase Database initialized successfully")
\ No newline at end of file
+    log.info("Tenant Firebase Database initialized successfully", extra={"sample": False})
\ No newline at end of file
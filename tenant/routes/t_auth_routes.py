@@ -1,10 +1,12 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, session
-from tenant.database.firebase import Database
+from tenant.database.firebase import db
 from datetime import datetime, timedelta
 from utils.email_service import EmailService
 import random 
+from utils.log import get_logger
+
+log = get_logger("routes.t_auth")
 
-db = Database()
 t_auth_bp = Blueprint('t_auth',
                       __name__,
                     template_folder="../templates",
@@ -79,7 +81,7 @@ class TAuthRoutes:
                 return render_template('tenant-forget-password.html')
                 
         except Exception as e:
-            print(f"Error sending email: {e}")
+            log.error("Error sending email: %s", e)
             import traceback
             traceback.print_exc()
             flash("Error processing request. Please try again.", "error")
@@ -147,7 +149,7 @@ class TAuthRoutes:
                 flash("Error updating password. Please try again.", "error")
                 return render_template("tenant-forget.html")
         except Exception as e:
-            print(f"Error resetting password: {e}")
+            log.error("Error resetting password: %s", e)
             flash("Error updating password. Please try again.", "error")
             return render_template("tenant-forget.html")
     
@@ -207,7 +209,7 @@ class TAuthRoutes:
                 flash("Incorrect password. Please try again.", "error")
                 return redirect(url_for('t_auth.signin_page'))
         except Exception as e:
-            print(f"Login error: {e}")
+            log.error("Login error: %s", e)
             flash("An error occurred during login. Please try again.", "error")
             return redirect(url_for('t_auth.signin_page'))
     
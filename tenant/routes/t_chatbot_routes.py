@@ -1,8 +1,10 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, session, jsonify
-from tenant.database.firebase import Database
-from utils.chatbot_utils import chatbot
+from tenant.database.firebase import db
+from utils.lazy import lazy_import
+
+# The knowledge base is built the first time a student opens the chatbot
+chatbot = lazy_import('utils.chatbot_utils', 'chatbot')
 
-db = Database()
 t_chatbot_bp = Blueprint('t_chatbot',
                          __name__,
                          template_folder="../templates")
@@ -1,8 +1,11 @@
 from flask import request, flash, redirect, url_for, Blueprint, session
-from tenant.database.firebase import Database
-from utils.ml_utils import extract_features, predict_priority
+from tenant.database.firebase import db
+from utils.lazy import lazy_import
+
+# scikit-learn and the priority model load with the first complaint
+extract_features = lazy_import('utils.ml_utils', 'extract_features')
+predict_priority = lazy_import('utils.ml_utils', 'predict_priority')
 
-db = Database()
 t_comp_bp = Blueprint('t_complaint',
                       __name__,
                     template_folder="../templates"
@@ -1,7 +1,7 @@
-from flask import request, render_template, flash, redirect, url_for, Blueprint, session
-from tenant.database.firebase import Database
+from flask import request, render_template, flash, redirect, url_for, Blueprint, session, make_response
+from tenant.database.firebase import db
+from datetime import date
 
-db = Database()
 t_dashboard_bp = Blueprint('t_dashboard',
                       __name__,
                     template_folder="../templates"
@@ -54,7 +54,16 @@ class TDashboardRoutes:
     @t_dashboard_bp.route('/mess')
     def mess_page():
       mess_data = db.get_menu_data()
-      return render_template('tenant-mess.html', data=mess_data)
+      marked = db.get_tenant_mess_attendance(session.get("tenant_id"))
+      submitted = session.get("mess_marked")
+      if submitted and submitted.get("date") == str(date.today()):
+        marked.update({meal: True for meal in ("breakfast", "lunch", "dinner") if submitted.get(meal)})
+      response = make_response(render_template('tenant-mess.html', data=mess_data, marked=marked))
+      # The menu rarely changes, so a revisit usually revalidates to a 304 without a new body
+      response.cache_control.private = True
+      response.cache_control.no_cache = True
+      response.add_etag()
+      return response.make_conditional(request)
     
     @staticmethod
     @t_dashboard_bp.route('/complaints')
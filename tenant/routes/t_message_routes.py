@@ -1,8 +1,10 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, session, jsonify
-from tenant.database.firebase import Database
+from tenant.database.firebase import db
 from datetime import datetime, date, timedelta
+from utils.log import get_logger
+
+log = get_logger("routes.t_message")
 
-db = Database()
 t_message_bp = Blueprint('t_message',
                         __name__,
                         template_folder="../templates")
@@ -227,7 +229,7 @@ class TMessageRoutes:
             
             return {'messages': formatted_messages}
         except Exception as e:
-            print(f"Error getting conversation: {e}")
+            log.error("Error getting conversation: %s", e)
             return {'messages': []}
     
     @staticmethod
@@ -250,5 +252,5 @@ class TMessageRoutes:
             
             return {'success': True}
         except Exception as e:
-            print(f"Error sending message: {e}")
+            log.error("Error sending message: %s", e)
             return {'success': False, 'error': str(e)}
@@ -1,7 +1,7 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, session
-from tenant.database.firebase import Database
+from tenant.database.firebase import db
+from datetime import date
 
-db = Database()
 t_mess_bp = Blueprint('t_mess',
                       __name__,
                     template_folder="../templates")
@@ -19,6 +19,9 @@ class TMessRoutes:
         dinner = "dinner" in attendance
         
         db.save_tenant_attendance(ten_id, breakfast, lunch, dinner)
+        # The write is flushed within a second; until then the mess page, which may be
+        # served by another worker, shows this selection from the session
+        session["mess_marked"] = {"date": str(date.today()), "breakfast": breakfast, "lunch": lunch, "dinner": dinner}
         flash("Attendance marked for today", "success")
         
         return redirect(url_for('t_dashboard.mess_page'))
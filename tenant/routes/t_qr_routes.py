@@ -1,10 +1,14 @@
 from flask import request, render_template, flash, redirect, url_for, Blueprint, session, jsonify
-from tenant.database.firebase import Database
-from utils.qr_utils import qr_generator
+from tenant.database.firebase import db
+from utils.qr_tokens import is_token, pass_signer
+from utils.qr_render import qr_renderer, image_response, MIME_TYPES
+from utils.revocation import revocation_list, verify_pass
+from utils.lazy import lazy_import
 from datetime import datetime, timedelta
 import json
 
-db = Database()
+qr_generator = lazy_import('utils.qr_utils', 'qr_generator')
+
 t_qr_bp = Blueprint('t_qr',
                     __name__,
                     template_folder="../templates")
@@ -41,18 +45,35 @@ class TQRRoutes:
             # Add tenant_id to student_data
             student_data['tenant_id'] = student_id
             
-            qr_code = qr_generator.generate_student_id_qr(student_data)
-            if qr_code:
-                return jsonify({
-                    'success': True,
-                    'qr_code': qr_code,
-                    'student_data': student_data
-                })
-            else:
-                return jsonify({'error': 'Failed to generate QR code'}), 500
+            qr_token = pass_signer.sign_student_id(student_id)
+            qr_code, _ = qr_renderer.data_url(qr_token)
+            
+            response = jsonify({
+                'success': True,
+                'qr_code': qr_code,
+                'qr_token': qr_token,
+                'student_data': student_data
+            })
+            response.add_etag()
+            return response.make_conditional(request)
         except Exception as e:
             return jsonify({'error': str(e)}), 500
     
+    @staticmethod
+    @t_qr_bp.route('/my_qr_image')
+    def my_qr_image():
+        """Current student's ID QR as a PNG or SVG image (?format=png|svg&size=N)"""
+        student_id = session.get('tenant_id')
+        if not student_id:
+            return jsonify({'error': 'Unauthorized'}), 401
+        
+        fmt = request.args.get('format', 'png')
+        size = min(max(request.args.get('size', 8, type=int), 1), 40)
+        if fmt not in MIME_TYPES:
+            return jsonify({'error': 'Unsupported format'}), 400
+        
+        return image_response(pass_signer.sign_student_id(student_id), fmt, size)
+    
     @staticmethod
     @t_qr_bp.route('/leave_request')
     def leave_request():
@@ -203,6 +224,11 @@ class TQRRoutes:
             if not qr_data:
                 return jsonify({'valid': False, 'error': 'No QR data provided'})
             
+            # Signed pass tokens are verified in-process
+            if is_token(qr_data):
+                revocation_list.refresh(db)
+                return jsonify(verify_pass(qr_data))
+            
             # Try to parse as JSON first
             try:
                 parsed_data = json.loads(qr_data)
@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads running blocking datastore calls for async views. They spend their time
+# waiting on the network, so there can be many more of them than CPUs.
+THREADS = int(os.getenv("ASYNC_DB_THREADS", "16"))
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix="async-db")
+    return _executor
+
+
+async def run_blocking(function, *args, **kwargs):
+    """Await a blocking call on the shared pool.
+
+    The caller's context is copied to the pool thread, so the call is
+    still counted in the request's datastore stats and logged with its
+    request id.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_pool(), functools.partial(context.run, function, *args, **kwargs))
+
+
+class AsyncDatabase:
+    """Awaitable view of a Database: `await adb.method(...)` runs db.method on the pool.
+
+    Works unchanged for every storage backend (Firestore, memory, SQLite),
+    since the Database methods themselves stay synchronous. Independent
+    reads in an async view can then be awaited together:
+
+        tenants, attendance = await asyncio.gather(adb.get_tenants_details(),
+                                                   adb.get_attendance_by_date(today))
+    """
+
+    def __init__(self, database):
+        self._database = database
+
+    def __getattr__(self, name):
+        attribute = getattr(self._database, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        async def call(*args, **kwargs):
+            return await run_blocking(attribute, *args, **kwargs)
+        return call
+
+
+def _drop_after_fork():
+    # Pool threads do not survive fork; a worker starts its own on first use
+    global _executor, _lock
+    _executor = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_drop_after_fork)
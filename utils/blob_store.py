@@ -0,0 +1,70 @@
+import hashlib
+import os
+import re
+import tempfile
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "blobs")
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+def digest_of(data):
+    """sha256 hex digest of a str or bytes payload"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """Content-addressed blob store on the local filesystem.
+
+    Blobs live at <root>/<d[:2]>/<d> and are written atomically, so the same
+    digest always maps to the same immutable bytes and can be served with
+    far-future cache headers. A stand-in for a bucket; only this class
+    touches the layout.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv("BLOB_STORE_DIR", DEFAULT_ROOT)
+
+    def path(self, digest):
+        if not DIGEST_RE.match(digest or ""):
+            raise ValueError("Invalid blob digest")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest):
+        try:
+            return os.path.exists(self.path(digest))
+        except ValueError:
+            return False
+
+    def put(self, digest, data):
+        """Store data under digest unless already present; returns the digest"""
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return digest
+
+    def put_content(self, data):
+        """Store data keyed by the hash of its own content"""
+        return self.put(digest_of(data), data)
+
+    def get(self, digest):
+        try:
+            with open(self.path(digest), "rb") as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+
+blob_store = BlobStore()
@@ -0,0 +1,247 @@
+import os
+import shutil
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "columnar")
+
+# Rows per Parquet row group; bounds memory while a snapshot is written
+BATCH_ROWS = 10000
+
+# Low-cardinality strings are dictionary encoded in memory and on disk
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+SCHEMAS = {
+    "attendance": pa.schema([
+        ("date", pa.date32()),
+        ("student_id", pa.int64()),
+        ("student_name", pa.string()),
+        ("room_number", CATEGORY),
+        ("status", CATEGORY),
+        ("time", pa.string()),
+        ("timestamp", pa.timestamp("us")),
+    ]),
+    "messAttendance": pa.schema([
+        ("date", pa.date32()),
+        ("student_id", pa.int64()),
+        ("breakfast", pa.bool_()),
+        ("lunch", pa.bool_()),
+        ("dinner", pa.bool_()),
+    ]),
+    "fees": pa.schema([
+        ("id", pa.string()),
+        ("student_id", pa.int64()),
+        ("student_name", pa.string()),
+        ("fee_type", CATEGORY),
+        ("amount", pa.float64()),
+        ("paid_amount", pa.float64()),
+        ("status", CATEGORY),
+        ("due_date", pa.date32()),
+        ("paid_date", pa.date32()),
+        ("payment_method", CATEGORY),
+        ("transaction_id", pa.string()),
+        ("notes", pa.string()),
+        ("created_at", pa.timestamp("us")),
+        ("updated_at", pa.timestamp("us")),
+    ]),
+    "complaints": pa.schema([
+        ("id", pa.string()),
+        ("ten_id", pa.int64()),
+        ("ten_name", pa.string()),
+        ("ten_room", CATEGORY),
+        ("complaint_type", CATEGORY),
+        ("description", pa.string()),
+        ("priority", CATEGORY),
+        ("status", CATEGORY),
+        ("created_at", pa.timestamp("us")),
+    ]),
+    "tenants": pa.schema([
+        ("id", pa.int64()),
+        ("name", pa.string()),
+        ("type", CATEGORY),
+        ("email", pa.string()),
+        ("phone", pa.string()),
+        ("room", CATEGORY),
+        ("date", pa.date32()),
+        ("ac", CATEGORY),
+        ("sleep_time", CATEGORY),
+        ("smoking", CATEGORY),
+        ("status", CATEGORY),
+    ]),
+}
+
+# Append-only, day-keyed collections are written as one partition per day;
+# the rest change in place (payments, complaint status) and are snapshotted whole
+PARTITIONED = ("attendance", "messAttendance")
+
+# Dataset name in Database.EXPORTS for the snapshotted collections
+EXPORT_NAMES = {
+    "fees": "fees",
+    "complaints": "complaints",
+    "tenants": "students",
+}
+
+
+def _to_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _to_timestamp(value):
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    # The app writes naive local-time ISO strings, so aware values are brought to local time
+    return value.replace(tzinfo=None) if value.tzinfo is None else value.astimezone().replace(tzinfo=None)
+
+
+CONVERTERS = {
+    pa.int64(): int,
+    pa.float64(): float,
+    pa.bool_(): bool,
+    pa.date32(): _to_date,
+    pa.timestamp("us"): _to_timestamp,
+    pa.string(): str,
+    CATEGORY: str,
+}
+
+
+def _coerce(value, convert):
+    if value is None or value == "":
+        return None
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def record_batch(schema, rows):
+    """Build a typed record batch from row dicts; unparseable values become nulls"""
+    arrays = []
+    for field in schema:
+        convert = CONVERTERS[field.type]
+        values = [_coerce(row.get(field.name), convert) for row in rows]
+        if field.type == CATEGORY:
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(path, schema, rows):
+    """Write rows to a Parquet file in BATCH_ROWS row groups and return the row count"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    count = 0
+
+    try:
+        with pq.ParquetWriter(tmp_path, schema, compression="zstd") as writer:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= BATCH_ROWS:
+                    writer.write_batch(record_batch(schema, batch))
+                    count += len(batch)
+                    batch = []
+            # An empty partition still gets a file, so the day is not re-read next run
+            if batch or not count:
+                writer.write_batch(record_batch(schema, batch))
+                count += len(batch)
+    except Exception:
+        # A read that fails part way leaves no partition, so the day is retried next run
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, path)
+    return count
+
+
+class ColumnarSnapshots:
+    """Parquet snapshots for analytics under <root>/<dataset>/.
+
+    attendance and messAttendance are laid out as Hive-style daily
+    partitions (day=YYYY-MM-DD/part-0.parquet) and only days without a
+    partition are read from Firestore. Other collections are written as a
+    full snapshot=YYYY-MM-DD/part-0.parquet, keeping the last few.
+    pandas.read_parquet(<root>/attendance) loads every partition at once.
+    """
+
+    def __init__(self, root=None, keep_snapshots=7):
+        self.root = root or os.getenv("COLUMNAR_DIR", DEFAULT_ROOT)
+        self.keep_snapshots = keep_snapshots
+
+    def _partitions(self, dataset, prefix):
+        try:
+            names = os.listdir(os.path.join(self.root, dataset))
+        except OSError:
+            return []
+        return sorted(name[len(prefix):] for name in names if name.startswith(prefix))
+
+    def partition_path(self, dataset, day):
+        # Keyed "day" rather than "date" so the partition column does not clash with the data column
+        return os.path.join(self.root, dataset, f"day={day}", "part-0.parquet")
+
+    def written_days(self, dataset):
+        return [day for day in self._partitions(dataset, "day=")
+                if os.path.exists(self.partition_path(dataset, day))]
+
+    def sync_partitions(self, db, dataset, until=None):
+        """Write daily partitions for every unwritten day up to until (default yesterday)"""
+        until = until or date.today() - timedelta(days=1)
+        written = set(self.written_days(dataset))
+
+        first = db.get_first_date(dataset)
+        if first is None:
+            return {}
+
+        # Existing partitions are never re-read; any missing day, including gaps, is written
+        day = date.fromisoformat(first)
+        results = {}
+        tenants = None
+        while day <= until:
+            day_str = day.isoformat()
+            if day_str not in written:
+                if dataset == "messAttendance":
+                    rows = db.iter_mess_attendance_rows(day_str, day_str)
+                else:
+                    # One read of the tenants collection for the whole backfill, not one per day
+                    if tenants is None:
+                        tenants = db.get_tenant_lookup()
+                    rows = db.iter_export_rows(dataset, day_str, day_str, tenants=tenants)
+                results[day_str] = write_parquet(self.partition_path(dataset, day_str), SCHEMAS[dataset], rows)
+            day += timedelta(days=1)
+        return results
+
+    def write_snapshot(self, db, dataset, today=None):
+        """Write a full snapshot of a mutable collection and drop old ones"""
+        day = (today or date.today()).isoformat()
+        path = os.path.join(self.root, dataset, f"snapshot={day}", "part-0.parquet")
+        count = write_parquet(path, SCHEMAS[dataset], db.iter_export_rows(EXPORT_NAMES[dataset]))
+
+        for old in self._partitions(dataset, "snapshot=")[:-self.keep_snapshots]:
+            shutil.rmtree(os.path.join(self.root, dataset, f"snapshot={old}"), ignore_errors=True)
+        return count
+
+    def run(self, db, datasets=None, job=None):
+        """Bring every dataset up to date; returns rows written per dataset and day"""
+        datasets = datasets or list(SCHEMAS)
+        if job is not None:
+            job.set_total(len(datasets))
+
+        summary = {}
+        for dataset in datasets:
+            if dataset in PARTITIONED:
+                summary[dataset] = self.sync_partitions(db, dataset)
+            else:
+                summary[dataset] = self.write_snapshot(db, dataset)
+            if job is not None:
+                job.advance()
+        return summary
+
+
+columnar_snapshots = ColumnarSnapshots()
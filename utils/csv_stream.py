@@ -0,0 +1,41 @@
+import csv
+from io import StringIO
+
+from flask import Response, stream_with_context
+
+# Rows are buffered up to roughly this many characters before a chunk is sent
+CHUNK_SIZE = 64 * 1024
+
+
+def csv_chunks(columns, rows):
+    """Yield CSV text in ~CHUNK_SIZE pieces from an iterable of dicts.
+
+    The header goes out on its own first so the client sees bytes before
+    the first datastore page has even been fetched.
+    """
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def csv_response(chunks, filename):
+    """Stream CSV chunks to the client as a file download"""
+    response = Response(stream_with_context(chunks), mimetype="text/csv")
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    # Stop proxies such as nginx from buffering the whole body before relaying it
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,70 @@
+import os
+from datetime import datetime
+
+from utils.csv_stream import csv_chunks
+
+FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _counted(job, rows):
+    for row in rows:
+        yield row
+        job.advance()
+
+
+def _cell(value):
+    # Excel has no timezone support and no nested types
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.isoformat()
+    if isinstance(value, (dict, list, tuple, set)):
+        return str(value)
+    return value
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def write_csv(job, path, columns, rows):
+    try:
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            for chunk in csv_chunks(columns, _counted(job, rows)):
+                f.write(chunk)
+    except Exception:
+        # The job is marked failed; a truncated artifact is not left behind
+        _discard(path)
+        raise
+
+
+def write_xlsx(job, path, columns, rows, sheet_name):
+    from openpyxl import Workbook
+
+    # write_only streams rows to disk instead of building the sheet in memory
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(columns)
+    try:
+        for row in _counted(job, rows):
+            sheet.append([_cell(row.get(column)) for column in columns])
+        workbook.save(path)
+    except Exception:
+        _discard(path)
+        raise
+
+
+def build_export(job, db, dataset, columns, fmt, start_date=None, end_date=None):
+    """Job body: write a dataset export from db to a CSV or XLSX artifact"""
+    job.set_total(db.count_export_rows(dataset, start_date, end_date))
+    rows = db.iter_export_rows(dataset, start_date, end_date)
+    filename = f"{dataset}_{start_date or 'all'}_{end_date or 'all'}.{fmt}"
+
+    if fmt == "xlsx":
+        write_xlsx(job, job.output_path(filename, FORMATS[fmt]), columns, rows, dataset.capitalize())
+    else:
+        write_csv(job, job.output_path(filename, FORMATS[fmt]), columns, rows)
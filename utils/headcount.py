@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from utils import mess_attendance
+from utils.metrics import record_cache
+
+# Days of history behind the moving average, and days projected after today
+HISTORY_DAYS = 7
+PROJECTION_DAYS = 7
+
+# Weekends typically have lower attendance
+WEEKEND_FACTOR = 0.8
+
+# Seconds a projection is reused before today's counters are read again; one
+# refresh then serves every API call and kitchen display in the process
+REFRESH_INTERVAL = float(os.getenv("HEADCOUNT_REFRESH_INTERVAL", "5"))
+
+# Seconds a kitchen display's event stream stays open before it reconnects
+STREAM_SECONDS = float(os.getenv("HEADCOUNT_STREAM_SECONDS", "300"))
+
+# The same on a server with one thread per worker (gunicorn sync workers), which
+# kills a worker whose request runs past its timeout (30s by default)
+SYNC_STREAM_SECONDS = float(os.getenv("HEADCOUNT_SYNC_STREAM_SECONDS", "20"))
+
+
+def history(client, end, days=HISTORY_DAYS):
+    """Counts for the `days` days up to and including `end`, most recent first"""
+    return [mess_attendance.read_counts(client, str(end - timedelta(days=i))) for i in range(days)]
+
+
+def forecast(counts, day):
+    """Moving-average forecast of every counted field for `day` from a list of daily counts"""
+    if not counts:
+        return dict.fromkeys(mess_attendance.COUNTED, 0)
+
+    factor = WEEKEND_FACTOR if day.weekday() in (5, 6) else 1
+    return {field: int(sum(c[field] for c in counts) / len(counts) * factor)
+            for field in mess_attendance.COUNTED}
+
+
+class HeadcountProjection:
+    """Per-meal headcounts for today and the next PROJECTION_DAYS days.
+
+    Today is the live sharded counters, raised to the forecast where fewer
+    students have marked so far than usually come. Later days are the
+    forecast alone. Only counter shards are read, never the per-student
+    records: the completed days behind the forecast once per date, and
+    today's shards at most once per REFRESH_INTERVAL.
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL):
+        self.interval = interval
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._history = (None, [])
+        self._result = None
+        self._computed_at = 0.0
+
+    def _past(self, client, today):
+        if self._history[0] != today:
+            # Completed days only; today's partial count would pull the average down
+            self._history = (today, history(client, today - timedelta(days=1)))
+        return self._history[1]
+
+    def get(self, client):
+        with self._lock:
+            today = date.today()
+            hit = (self._result is not None and self._result["days"][0]["date"] == str(today)
+                   and time.monotonic() - self._computed_at < self.interval)
+            record_cache("headcount", hit)
+            if hit:
+                return self._result
+
+            past = self._past(client, today)
+            marked = mess_attendance.read_counts(client, str(today))
+            expected = forecast(past, today)
+
+            days = [{
+                "date": str(today),
+                "weekday": today.strftime("%A"),
+                "marked": marked,
+                "projected": {field: max(marked[field], expected[field]) for field in mess_attendance.COUNTED},
+            }]
+            for offset in range(1, PROJECTION_DAYS + 1):
+                day = today + timedelta(days=offset)
+                days.append({
+                    "date": str(day),
+                    "weekday": day.strftime("%A"),
+                    "marked": None,
+                    "projected": forecast(past, day),
+                })
+
+            self._result = {
+                "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "history_days": len(past),
+                "days": days,
+            }
+            self._computed_at = time.monotonic()
+            return self._result
+
+
+headcounts = HeadcountProjection()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=headcounts._reset)
+
+
+def event_stream(client, projection=None, seconds=None, keepalive=15):
+    """Server-sent events carrying the projection whenever it changes.
+
+    The stream ends after `seconds` (STREAM_SECONDS); EventSource
+    reconnects on its own after the `retry` delay, so a display holds a
+    worker thread for a bounded time rather than indefinitely.
+    """
+    projection = projection or headcounts
+    deadline = time.monotonic() + (seconds if seconds is not None else STREAM_SECONDS)
+    last, quiet = None, 0.0
+
+    yield "retry: 2000\n\n"
+    while True:
+        result = projection.get(client)
+        if result["days"] != last:
+            last = result["days"]
+            quiet = 0.0
+            yield f"event: headcount\ndata: {json.dumps(result)}\n\n"
+        elif quiet >= keepalive:
+            # A comment line, so proxies do not close an idle connection
+            quiet = 0.0
+            yield ": keepalive\n\n"
+
+        if time.monotonic() >= deadline:
+            return
+        time.sleep(projection.interval)
+        quiet += projection.interval
@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils.qr_render import render_png
+
+CARD_SIZE = (640, 400)
+
+# A4 at 200 dpi, two columns by five rows of cards
+PAGE_SIZE = (1654, 2339)
+PAGE_DPI = 200
+PAGE_COLUMNS = 2
+PAGE_ROWS = 5
+CARDS_PER_PAGE = PAGE_COLUMNS * PAGE_ROWS
+
+
+def _font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 has only the fixed bitmap font
+        return ImageFont.load_default()
+
+
+def render_card(card):
+    """Render one ID card to PNG bytes. Runs in a pool worker, so it takes plain data."""
+    image = Image.new("RGB", CARD_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+
+    draw.rectangle([0, 0, CARD_SIZE[0] - 1, CARD_SIZE[1] - 1], outline="#1f3b73", width=4)
+    draw.rectangle([0, 0, CARD_SIZE[0], 64], fill="#1f3b73")
+    draw.text((24, 16), card.get("hostel", "Hostel Student ID"), fill="white", font=_font(28))
+
+    qr = Image.open(BytesIO(render_png(card["token"], box_size=4, border=1)))
+    image.paste(qr, (CARD_SIZE[0] - qr.width - 24, 88))
+
+    lines = [
+        card.get("name") or "",
+        f"ID: {card['student_id']}",
+        f"Room: {card.get('room') or 'N/A'}",
+        card.get("type") or "",
+    ]
+    y = 100
+    for i, line in enumerate(lines):
+        draw.text((24, y), line, fill="black", font=_font(30 if i == 0 else 24))
+        y += 48 if i == 0 else 38
+
+    output = BytesIO()
+    image.save(output, format="PNG", optimize=False)
+    return output.getvalue()
+
+
+def _pool():
+    # spawn, not fork: the parent is a threaded web worker holding gRPC channels
+    workers = int(os.getenv("ID_CARD_WORKERS", "0")) or os.cpu_count() or 2
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _rendered(cards):
+    with _pool() as pool:
+        yield from zip(cards, pool.map(render_card, cards, chunksize=16))
+
+
+def write_zip(job, cards, path):
+    """Render cards on the process pool into a ZIP of PNGs"""
+    # PNGs are already compressed, so entries are stored rather than deflated
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as archive:
+        for card, png in _rendered(cards):
+            archive.writestr(f"{card['student_id']}.png", png)
+            job.advance()
+
+
+def write_pdf(job, cards, path):
+    """Render cards on the process pool into a printable multi-page A4 PDF"""
+    margin_x = (PAGE_SIZE[0] - PAGE_COLUMNS * CARD_SIZE[0]) // (PAGE_COLUMNS + 1)
+    margin_y = (PAGE_SIZE[1] - PAGE_ROWS * CARD_SIZE[1]) // (PAGE_ROWS + 1)
+
+    page = None
+    slot = 0
+    first_page = True
+
+    for card, png in _rendered(cards):
+        if page is None:
+            page = Image.new("RGB", PAGE_SIZE, "white")
+            slot = 0
+
+        column, row = slot % PAGE_COLUMNS, slot // PAGE_COLUMNS
+        x = margin_x + column * (CARD_SIZE[0] + margin_x)
+        y = margin_y + row * (CARD_SIZE[1] + margin_y)
+        page.paste(Image.open(BytesIO(png)), (x, y))
+        slot += 1
+        job.advance()
+
+        if slot == CARDS_PER_PAGE:
+            # Pages are appended one at a time so memory stays at one page
+            page.save(path, format="PDF", resolution=PAGE_DPI, append=not first_page)
+            first_page = False
+            page = None
+
+    if page is not None or first_page:
+        page = page or Image.new("RGB", PAGE_SIZE, "white")
+        page.save(path, format="PDF", resolution=PAGE_DPI, append=not first_page)
+
+
+def build_id_cards(job, cards, fmt):
+    """Job body: render all cards and write the ZIP or PDF artifact"""
+    job.set_total(len(cards))
+
+    if fmt == "pdf":
+        write_pdf(job, cards, job.output_path("student_id_cards.pdf", "application/pdf"))
+    else:
+        write_zip(job, cards, job.output_path("student_id_cards.zip", "application/zip"))
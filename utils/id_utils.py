@@ -0,0 +1,113 @@
+import os
+import socket
+import threading
+import time
+import zlib
+
+# Crockford base32: no I, L, O or U, so ids stay unambiguous when read aloud
+# at the gate, and the alphabet is in ASCII order so encoded ids sort the
+# same way as the integers they encode.
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+TIMESTAMP_BITS = 48
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+
+MAX_WORKER = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+ID_LENGTH = 14  # ceil((48 + 10 + 12) / 5)
+
+# WORKER_ID is the first of a block of WORKER_ID_SPAN ids reserved for one host;
+# the processes forked there take the ids inside it. Give each host its own block.
+WORKER_ID_SPAN = int(os.getenv("WORKER_ID_SPAN", "16"))
+
+
+def _default_worker_id(slot=None):
+    """Worker id from WORKER_ID (offset by slot in a forked worker), else derived from host name and pid"""
+    env_id = os.getenv("WORKER_ID")
+    if env_id is not None:
+        offset = 0 if slot is None else slot % WORKER_ID_SPAN
+        return (int(env_id) + offset) & MAX_WORKER
+
+    seed = f"{socket.gethostname()}:{os.getpid()}".encode()
+    return zlib.crc32(seed) & MAX_WORKER
+
+
+def worker_id_for_slot(slot):
+    """Id for the slot-th worker of this host (gunicorn numbers its workers from 0)"""
+    return _default_worker_id(slot)
+
+
+def encode_base32(value, length=ID_LENGTH):
+    chars = []
+    for _ in range(length):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def decode_base32(text):
+    value = 0
+    for char in text.upper():
+        value = (value << 5) | ALPHABET.index(char)
+    return value
+
+
+class IdGenerator:
+    """Snowflake-style id generator: 48-bit ms timestamp, 10-bit worker, 12-bit sequence.
+
+    Ids are fixed-width Crockford base32, so plain string ordering matches
+    generation order. Within a worker they are strictly increasing even if
+    the wall clock steps backwards or more than 4096 ids are issued in one
+    millisecond (the timestamp component is borrowed forward).
+    """
+
+    def __init__(self, worker_id=None):
+        self.worker_id = (_default_worker_id() if worker_id is None else worker_id) & MAX_WORKER
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+
+    def reset_worker(self, worker_id=None):
+        """Re-derive the worker id, e.g. in a freshly forked process"""
+        with self._lock:
+            self.worker_id = (_default_worker_id() if worker_id is None else worker_id) & MAX_WORKER
+            self._last_ms = 0
+            self._sequence = 0
+
+    def next_int(self):
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    self._last_ms += 1
+                    self._sequence = 0
+
+            return (self._last_ms << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+    def new_id(self, prefix=""):
+        return f"{prefix}{encode_base32(self.next_int())}"
+
+    @staticmethod
+    def timestamp_of(generated_id, prefix=""):
+        """Return the creation time (epoch seconds) embedded in an id"""
+        value = decode_base32(generated_id[len(prefix):])
+        return (value >> (WORKER_BITS + SEQUENCE_BITS)) / 1000.0
+
+
+id_generator = IdGenerator()
+
+if hasattr(os, "register_at_fork"):
+    # Forked workers inherit WORKER_ID from the master, so each takes an id inside
+    # the host's block instead of sharing the parent's. gunicorn's post_fork then
+    # replaces it with one from the worker's slot, which siblings never share.
+    os.register_at_fork(after_in_child=lambda: id_generator.reset_worker(_default_worker_id(slot=os.getpid())))
+
+
+def new_id(prefix=""):
+    return id_generator.new_id(prefix)
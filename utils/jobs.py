@@ -0,0 +1,294 @@
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.blob_store import digest_of
+from utils.id_utils import new_id
+from utils.metrics import observe_job
+from utils.log import get_logger
+
+log = get_logger("jobs")
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "artifacts")
+
+# Status sidecars are rewritten at most this often while a job advances
+SAVE_INTERVAL = 0.5
+
+# Finished jobs and their artifacts are deleted after this many seconds
+RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "86400"))
+
+# The process running a job re-saves its sidecar this often. A queued or running job
+# whose sidecar is older than STALE_SECONDS lost its worker (killed or restarted);
+# one running past MAX_RUNTIME_SECONDS is given up on as well.
+HEARTBEAT_INTERVAL = 30
+STALE_SECONDS = HEARTBEAT_INTERVAL * 4
+MAX_RUNTIME_SECONDS = int(os.getenv("JOB_MAX_RUNTIME_SECONDS", "3600"))
+
+ACTIVE = ("queued", "running")
+
+
+def _write_json(path, data):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class Job:
+    """A background job with progress, persisted as <dir>/<id>/job.json.
+
+    The sidecar lets any gunicorn worker answer status and download
+    requests for a job started on another worker.
+    """
+
+    def __init__(self, job_id, kind, params, directory):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.directory = directory
+        self.status = "queued"
+        self.total = 0
+        self.done = 0
+        self.artifact = None
+        self.mimetype = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.heartbeat_at = None
+        self._last_save = 0.0
+
+    @property
+    def job_dir(self):
+        return os.path.join(self.directory, self.id)
+
+    def output_path(self, filename, mimetype):
+        """Reserve the artifact file for this job and return its path"""
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.artifact = filename
+        self.mimetype = mimetype
+        return os.path.join(self.job_dir, filename)
+
+    @property
+    def artifact_path(self):
+        return os.path.join(self.job_dir, self.artifact) if self.artifact else None
+
+    def set_total(self, total):
+        self.total = total
+        self.save()
+
+    def advance(self, count=1):
+        self.done += count
+        if time.monotonic() - self._last_save >= SAVE_INTERVAL:
+            self.save()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "progress": round(self.done / self.total * 100, 1) if self.total else (100.0 if self.status == "done" else 0.0),
+            "artifact": self.artifact,
+            "mimetype": self.mimetype,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "owner": self.owner,
+            "heartbeat_at": self.heartbeat_at,
+        }
+
+    def abandoned(self, now=None):
+        """True for a queued or running job that stopped getting heartbeats or overran its runtime"""
+        if self.status not in ACTIVE:
+            return False
+        now = time.time() if now is None else now
+        if now - (self.heartbeat_at or self.created_at) > STALE_SECONDS:
+            return True
+        return self.started_at is not None and now - self.started_at > MAX_RUNTIME_SECONDS
+
+    def save(self):
+        self.heartbeat_at = time.time()
+        _write_json(os.path.join(self.job_dir, "job.json"), self.to_dict())
+        self._last_save = time.monotonic()
+
+    @classmethod
+    def load(cls, job_id, directory):
+        try:
+            with open(os.path.join(directory, job_id, "job.json")) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        job = cls(data["job_id"], data["kind"], data["params"], directory)
+        for field in ("status", "total", "done", "artifact", "mimetype", "error",
+                      "created_at", "started_at", "finished_at", "owner", "heartbeat_at"):
+            setattr(job, field, data.get(field))
+        return job
+
+
+class JobManager:
+    """Runs jobs on a small thread pool and tracks them by id.
+
+    While this process has queued or running jobs, a heartbeat thread
+    re-saves their sidecars. A job whose heartbeats stop (its worker died)
+    or that overruns MAX_RUNTIME_SECONDS is marked failed by whichever
+    process next looks at it. It is then never handed out as a duplicate,
+    and prune() deletes it once the retention period is over.
+    """
+
+    def __init__(self, directory=None, max_workers=None):
+        self.directory = directory or os.getenv("ARTIFACT_DIR", DEFAULT_DIR)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or int(os.getenv("JOB_WORKERS", "2")),
+                                            thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._heartbeat = None
+
+    def _beat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self._lock:
+                active = [job for job in self._jobs.values() if job.status in ACTIVE]
+            for job in active:
+                try:
+                    job.save()
+                except OSError as e:
+                    log.error("Heartbeat for job %s failed: %s", job.id, e)
+
+    def _ensure_heartbeat(self):
+        # Called with self._lock held; threads do not survive fork, so each worker starts its own
+        if self._heartbeat is None or self._heartbeat[0] != os.getpid():
+            thread = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+            thread.start()
+            self._heartbeat = (os.getpid(), thread)
+
+    def _expire(self, job):
+        """Mark an abandoned job failed and drop its partial artifact; returns the job"""
+        if job is None or not job.abandoned():
+            return job
+        log.error("Job %s (%s) abandoned by %s while %s", job.id, job.kind, job.owner, job.status)
+        job.status = "failed"
+        job.error = "The job stopped before finishing (worker exited or it ran too long)"
+        job.finished_at = time.time()
+        if job.artifact_path and os.path.exists(job.artifact_path):
+            os.remove(job.artifact_path)
+        job.save()
+        return job
+
+    def submit(self, kind, params, func, dedupe_ttl=None):
+        """Queue func(job) and return (job, created); func writes to job.output_path().
+
+        With dedupe_ttl, a job of the same kind and params created within
+        that many seconds that has not failed is returned instead of
+        starting a new one.
+        """
+        self.prune()
+
+        key_path = None
+        if dedupe_ttl:
+            key = digest_of(json.dumps([kind, params], sort_keys=True, default=str))
+            key_path = os.path.join(self.directory, "keys", f"{key}.json")
+
+        with self._lock:
+            if key_path:
+                existing = self._find_duplicate(key_path, dedupe_ttl)
+                if existing is not None:
+                    return existing, False
+
+            job = Job(new_id("J"), kind, params, self.directory)
+            job.save()
+            self._jobs[job.id] = job
+            self._ensure_heartbeat()
+            if key_path:
+                _write_json(key_path, {"job_id": job.id})
+
+        self._executor.submit(self._run, job, func)
+        return job, True
+
+    def _find_duplicate(self, key_path, ttl):
+        try:
+            with open(key_path) as f:
+                job_id = json.load(f)["job_id"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+        job = self._expire(self._jobs.get(job_id) or Job.load(job_id, self.directory))
+        if job is None or job.status == "failed" or time.time() - job.created_at > ttl:
+            return None
+        if job.status == "done" and not os.path.exists(job.artifact_path or ""):
+            return None
+        return job
+
+    def _run(self, job, func):
+        job.status = "running"
+        job.started_at = time.time()
+        job.save()
+
+        try:
+            func(job)
+            job.status = "done"
+        except Exception as e:
+            log.error("Job %s (%s) failed: %s", job.id, job.kind, e)
+            job.status = "failed"
+            job.error = str(e)
+
+        job.finished_at = time.time()
+        job.save()
+        observe_job(job.kind, job.status, job.finished_at - job.started_at)
+
+    def prune(self, max_age=None):
+        """Delete finished jobs older than max_age seconds, along with their artifacts"""
+        max_age = RETENTION_SECONDS if max_age is None else max_age
+        cutoff = time.time() - max_age
+
+        try:
+            entries = os.listdir(self.directory)
+        except OSError:
+            return
+
+        for job_id in entries:
+            if job_id == "keys":
+                self._prune_keys(cutoff)
+                continue
+            job = self._expire(Job.load(job_id, self.directory))
+            if job is None or job.finished_at is None or job.finished_at > cutoff:
+                continue
+
+            shutil.rmtree(job.job_dir, ignore_errors=True)
+            with self._lock:
+                self._jobs.pop(job_id, None)
+
+    def _prune_keys(self, cutoff):
+        key_dir = os.path.join(self.directory, "keys")
+        for name in os.listdir(key_dir):
+            path = os.path.join(key_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return self._expire(job)
+
+        if not job_id.isalnum():
+            return None
+        return self._expire(Job.load(job_id, self.directory))
+
+
+job_manager = JobManager()
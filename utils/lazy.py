@@ -0,0 +1,88 @@
+import importlib
+import threading
+
+# Proxies whose targets are safe to build in the gunicorn master before fork
+_preloadable = []
+
+
+class LazyObject:
+    """Stands in for an object that is only built on first use.
+
+    Attribute access, calls, iteration and membership are forwarded to
+    factory()'s result, which is created once (thread-safely) the first
+    time any of them is needed. Used to keep heavy imports and datastore
+    connections off the import path of the route modules.
+
+    preload=True marks it as immutable and free of network clients, so
+    preload_all() may build it in the master process before workers fork.
+    """
+
+    def __init__(self, factory, name=None, preload=False):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_name", name or getattr(factory, "__name__", repr(factory)))
+        object.__setattr__(self, "_lock", threading.Lock())
+        object.__setattr__(self, "_target", None)
+        object.__setattr__(self, "_loaded", False)
+        if preload:
+            _preloadable.append(self)
+
+    def _resolve(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    object.__setattr__(self, "_target", self._factory())
+                    object.__setattr__(self, "_loaded", True)
+        return self._target
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def resolve(self):
+        """Build the target now instead of on first use"""
+        return self._resolve()
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resolve(), name, value)
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+    def __len__(self):
+        return len(self._resolve())
+
+    def __contains__(self, item):
+        return item in self._resolve()
+
+    def __getitem__(self, key):
+        return self._resolve()[key]
+
+    def __bool__(self):
+        return bool(self._resolve())
+
+    def __repr__(self):
+        if self._loaded:
+            return repr(self._target)
+        return f"<lazy {self._name}>"
+
+
+def lazy_import(module, attribute=None):
+    """A module, or one of its attributes, imported the first time it is used"""
+    def load():
+        loaded = importlib.import_module(module)
+        return getattr(loaded, attribute) if attribute else loaded
+
+    return LazyObject(load, f"{module}.{attribute}" if attribute else module, preload=True)
+
+
+def preload_all():
+    """Resolve every preloadable proxy created so far; returns their names"""
+    for proxy in _preloadable:
+        proxy.resolve()
+    return [proxy._name for proxy in _preloadable]
@@ -0,0 +1,191 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from flask import g, request
+
+ROOT = "hostel"
+
+# Successful datastore events ("Attendance marked", "Message sent") from loggers
+# under hostel.db are kept at this rate; warnings and errors are always kept
+SUCCESS_SAMPLE_RATE = float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "0.1"))
+SAMPLED_PREFIX = ROOT + ".db"
+
+# Records waiting for the writer thread; once full, new ones are dropped rather than block a request
+QUEUE_SIZE = 10000
+
+_request_id = ContextVar("request_id", default=None)
+
+# LogRecord attributes that are not structured fields of their own
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+def get_logger(name):
+    """Logger under the app's hierarchy, e.g. get_logger("db.admin") -> hostel.db.admin"""
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+def request_id():
+    return _request_id.get()
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the current request id on a record while still on the request's thread"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of INFO-and-below records from the sampled loggers.
+
+    A record logged with extra={"sample": False} is always kept.
+    """
+
+    def __init__(self, rate=SUCCESS_SAMPLE_RATE, prefix=SAMPLED_PREFIX):
+        super().__init__()
+        self.rate = rate
+        self.prefix = prefix
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or not getattr(record, "sample", True):
+            return True
+        if not record.name.startswith(self.prefix):
+            return True
+        if self.rate >= 1 or random.random() < self.rate:
+            record.sample_rate = self.rate
+            return True
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; extra={...} fields are included as keys"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: records are dropped when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Only the message is resolved here (args may change after the call returns);
+        # formatting, including any traceback, happens on the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _stop_listener():
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _start_listener(handler, stream):
+    global _listener
+    log_queue = queue.Queue(QUEUE_SIZE)
+    handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener():
+    # The inherited queue holds the parent's unwritten records and may have been
+    # locked by its writer thread mid-put, so the child starts on a queue of its own
+    if _listener is not None:
+        _start_listener(_handler, *_listener.handlers)
+
+
+def init_logging(app=None, level=None, fmt=None):
+    """Route the app's loggers through a background writer thread.
+
+    Records are filtered and sampled on the calling thread, then handed
+    to a bounded queue; a QueueListener formats them (JSON by default,
+    LOG_FORMAT=text for humans) and writes to stdout, so request threads
+    never wait on console I/O. With an app, each request gets an id
+    (from X-Request-ID or generated) that is attached to its log lines
+    and echoed in the response.
+    """
+    global _handler
+    with _lock:
+        if _handler is None:
+            level = level or os.getenv("LOG_LEVEL", "INFO")
+            fmt = fmt or os.getenv("LOG_FORMAT", "json")
+
+            stream = logging.StreamHandler(sys.stdout)
+            if fmt == "json":
+                stream.setFormatter(JsonFormatter())
+            else:
+                stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+            _handler = DroppingQueueHandler(None)
+            _handler.addFilter(SamplingFilter())
+            _handler.addFilter(RequestContextFilter())
+            _start_listener(_handler, stream)
+
+            root = logging.getLogger(ROOT)
+            root.setLevel(level)
+            root.addHandler(_handler)
+            root.propagate = False
+
+            atexit.register(_stop_listener)
+            # The writer thread does not survive fork(), so preloaded gunicorn workers start their own
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=_restart_listener)
+
+    if app is not None:
+        @app.before_request
+        def assign_request_id():
+            g.request_id_token = _request_id.set(request.headers.get("X-Request-ID") or uuid.uuid4().hex)
+
+        @app.after_request
+        def echo_request_id(response):
+            if _request_id.get():
+                response.headers["X-Request-ID"] = _request_id.get()
+            return response
+
+        @app.teardown_request
+        def clear_request_id(exc):
+            token = g.pop("request_id_token", None)
+            if token is not None:
+                try:
+                    _request_id.reset(token)
+                except ValueError:
+                    _request_id.set(None)
@@ -0,0 +1,123 @@
+import os
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# One document per student per day, id "<date>_<tenant_id>":
+#   {"date": "2025-01-31", "tenant_id": "12", "breakfast": true, "lunch": true}
+# Meals are only ever switched on, as with the old merge-writes, so a missing meal is false.
+RECORDS = "mess_attendance"
+
+# Per-day totals, split over shards so concurrent workers do not contend on one document:
+#   mess_counters/<date>/shards/<n> = {"students": 40, "breakfast": 31, "lunch": 38, "dinner": 35}
+COUNTERS = "mess_counters"
+SHARDS = int(os.getenv("MESS_COUNTER_SHARDS", "8"))
+
+# The previous layout: messAttendance/<date> = {"<tenant_id>": {"lunch": true, ...}, ...}
+LEGACY = "messAttendance"
+
+MEALS = ("breakfast", "lunch", "dinner")
+COUNTED = ("students",) + MEALS
+
+# Writes per batch commit (Firestore's limit)
+BATCH_LIMIT = 500
+
+
+def record_id(day, tenant_id):
+    return f"{day}_{tenant_id}"
+
+
+def record(day, tenant_id, meals):
+    data = {"date": day, "tenant_id": str(tenant_id)}
+    data.update({meal: True for meal in MEALS if meals.get(meal)})
+    return data
+
+
+def shards_path(day):
+    return f"{COUNTERS}/{day}/shards"
+
+
+def process_shard():
+    # Each worker adds to its own shard; the write-behind buffer coalesces its increments
+    return str(os.getpid() % SHARDS)
+
+
+def counter_deltas(previous, meals):
+    """Counter increments for a student marking `meals`; previous is None if they had no record yet"""
+    deltas = {} if previous is not None else {"students": 1}
+    previous = previous or {}
+    for meal in MEALS:
+        if meals.get(meal) and not previous.get(meal):
+            deltas[meal] = 1
+    return deltas
+
+
+def read_counts(client, day):
+    """Students and meals marked on a day, summed over the counter shards"""
+    counts = dict.fromkeys(COUNTED, 0)
+    for shard in client.collection(shards_path(day)).stream():
+        for field, value in (shard.to_dict() or {}).items():
+            if field in counts:
+                counts[field] += value
+    return counts
+
+
+def day_query(client, day):
+    """A day's records, ordered by record id so pages are stable"""
+    return client.collection(RECORDS).where("date", "==", day).order_by(FieldPath.document_id())
+
+
+def rebuild_counts(client, day):
+    """Recount a day from its records and store the totals as its only shard.
+
+    Used after a migration, or to correct a day whose counters drifted
+    (a flush replayed after a crash, or a double submit raced across workers).
+    """
+    counts = dict.fromkeys(COUNTED, 0)
+    for doc in day_query(client, day).stream():
+        data = doc.to_dict() or {}
+        counts["students"] += 1
+        for meal in MEALS:
+            counts[meal] += bool(data.get(meal))
+
+    batch = client.batch()
+    for shard in client.collection(shards_path(day)).stream():
+        if shard.id != "0":
+            batch.delete(client.collection(shards_path(day)).document(shard.id))
+    batch.set(client.collection(shards_path(day)).document("0"), counts)
+    batch.commit()
+    return counts
+
+
+def migrate_legacy(client, days=None, delete=False):
+    """Copy per-day messAttendance documents into per-student records and counters.
+
+    Safe to re-run: records are merge-written and counters are rebuilt
+    from the records. With delete=True each legacy document is removed
+    once its day has been copied. Returns {day: students}.
+    """
+    legacy = client.collection(LEGACY)
+    if days:
+        docs = [doc for doc in (legacy.document(day).get() for day in days) if doc.exists]
+    else:
+        docs = legacy.order_by(FieldPath.document_id()).stream()
+
+    summary = {}
+    for doc in docs:
+        batch = client.batch()
+        staged = 0
+        for tenant_id, meals in (doc.to_dict() or {}).items():
+            meals = meals if isinstance(meals, dict) else {}
+            batch.set(client.collection(RECORDS).document(record_id(doc.id, tenant_id)),
+                      record(doc.id, tenant_id, meals), merge=True)
+            staged += 1
+            if staged == BATCH_LIMIT:
+                batch.commit()
+                batch = client.batch()
+                staged = 0
+        if staged:
+            batch.commit()
+
+        summary[doc.id] = rebuild_counts(client, doc.id)["students"]
+        if delete:
+            legacy.document(doc.id).delete()
+    return summary
@@ -0,0 +1,78 @@
+import os
+import threading
+import time
+
+from utils.id_utils import new_id
+from utils.metrics import record_cache
+
+# The weekly menu is one document:
+#   mess/strange_menu = {"version": "<id>", "monday": {"breakfast": ..., "lunch": ..., "dinner": ...}, ...}
+# save() stamps a new version on every write.
+COLLECTION = "mess"
+DOCUMENT = "strange_menu"
+
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+# Seconds a worker serves its cached menu before checking the stored version
+# again. The worker that saved a menu serves it at once; the others within this.
+REFRESH_INTERVAL = float(os.getenv("MENU_REFRESH_INTERVAL", "60"))
+
+
+def ordered(data):
+    """The day entries of a stored menu, Monday first (the datastore returns map keys sorted by name)"""
+    return {day: data[day] for day in DAYS if isinstance(data.get(day), dict)}
+
+
+class MenuCache:
+    """The weekly menu, read at most once per REFRESH_INTERVAL per process.
+
+    The menu changes about once a week but is shown on every tenant mess
+    page. The cached copy is kept with the version stamp it was saved
+    under; a refresh reads only that field and fetches the whole menu
+    when the version has changed.
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL):
+        self.interval = interval
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._menu = None
+        self._checked_at = 0.0
+
+    def get(self, client):
+        """The menu as {day: {meal: dish}} in week order ({} if none is saved)"""
+        with self._lock:
+            hit = self._menu is not None and time.monotonic() - self._checked_at < self.interval
+            record_cache("mess_menu", hit)
+            if hit:
+                return self._menu
+
+            reference = client.collection(COLLECTION).document(DOCUMENT)
+            stamp = reference.get(field_paths=["version"])
+            version = (stamp.to_dict() or {}).get("version") if stamp.exists else None
+            if self._menu is None or version is None or version != self._version:
+                doc = reference.get()
+                data = doc.to_dict() if doc.exists else {}
+                self._menu = ordered(data)
+                self._version = data.get("version")
+            self._checked_at = time.monotonic()
+            return self._menu
+
+    def save(self, client, week_menu):
+        """Store a new menu under a fresh version and serve it from this process at once"""
+        version = new_id()
+        client.collection(COLLECTION).document(DOCUMENT).set(dict(week_menu, version=version))
+        with self._lock:
+            self._menu = ordered(week_menu)
+            self._version = version
+            self._checked_at = time.monotonic()
+        return version
+
+
+menu_cache = MenuCache()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=menu_cache._reset)
@@ -0,0 +1,99 @@
+import hmac
+import os
+import time
+
+from flask import Response, g, request
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST,
+                               REGISTRY, generate_latest, multiprocess)
+
+from storage import instrument
+
+# Set by gunicorn.conf.py; each worker then writes its samples to files in this
+# directory and /metrics aggregates them, whichever worker serves the scrape
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+JOB_BUCKETS = (0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800)
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route",
+                            ["blueprint", "endpoint", "method", "status"], buckets=REQUEST_BUCKETS)
+REQUESTS_IN_PROGRESS = Gauge("http_requests_in_progress", "Requests being handled",
+                             ["blueprint", "endpoint"], multiprocess_mode="livesum")
+DATASTORE_CALLS = Counter("datastore_calls_total", "Datastore round trips made by requests",
+                          ["blueprint", "kind"])
+DATASTORE_READS = Counter("datastore_reads_total", "Billed document reads made by requests", ["blueprint"])
+DATASTORE_WRITES = Counter("datastore_writes_total", "Document writes made by requests", ["blueprint"])
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by outcome", ["cache", "result"])
+JOB_DURATION = Histogram("job_duration_seconds", "Background job run time", ["kind", "status"],
+                         buckets=JOB_BUCKETS)
+APP_COLD_START = Gauge("app_cold_start_seconds", "Time from the first import of app.py until it could serve",
+                       multiprocess_mode="max")
+
+
+def _route_labels():
+    return request.blueprint or "app", request.endpoint or "unmatched"
+
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def observe_job(kind, status, seconds):
+    JOB_DURATION.labels(kind, status).observe(seconds)
+
+
+def _authorized():
+    # METRICS_TOKEN, when set, must be sent as a bearer token by the scraper
+    token = os.getenv("METRICS_TOKEN")
+    if not token:
+        return True
+    header = request.headers.get("Authorization", "")
+    return header.startswith("Bearer ") and hmac.compare_digest(header[len("Bearer "):], token)
+
+
+def metrics_endpoint():
+    if not _authorized():
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    """Record per-route latency, in-flight requests and datastore usage, and serve /metrics"""
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_route = _route_labels()
+        g.metrics_start = time.perf_counter()
+        REQUESTS_IN_PROGRESS.labels(*g.metrics_route).inc()
+
+    @app.after_request
+    def record_request_metrics(response):
+        route = g.get("metrics_route")
+        if route is None:
+            return response
+
+        REQUEST_LATENCY.labels(route[0], route[1], request.method, str(response.status_code)).observe(
+            time.perf_counter() - g.metrics_start)
+
+        stats = instrument.current()
+        if stats is not None and stats.calls:
+            for kind, count in (("query", stats.queries), ("lookup", stats.lookups), ("commit", stats.commits)):
+                if count:
+                    DATASTORE_CALLS.labels(route[0], kind).inc(count)
+            DATASTORE_READS.labels(route[0]).inc(stats.reads)
+            DATASTORE_WRITES.labels(route[0]).inc(stats.writes)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        route = g.pop("metrics_route", None)
+        if route is not None:
+            REQUESTS_IN_PROGRESS.labels(*route).dec()
+
+    app.add_url_rule("/metrics", "metrics", metrics_endpoint)
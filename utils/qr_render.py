@@ -0,0 +1,134 @@
+import base64
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from flask import Response, request
+
+from utils.blob_store import blob_store, digest_of
+from utils.metrics import record_cache
+
+MIME_TYPES = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+}
+
+
+def _make_qr(payload, box_size, border):
+    # Imported on first render so app startup does not pay for qrcode and Pillow
+    import qrcode
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M,
+                       box_size=box_size,
+                       border=border)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr
+
+
+def render_png(payload, box_size=8, border=2):
+    """Render a QR payload to PNG bytes"""
+    output = BytesIO()
+    _make_qr(payload, box_size, border).make_image(fill_color="black", back_color="white").save(output, format="PNG")
+    return output.getvalue()
+
+
+def render_svg(payload, box_size=8, border=2):
+    """Render a QR payload to SVG bytes"""
+    import qrcode.image.svg
+
+    output = BytesIO()
+    _make_qr(payload, box_size, border).make_image(image_factory=qrcode.image.svg.SvgPathImage).save(output)
+    return output.getvalue()
+
+
+RENDERERS = {
+    "png": render_png,
+    "svg": render_svg,
+}
+
+
+class QRRenderer:
+    """Memoizes QR rendering in an LRU keyed by payload digest, format and size.
+
+    The key doubles as the ETag, so a conditional request can be answered
+    with a 304 before anything is rendered or even looked up.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or int(os.getenv("QR_CACHE_SIZE", "512"))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def etag(payload, fmt="png", box_size=8, border=2):
+        return digest_of(f"{digest_of(payload)}:{fmt}:{box_size}:{border}")
+
+    def render(self, payload, fmt="png", box_size=8, border=2):
+        """Return (image bytes, etag) for a payload, rendering only on a cache miss"""
+        if fmt not in RENDERERS:
+            raise ValueError(f"Unsupported QR format: {fmt}")
+
+        key = self.etag(payload, fmt, box_size, border)
+        with self._lock:
+            image = self._cache.get(key)
+            if image is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                record_cache("qr_render", True)
+                return image, key
+            self.misses += 1
+        record_cache("qr_render", False)
+
+        image = RENDERERS[fmt](payload, box_size, border)
+
+        with self._lock:
+            self._cache[key] = image
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return image, key
+
+    def data_url(self, payload, fmt="png", box_size=8, border=2):
+        """Render (cached) as a base64 data URL for <img src>"""
+        image, key = self.render(payload, fmt, box_size, border)
+        return f"data:{MIME_TYPES[fmt]};base64," + base64.b64encode(image).decode("ascii"), key
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+qr_renderer = QRRenderer()
+
+
+def render_data_url(payload, box_size=8, border=2):
+    """Render a QR payload as a base64 PNG data URL for <img src>"""
+    return qr_renderer.data_url(payload, "png", box_size, border)[0]
+
+
+def store_png(payload, store=None, box_size=8, border=2):
+    """Render a QR payload into the blob store (once per payload) and return its digest"""
+    store = store or blob_store
+    digest = digest_of(payload)
+    if not store.exists(digest):
+        store.put(digest, render_png(payload, box_size, border))
+    return digest
+
+
+def image_response(payload, fmt="png", box_size=8, max_age=3600):
+    """Flask response for a rendered QR, answering 304 without rendering when the ETag matches"""
+    etag = QRRenderer.etag(payload, fmt, box_size)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        image, etag = qr_renderer.render(payload, fmt, box_size)
+        response = Response(image, mimetype=MIME_TYPES[fmt])
+
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    return response
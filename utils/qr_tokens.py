@@ -0,0 +1,235 @@
+import hashlib
+import hmac
+import os
+import secrets
+import struct
+import time
+from datetime import datetime
+
+from utils.log import get_logger
+
+log = get_logger("qr_tokens")
+
+# Where the generated signing key is kept when QR_SIGNING_KEY/SECRET_KEY are not set
+KEY_FILE = os.getenv("QR_SIGNING_KEY_FILE", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "qr_signing.key"))
+
+# RFC 9285 base45. Every character is in the QR alphanumeric set, so a token
+# encodes at 5.5 bits/char instead of the 8 bits/char of byte mode JSON.
+BASE45_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ $%*+-./:"
+BASE45_INDEX = {char: i for i, char in enumerate(BASE45_ALPHABET)}
+
+TOKEN_PREFIX = "HP1:"
+TOKEN_VERSION = 1
+TAG_SIZE = 16
+
+# version, kind, valid_from, valid_until
+HEADER = struct.Struct(">BBII")
+
+PASS_TYPES = {
+    1: "STUDENT_ID",
+    2: "LEAVE_PASS",
+    3: "VISITOR_ENTRY",
+}
+PASS_KINDS = {name: kind for kind, name in PASS_TYPES.items()}
+
+# Field the pass id is reported under, matching the legacy JSON payloads
+PASS_ID_FIELDS = {
+    "STUDENT_ID": "student_id",
+    "LEAVE_PASS": "pass_id",
+    "VISITOR_ENTRY": "visitor_id",
+}
+
+
+class TokenError(ValueError):
+    pass
+
+
+def deployment_key(path=KEY_FILE):
+    """A random signing key, created the first time it is needed and then kept in `path`.
+
+    The file is linked into place in one step, so workers starting together
+    all end up with whichever key was written first. Passes only verify on
+    servers sharing the file; set QR_SIGNING_KEY when there are several.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(secrets.token_bytes(32))
+    try:
+        os.link(temp, path)
+        log.warning("No QR_SIGNING_KEY set; generated a signing key in %s", path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(temp)
+
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def b45encode(data):
+    chars = []
+    for i in range(0, len(data) - 1, 2):
+        value = data[i] * 256 + data[i + 1]
+        value, c = divmod(value, 45)
+        e, d = divmod(value, 45)
+        chars.append(BASE45_ALPHABET[c] + BASE45_ALPHABET[d] + BASE45_ALPHABET[e])
+    if len(data) % 2:
+        d, c = divmod(data[-1], 45)
+        chars.append(BASE45_ALPHABET[c] + BASE45_ALPHABET[d])
+    return "".join(chars)
+
+
+def b45decode(text):
+    try:
+        values = [BASE45_INDEX[char] for char in text]
+    except KeyError:
+        raise TokenError("Invalid base45 character")
+
+    if len(values) % 3 == 1:
+        raise TokenError("Invalid base45 length")
+
+    out = bytearray()
+    for i in range(0, len(values), 3):
+        chunk = values[i:i + 3]
+        if len(chunk) == 3:
+            value = chunk[0] + chunk[1] * 45 + chunk[2] * 45 * 45
+            if value > 0xFFFF:
+                raise TokenError("Invalid base45 triplet")
+            out.extend(divmod(value, 256))
+        else:
+            value = chunk[0] + chunk[1] * 45
+            if value > 0xFF:
+                raise TokenError("Invalid base45 pair")
+            out.append(value)
+    return bytes(out)
+
+
+def _pack_str(value):
+    raw = str(value).encode("utf-8")
+    if len(raw) > 255:
+        raise TokenError("Field too long for token")
+    return bytes([len(raw)]) + raw
+
+
+def _unpack_str(data, offset):
+    if offset >= len(data):
+        raise TokenError("Truncated token")
+    length = data[offset]
+    end = offset + 1 + length
+    if end > len(data):
+        raise TokenError("Truncated token")
+    return data[offset + 1:end].decode("utf-8"), end
+
+
+def _to_epoch(value):
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+def is_token(qr_data):
+    return isinstance(qr_data, str) and qr_data.startswith(TOKEN_PREFIX)
+
+
+class PassTokenSigner:
+    """Signs and verifies compact HMAC-SHA256 gate pass tokens.
+
+    A token is TOKEN_PREFIX + base45(header | pass id | subject | tag) where
+    the tag is a truncated HMAC over everything before it. Verification is a
+    single HMAC plus a clock comparison, so scanners need no datastore read.
+    """
+
+    def __init__(self, key=None):
+        if key is None:
+            key = os.getenv("QR_SIGNING_KEY") or os.getenv("SECRET_KEY") or deployment_key()
+        self.key = key.encode("utf-8") if isinstance(key, str) else key
+
+    def _tag(self, body):
+        return hmac.new(self.key, body, hashlib.sha256).digest()[:TAG_SIZE]
+
+    def sign(self, pass_type, pass_id, subject, valid_from, valid_until):
+        """Return a signed token string for the given pass"""
+        kind = PASS_KINDS[pass_type]
+        body = (HEADER.pack(TOKEN_VERSION, kind, _to_epoch(valid_from), _to_epoch(valid_until))
+                + _pack_str(pass_id)
+                + _pack_str(subject))
+        return TOKEN_PREFIX + b45encode(body + self._tag(body))
+
+    def sign_student_id(self, student_id, today=None):
+        """Sign a student ID card token valid for the current calendar year.
+
+        The window is fixed per year, so the token (and its rendered QR) is
+        identical across requests and can be cached by payload.
+        """
+        year = (today or datetime.now()).year
+        return self.sign("STUDENT_ID", student_id, student_id,
+                         datetime(year, 1, 1), datetime(year, 12, 31, 23, 59, 59))
+
+    def decode(self, token):
+        """Authenticate a token and return its fields, without checking validity dates"""
+        if not is_token(token):
+            raise TokenError("Not a signed pass token")
+
+        raw = b45decode(token[len(TOKEN_PREFIX):])
+        if len(raw) < HEADER.size + TAG_SIZE:
+            raise TokenError("Truncated token")
+
+        body, tag = raw[:-TAG_SIZE], raw[-TAG_SIZE:]
+        if not hmac.compare_digest(tag, self._tag(body)):
+            raise TokenError("Invalid signature")
+
+        version, kind, valid_from, valid_until = HEADER.unpack_from(body)
+        if version != TOKEN_VERSION or kind not in PASS_TYPES:
+            raise TokenError("Unsupported token version")
+
+        pass_id, offset = _unpack_str(body, HEADER.size)
+        subject, offset = _unpack_str(body, offset)
+        if offset != len(body):
+            raise TokenError("Trailing data in token")
+
+        return {
+            "type": PASS_TYPES[kind],
+            "pass_id": pass_id,
+            "subject": subject,
+            "valid_from": valid_from,
+            "valid_until": valid_until,
+        }
+
+    def verify(self, token, at=None):
+        """Verify a token in the same result shape as qr_generator.verify_qr_code"""
+        try:
+            fields = self.decode(token)
+        except TokenError as e:
+            return {"valid": False, "error": str(e)}
+
+        now = time.time() if at is None else _to_epoch(at)
+        pass_type = fields["type"]
+
+        data = {
+            "type": pass_type,
+            PASS_ID_FIELDS[pass_type]: fields["pass_id"],
+            "subject": fields["subject"],
+            "valid_from": datetime.fromtimestamp(fields["valid_from"]).isoformat(),
+            "valid_until": datetime.fromtimestamp(fields["valid_until"]).isoformat(),
+        }
+        if pass_type != "STUDENT_ID":
+            data["student_id"] = fields["subject"]
+
+        if now < fields["valid_from"]:
+            return {"valid": False, "error": "Pass is not valid yet", "data": data}
+        if now > fields["valid_until"]:
+            return {"valid": False, "error": "Pass has expired", "data": data}
+
+        return {"valid": True, "data": data}
+
+
+pass_signer = PassTokenSigner()
@@ -0,0 +1,50 @@
+import os
+
+from flask import g, request
+
+from storage import instrument
+from utils.log import get_logger
+
+log = get_logger("datastore")
+
+# A query shape issued more than this many times in one request is reported as an N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 10))
+
+
+def init_request_stats(app, threshold=N_PLUS_ONE_THRESHOLD):
+    """Count datastore calls per request and report them.
+
+    Every response that touched the datastore gets a Server-Timing header
+    (visible in the browser's network panel) and a log line with reads,
+    writes, queries, lookups and time spent waiting on the datastore.
+    Query shapes repeated more than `threshold` times are logged as
+    likely N+1 loops. Streamed bodies run after the headers are sent, so
+    their reads are not included.
+    """
+
+    @app.before_request
+    def start_datastore_stats():
+        g.datastore_token = instrument.begin()
+
+    @app.after_request
+    def report_datastore_stats(response):
+        stats = instrument.current()
+        if stats is None or not stats.calls:
+            return response
+
+        response.headers.add("Server-Timing", stats.server_timing())
+        log.info("%s %s %s: %s reads, %s writes, %s queries, %s lookups, %.1fms",
+                 request.method, request.path, response.status_code, stats.reads, stats.writes,
+                 stats.queries, stats.lookups, stats.seconds * 1000,
+                 extra={"endpoint": request.endpoint, "datastore": stats.to_dict()})
+
+        for shape, count in stats.repeated(threshold):
+            log.warning("N+1 suspected in %s: %sx %s", request.endpoint, count, shape,
+                        extra={"endpoint": request.endpoint, "shape": shape, "repeats": count})
+        return response
+
+    @app.teardown_request
+    def end_datastore_stats(exc):
+        token = g.pop("datastore_token", None)
+        if token is not None:
+            instrument.end(token)
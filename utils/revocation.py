@@ -0,0 +1,152 @@
+import base64
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+from utils.qr_tokens import pass_signer
+
+REFRESH_INTERVAL = float(os.getenv("REVOCATION_REFRESH_SECONDS", "30"))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings using double hashing on blake2b"""
+
+    def __init__(self, capacity=1024, error_rate=0.001):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.size / self.capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def to_dict(self):
+        """Serializable form for scanners that verify offline"""
+        return {
+            "size": self.size,
+            "hash_count": self.hash_count,
+            "hash": "blake2b-128-double",
+            "bits": base64.b64encode(bytes(self.bits)).decode("ascii"),
+        }
+
+
+class RevocationList:
+    """In-memory view of the revoked_passes collection held by each worker.
+
+    Lookups go through the Bloom filter first, so the common case of a pass
+    that was never revoked costs a few hashes. Hits are confirmed against the
+    exact map of pass id -> revocation time, which also lets a backlog of
+    offline scans be judged as of the moment each scan happened. The list is
+    refreshed at most once per REFRESH_INTERVAL seconds, incrementally from an
+    (updated_at, pass id) cursor on the server-stamped write time.
+    """
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL, capacity=1024):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._bloom = BloomFilter(capacity)
+        self._cursor = None
+        self._last_refresh = 0.0
+
+    def _add(self, pass_id, revoked_at):
+        if pass_id in self._revoked:
+            self._revoked[pass_id] = min(self._revoked[pass_id], revoked_at)
+            return
+
+        self._revoked[pass_id] = revoked_at
+        if len(self._revoked) > self._bloom.capacity:
+            # Grow and rebuild rather than let the false positive rate climb. The new
+            # filter is filled before it replaces the old one, since is_revoked takes no lock.
+            bloom = BloomFilter(self._bloom.capacity * 2, self._bloom.error_rate)
+            for revoked_id in self._revoked:
+                bloom.add(revoked_id)
+            self._bloom = bloom
+        else:
+            self._bloom.add(pass_id)
+
+    def refresh(self, db, force=False):
+        """Pull revocations written after the cursor if the list is stale"""
+        if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+
+            since, after_id = self._cursor or (None, None)
+            for record in db.get_revoked_passes(since, after_id):
+                revoked_at = record.get("revoked_at")
+                try:
+                    revoked_epoch = datetime.fromisoformat(revoked_at).timestamp()
+                except (TypeError, ValueError):
+                    revoked_epoch = time.time()
+
+                if record.get("restored_at"):
+                    # Valid again; the bloom filter keeps the id, as a false positive
+                    self._revoked.pop(record.get("pass_id"), None)
+                else:
+                    self._add(record.get("pass_id"), revoked_epoch)
+
+                # revoked_at is the app server's clock and only says when the pass stops
+                # being valid; the cursor follows the server-stamped write time
+                updated_at = record.get("updated_at")
+                if isinstance(updated_at, datetime):
+                    position = (updated_at, record["id"])
+                    if self._cursor is None or position > self._cursor:
+                        self._cursor = position
+
+            self._last_refresh = time.monotonic()
+
+    def is_revoked(self, pass_id, at=None):
+        """True if the pass was revoked (as of epoch time ``at`` when given)"""
+        if pass_id not in self._bloom:
+            return False
+
+        revoked_at = self._revoked.get(pass_id)
+        if revoked_at is None:
+            return False
+        return at is None or revoked_at <= at
+
+    def snapshot(self):
+        """Compact filter plus watermark for offline scanners"""
+        with self._lock:
+            return {
+                "watermark": self._cursor[0].isoformat() if self._cursor else None,
+                "count": len(self._revoked),
+                "bloom": self._bloom.to_dict(),
+            }
+
+
+revocation_list = RevocationList()
+
+
+def verify_pass(token, at=None):
+    """Verify a signed pass token and check it against the revocation list"""
+    result = pass_signer.verify(token, at)
+    if not result["valid"]:
+        return result
+
+    # ID cards are revoked under the student id when the tenant is removed
+    data = result["data"]
+    pass_id = data.get("pass_id") or data.get("visitor_id") or data.get("student_id")
+    at_epoch = None if at is None else (at.timestamp() if isinstance(at, datetime) else float(at))
+    if revocation_list.is_revoked(pass_id, at_epoch):
+        return {"valid": False, "error": "Pass has been revoked", "data": data}
+    return result
@@ -0,0 +1,150 @@
+from storage.base import ArrayRemove, ArrayUnion
+
+# Who lives in each room, kept in step with the tenants collection:
+#   room_occupancy/<room_no> = {"room_no": "101", "occupants": [1001, 1002]}
+# Every tenant write updates it in the same batch, with ArrayUnion/ArrayRemove
+# transforms, so concurrent moves into and out of a room cannot overwrite each other.
+COLLECTION = "room_occupancy"
+
+# Room statuses an admin sets by hand; "Occupied"/"Available" follow from the index
+MAINTENANCE = "Under Maintenance"
+OCCUPIED = "Occupied"
+AVAILABLE = "Available"
+
+# Writes per batch commit (Firestore's limit)
+BATCH_LIMIT = 500
+
+# Set once this process has seen the index exist (or built it)
+_index_checked = False
+
+
+def index_id(room_no):
+    # Room numbers such as "A/12" would otherwise be read as a sub-path
+    return str(room_no).strip().replace("/", "_")
+
+
+def occupied_room(tenant):
+    """The room a tenant takes a bed in, or None (no room, or an inactive tenant)"""
+    if not tenant or not tenant.get("room"):
+        return None
+    if str(tenant.get("status", "")).strip().lower() == "inactive":
+        return None
+    return str(tenant["room"]).strip()
+
+
+def stage_move(batch, client, tenant_id, previous, current):
+    """Add the index updates for a document going from tenant `previous` to `current` (dicts, either None)"""
+    old_room, new_room = occupied_room(previous), occupied_room(current)
+    # An overwritten document may have held a different tenant
+    old_id = int((previous or {}).get("id") or tenant_id) if old_room else None
+    new_id = int((current or {}).get("id") or tenant_id) if new_room else None
+    if (old_room, old_id) == (new_room, new_id):
+        return
+    if old_room:
+        batch.set(client.collection(COLLECTION).document(index_id(old_room)),
+                  {"occupants": ArrayRemove([old_id])}, merge=True)
+    if new_room:
+        batch.set(client.collection(COLLECTION).document(index_id(new_room)),
+                  {"room_no": new_room, "occupants": ArrayUnion([new_id])}, merge=True)
+
+
+def write_tenant(client, reference, data, previous=None, merge=False):
+    """Set a tenant document and move it in the index, in one atomic batch.
+
+    previous is the stored tenant (None for a new one); with merge, data
+    is merged over it as Firestore would.
+    """
+    current = dict(previous or {}, **data) if merge else data
+    batch = client.batch()
+    batch.set(reference, data, merge=merge)
+    stage_move(batch, client, data.get("id") or (previous or {}).get("id"), previous, current)
+    batch.commit()
+
+
+def delete_tenant(client, snapshot):
+    """Delete a tenant document and take it out of its room, in one atomic batch"""
+    tenant = snapshot.to_dict() or {}
+    batch = client.batch()
+    batch.delete(snapshot.reference)
+    stage_move(batch, client, tenant.get("id"), tenant, None)
+    batch.commit()
+
+
+def ensure_built(client):
+    """Build the index from the tenants collection if it does not exist yet (checked once per process).
+
+    Deployments that had tenants before the index was added would otherwise
+    read every room as empty.
+    """
+    global _index_checked
+    if _index_checked:
+        return
+    if not list(client.collection(COLLECTION).limit(1).stream()):
+        rebuild(client)
+    _index_checked = True
+
+
+def occupants(client, room_no):
+    """Tenant ids in a room, with a single document read"""
+    ensure_built(client)
+    doc = client.collection(COLLECTION).document(index_id(room_no)).get()
+    return list((doc.to_dict() or {}).get("occupants", [])) if doc.exists else []
+
+
+def read_index(client):
+    """Occupant ids for every room, from one query"""
+    ensure_built(client)
+    index = {}
+    for doc in client.collection(COLLECTION).stream():
+        data = doc.to_dict()
+        index[data.get("room_no", doc.id)] = list(data.get("occupants", []))
+    return index
+
+
+def free_beds(room, room_occupants):
+    try:
+        capacity = int(room.get("capacity") or 0)
+    except (TypeError, ValueError):
+        capacity = 0
+    return max(capacity - len(room_occupants), 0)
+
+
+def room_status(room, room_occupants):
+    """Maintenance as set by hand, otherwise Occupied once every bed is taken"""
+    if str(room.get("status", "")).strip() == MAINTENANCE:
+        return MAINTENANCE
+    return OCCUPIED if free_beds(room, room_occupants) == 0 else AVAILABLE
+
+
+def rebuild(client):
+    """Rewrite the index from the tenants collection; returns {room_no: occupants}.
+
+    Used once to build the index over existing tenants, and to correct it
+    if it drifts (e.g. two admins editing the same tenant at once).
+    """
+    rooms = {}
+    for doc in client.collection("tenants").select(["id", "room", "status"]).stream():
+        tenant = doc.to_dict()
+        room = occupied_room(tenant)
+        if room and tenant.get("id") is not None:
+            rooms.setdefault(room, []).append(int(tenant["id"]))
+
+    writes = {index_id(room): {"room_no": room, "occupants": sorted(ids)} for room, ids in rooms.items()}
+    for doc in client.collection(COLLECTION).select(["room_no"]).stream():
+        # Rooms nobody lives in any more
+        writes.setdefault(doc.id, None)
+
+    batch, staged = client.batch(), 0
+    for doc_id, data in writes.items():
+        reference = client.collection(COLLECTION).document(doc_id)
+        if data is None:
+            batch.delete(reference)
+        else:
+            batch.set(reference, data)
+        staged += 1
+        if staged == BATCH_LIMIT:
+            batch.commit()
+            batch, staged = client.batch(), 0
+    if staged:
+        batch.commit()
+    return rooms
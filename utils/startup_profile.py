@@ -0,0 +1,61 @@
+"""Import-time profile of the app's cold start.
+
+    python -m utils.startup_profile [--top N] [--module app]
+
+Imports the module in a fresh interpreter with -X importtime and
+reports where the time went, grouped by top-level package, so a heavy
+dependency creeping back onto the startup path shows up by name.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import Counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(output):
+    """Self time in seconds per top-level package, and the total for the run"""
+    packages = Counter()
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        package = name.strip().split(".")[0]
+        packages[package] += int(self_us) / 1e6
+        if not name.startswith("  "):
+            # Only top-level imports; nested ones are part of their parent's cumulative time
+            total += int(cumulative_us) / 1e6
+    return packages, total
+
+
+def profile(module="app"):
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    return parse_importtime(result.stderr)
+
+
+def print_profile(result, top=20):
+    packages, total = result
+    print(f"{'package':<32} {'ms':>9} {'share':>7}")
+    for package, seconds in packages.most_common(top):
+        print(f"{package:<32} {seconds * 1000:>9.1f} {seconds / total:>7.1%}")
+    print(f"{'total':<32} {total * 1000:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=20, help="number of packages to list")
+    parser.add_argument("--module", default="app", help="module to import (default: app)")
+    args = parser.parse_args(argv)
+
+    print_profile(profile(args.module), args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import threading
+import time
+
+from utils.metrics import record_cache
+
+# Seconds a worker keeps the tenant directory before reading it again. Writes
+# made through this process invalidate it at once; other workers catch up within this.
+TTL = float(os.getenv("TENANT_CACHE_TTL", "300"))
+
+# Values per "in" filter (Firestore's limit)
+IN_LIMIT = 30
+
+
+class TenantCache:
+    """Tenant id (as a string) -> (name, room), shared by pages that label rows with students.
+
+    The whole directory is one projected read of the tenants collection,
+    instead of a query and a get per row. Ids missing from it (a tenant
+    added by another worker since the last read) are fetched together
+    with "in" queries and added.
+    """
+
+    def __init__(self, ttl=TTL):
+        self.ttl = ttl
+        self._reset()
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._entries = None
+        self._loaded_at = 0.0
+
+    def _fetch(self, query):
+        return {str(data.get("id")): (data.get("name", "Unknown"), data.get("room", "N/A"))
+                for data in (doc.to_dict() for doc in query.select(["id", "name", "room"]).stream())}
+
+    def lookup(self, client, tenant_ids=None):
+        """(name, room) for each of tenant_ids found, or for every tenant without them"""
+        with self._lock:
+            hit = self._entries is not None and time.monotonic() - self._loaded_at < self.ttl
+            if not hit:
+                self._entries = self._fetch(client.collection("tenants"))
+                self._loaded_at = time.monotonic()
+            record_cache("tenants", hit)
+
+            if tenant_ids is None:
+                return {tenant_id: entry for tenant_id, entry in self._entries.items() if entry}
+
+            wanted = {str(tenant_id) for tenant_id in tenant_ids if tenant_id is not None}
+            missing = [int(tenant_id) for tenant_id in wanted - self._entries.keys() if tenant_id.isdigit()]
+            for start in range(0, len(missing), IN_LIMIT):
+                chunk = missing[start:start + IN_LIMIT]
+                found = self._fetch(client.collection("tenants").where("id", "in", chunk))
+                # Ids with no tenant (deleted since their records were written) are remembered as such
+                self._entries.update({str(tenant_id): found.get(str(tenant_id)) for tenant_id in chunk})
+            return {tenant_id: self._entries[tenant_id] for tenant_id in wanted if self._entries.get(tenant_id)}
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+
+
+tenant_cache = TenantCache()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=tenant_cache._reset)
@@ -0,0 +1,78 @@
+import gc
+import time
+
+from utils.lazy import preload_all
+from utils.log import get_logger
+
+log = get_logger("warmup")
+
+# name -> callable(app); run in the gunicorn master so forked workers share the result
+_assets = {}
+
+
+def preload(name):
+    """Register an immutable asset to build before fork.
+
+    Nothing registered here may open a datastore or other network
+    connection: gRPC channels and sockets do not survive fork, and those
+    are created lazily by each worker instead.
+    """
+    def register(build):
+        _assets[name] = build
+        return build
+    return register
+
+
+@preload("lazy imports")
+def _lazy_imports(app):
+    # Priority model, chatbot knowledge index, QR generator, Pillow, pyarrow
+    return len(preload_all())
+
+
+@preload("templates")
+def _templates(app):
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(name)
+    return len(app.jinja_env.cache)
+
+
+@preload("qr renderer")
+def _qr_renderer(app):
+    from utils.qr_render import render_png, render_svg
+
+    # First renders import qrcode, Pillow and their encoders
+    render_png("warmup")
+    render_svg("warmup")
+
+
+@preload("excel export")
+def _excel_export(app):
+    import openpyxl  # noqa: F401
+    import pandas  # noqa: F401
+
+
+def warm_up(app):
+    """Build every registered asset and freeze the heap for copy-on-write sharing.
+
+    Called by gunicorn.conf.py once the preloaded app is imported and
+    before the first worker forks. gc.freeze() moves everything built so
+    far to the permanent generation, so the collector in each worker never
+    touches (and so never copies) those pages. A failing asset is logged
+    and left to load lazily in the workers.
+    """
+    timings = {}
+    for name, build in _assets.items():
+        start = time.perf_counter()
+        try:
+            result = build(app)
+        except Exception as e:
+            log.warning("Could not preload %s: %s", name, e)
+            continue
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        log.debug("Preloaded %s (%s) in %.0fms", name, result, timings[name])
+
+    gc.collect()
+    gc.freeze()
+    log.info("Preloaded %s assets in %.0fms, %s objects frozen", len(timings), sum(timings.values()),
+             gc.get_freeze_count(), extra={"assets_ms": timings})
+    return timings
@@ -0,0 +1,289 @@
+import atexit
+import copy
+import glob
+import json
+import os
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: journals of other processes are never taken over
+    fcntl = None
+
+import storage
+from storage.base import Increment
+from utils.log import get_logger
+
+log = get_logger("write_behind")
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "write_behind")
+
+# Buffered writes are sent to the datastore this often (seconds)
+FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", "1.0"))
+
+# WRITE_BEHIND=0 writes every call straight through instead
+ENABLED = os.getenv("WRITE_BEHIND", "1") != "0"
+
+
+def deep_merge(target, updates):
+    """Merge nested dicts the way Firestore's set(..., merge=True) does"""
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            deep_merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+
+def _try_lock(fd):
+    """Take an exclusive flock without waiting; the kernel drops it when the holder dies"""
+    if fcntl is None:
+        return False
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _owner(path):
+    # <token>.jsonl, <token>-<n>.jsonl and <token>.lock all belong to the buffer started as <token>
+    return os.path.basename(path).split(".")[0].split("-")[0]
+
+
+class WriteBehindBuffer:
+    """Coalesces merge-writes to hot documents and flushes them once per interval.
+
+    Firestore sustains about one write per second to a single document,
+    so a burst of students marking meals (and bumping the day's meal
+    counters) would queue up behind each other. Instead, put() merges each update into an
+    in-memory copy of the pending fields and returns at once; a background
+    thread writes every pending document with one set(merge=True) in a
+    single batch each FLUSH_INTERVAL. increment() is summed the same way and
+    sent as one Increment per field.
+
+    Every call is also appended to a journal before it returns, named
+    after a token unique to this buffer's start and guarded by an flock
+    on <token>.lock for as long as the buffer runs. A flush rotates the
+    journal and deletes it once the batch has committed; a process that
+    died with unflushed writes leaves its journal behind with its lock
+    released, and the next buffer to start claims and replays it. Replaying
+    merge-writes is harmless, but increments from a crash between commit
+    and cleanup are counted twice, so counters fed through here are
+    at-least-once. Pending writes are also flushed at interpreter exit
+    (gunicorn workers exit normally on SIGTERM).
+    """
+
+    def __init__(self, directory=None, interval=FLUSH_INTERVAL, enabled=ENABLED):
+        self.directory = directory or os.getenv("WRITE_BEHIND_DIR", DEFAULT_DIR)
+        self.interval = interval
+        self.enabled = enabled
+        self._reset()
+
+    def _reset(self):
+        # A child inherits the parent's lock file; closing its copy leaves the parent's lock held
+        if getattr(self, "_lock_fd", None) is not None:
+            os.close(self._lock_fd)
+        self._token = None
+        self._lock_fd = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._increments = {}
+        self._journal = None
+        self._rotated = []
+        self._sequence = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _journal_path(self):
+        return os.path.join(self.directory, f"{self._token}.jsonl")
+
+    def _lock_path(self, token):
+        return os.path.join(self.directory, f"{token}.lock")
+
+    def _start(self):
+        # Called with self._lock held, on the first put() of this process
+        os.makedirs(self.directory, exist_ok=True)
+        self._token = uuid.uuid4().hex
+
+        # Locked before it appears under its name, so no other buffer ever sees it unlocked
+        staging = self._lock_path(self._token) + ".tmp"
+        self._lock_fd = os.open(staging, os.O_CREAT | os.O_WRONLY, 0o600)
+        _try_lock(self._lock_fd)
+        os.replace(staging, self._lock_path(self._token))
+
+        self._recover()
+        self._journal = open(self._journal_path(), "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def _recover(self):
+        """Adopt journals left by buffers that stopped before flushing"""
+        for lock_path in glob.glob(os.path.join(self.directory, "*.lock")):
+            token = _owner(lock_path)
+            if token == self._token:
+                continue
+            try:
+                fd = os.open(lock_path, os.O_WRONLY)
+            except FileNotFoundError:
+                continue
+            try:
+                if not _try_lock(fd):
+                    continue  # its buffer is still running
+                for path in glob.glob(os.path.join(self.directory, f"{token}*.jsonl")):
+                    self._replay(path)
+                try:
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+            finally:
+                os.close(fd)
+
+        # Journals whose lock file is gone (a claim cut short) are nobody's
+        for path in glob.glob(os.path.join(self.directory, "*.jsonl")):
+            if not os.path.exists(self._lock_path(_owner(path))):
+                self._replay(path)
+
+    def _replay(self, path):
+        # Renaming claims the journal, so two workers starting together do not both replay it
+        self._sequence += 1
+        claimed = os.path.join(self.directory, f"{self._token}-{self._sequence}.jsonl")
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return
+
+        replayed = 0
+        with open(claimed, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                self._apply(entry)
+                replayed += 1
+        self._rotated.append(claimed)
+        log.warning("Replaying %s unflushed writes from %s", replayed, os.path.basename(path))
+
+    def _apply(self, entry):
+        key = (entry["collection"], entry["document"])
+        if "increment" in entry:
+            totals = self._increments.setdefault(key, {})
+            for field, amount in entry["increment"].items():
+                totals[field] = totals.get(field, 0) + amount
+        else:
+            deep_merge(self._pending.setdefault(key, {}), entry["data"])
+
+    def _queue(self, entry):
+        """Journal and apply an entry; returns False when the buffer is off or closed"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._stop.is_set():
+                return False
+            if self._thread is None:
+                self._start()
+            self._journal.write(json.dumps(entry, default=str) + "\n")
+            self._journal.flush()
+            self._apply(entry)
+            return True
+
+    def put(self, collection, document_id, data):
+        """Queue set(data, merge=True) on collection/document_id"""
+        if not self._queue({"collection": collection, "document": document_id, "data": data}):
+            storage.get_db().collection(collection).document(document_id).set(data, merge=True)
+
+    def increment(self, collection, document_id, amounts):
+        """Queue adding amounts ({field: n}) to numeric fields of collection/document_id"""
+        if not self._queue({"collection": collection, "document": document_id, "increment": amounts}):
+            storage.get_db().collection(collection).document(document_id).set(
+                {field: Increment(amount) for field, amount in amounts.items()}, merge=True)
+
+    def pending(self, collection, document_id):
+        """Fields written to a document but not flushed yet, for read-your-writes"""
+        with self._lock:
+            return copy.deepcopy(self._pending.get((collection, document_id), {}))
+
+    def flush(self):
+        """Write everything pending in one batch; returns the number of documents written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending and not self._increments:
+                    return 0
+                batch, self._pending = self._pending, {}
+                increments, self._increments = self._increments, {}
+                self._sequence += 1
+                rotated = os.path.join(self.directory, f"{self._token}-{self._sequence}.jsonl")
+                self._journal.close()
+                os.replace(self._journal_path(), rotated)
+                self._rotated.append(rotated)
+                self._journal = open(self._journal_path(), "a", encoding="utf-8")
+
+            try:
+                client = storage.get_db()
+                writes = client.batch()
+                for key in set(batch) | set(increments):
+                    data = dict(batch.get(key, {}))
+                    data.update({field: Increment(amount) for field, amount in increments.get(key, {}).items()})
+                    writes.set(client.collection(key[0]).document(key[1]), data, merge=True)
+                writes.commit()
+            except Exception as e:
+                log.error("Write-behind flush of %s documents failed, retrying: %s",
+                          len(set(batch) | set(increments)), e)
+                with self._lock:
+                    # Writes queued meanwhile are newer, so they are merged on top
+                    self._pending = deep_merge(batch, self._pending)
+                    for key, totals in increments.items():
+                        for field, amount in totals.items():
+                            current = self._increments.setdefault(key, {})
+                            current[field] = current.get(field, 0) + amount
+                return 0
+
+            with self._lock:
+                done, self._rotated = self._rotated, []
+            for path in done:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            written = len(set(batch) | set(increments))
+            log.debug("Flushed %s buffered documents", written)
+            return written
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        """Stop the flush thread and write whatever is still pending.
+
+        Later put() calls write straight through.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=self.interval * 2)
+        self.flush()
+
+        with self._lock:
+            if not self._pending and not self._increments:
+                # Everything reached the datastore, so there is nothing left to replay
+                self._journal.close()
+                for path in (self._journal_path(), self._lock_path(self._token)):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            # Anything still pending is left for the next buffer to replay
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+write_buffer = WriteBehindBuffer()
+atexit.register(write_buffer.close)
+
+if hasattr(os, "register_at_fork"):
+    # A worker starts with an empty buffer and its own journal; the parent flushes its own
+    os.register_at_fork(after_in_child=write_buffer._reset)